@@ -2,8 +2,12 @@ from django.contrib.admin import AdminSite, ModelAdmin, TabularInline
 from django.contrib.auth.admin import GroupAdmin, UserAdmin
 from django.contrib.auth.models import Group, Permission
 
+from api.busqueda import buscar
+
 from .models import (
     KPI,
+    AlertaStock,
+    ArchivoAnalitico,
     AsignacionRuta,
     Cliente,
     ClienteCluster,
@@ -11,6 +15,7 @@ from .models import (
     ControlCalidad,
     ControlProduccionAgua,
     ControlSoploBotellas,
+    CorreoSaliente,
     CustomUser,
     Departamento,
     DetallePedido,
@@ -33,6 +38,8 @@ from .models import (
     Ruta,
     SeguimientoPedido,
     SesionChatbot,
+    SnapshotInventario,
+    TrazabilidadLote,
     Venta,
 )
 
@@ -61,6 +68,7 @@ class CustomAdminSite(AdminSite):
                 "EmpleadoRol",
                 "Departamento",
                 "RegistroSesion",
+                "CorreoSaliente",
             ],
             "Clientes": [
                 "Cliente",
@@ -72,6 +80,9 @@ class CustomAdminSite(AdminSite):
                 "Producto",
                 "Inventario",
                 "MovimientoInventario",
+                "SnapshotInventario",
+                "AlertaStock",
+                "TrazabilidadLote",
                 "InsumoProduccion",
                 "MovimientoInsumo",
             ],
@@ -90,7 +101,7 @@ class CustomAdminSite(AdminSite):
                 "ControlProduccionAgua",
                 "ControlSoploBotellas",
             ],
-            "Gestión de Rendimiento": ["KPI", "Kanban", "Reporte"],
+            "Gestión de Rendimiento": ["KPI", "Kanban", "Reporte", "ArchivoAnalitico"],
             "Chatbot": ["SesionChatbot", "MensajeChatbot"],
         }
 
@@ -247,6 +258,17 @@ class EmpleadoAdmin(ModelAdmin):
         qs = super().get_queryset(request)
         return qs.select_related("departamento_principal", "user")
 
+    def get_search_results(self, request, queryset, search_term):
+        # Usa los índices de api.busqueda en lugar de ILIKE '%x%' por campo;
+        # el usuario se busca por coincidencia exacta (índice único)
+        if not search_term:
+            return queryset, False
+        return (
+            buscar(queryset, search_term)
+            | queryset.filter(user__username=search_term.strip()),
+            False,
+        )
+
 
 # Admin para el modelo EmpleadoRol
 class EmpleadoRolAdmin(ModelAdmin):
@@ -270,6 +292,58 @@ class RolAdmin(ModelAdmin):
     list_filter = ["departamento"]
 
 
+class SoloLecturaAdmin(ModelAdmin):
+    """
+    Registros que solo escribe la aplicación: se pueden consultar pero no
+    crear, editar ni eliminar desde el panel.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# Admin para la bandeja de salida de correos
+class CorreoSalienteAdmin(SoloLecturaAdmin):
+    # contenido_html puede incluir contraseñas temporales pendientes de envío
+    exclude = ["contenido_html"]
+    list_display = ["destinatario", "asunto", "estado", "intentos", "fecha_creacion"]
+    list_filter = ["estado"]
+    search_fields = ["destinatario", "asunto"]
+
+
+# Admins del inventario: el saldo solo cambia a través del libro de movimientos
+class InventarioAdmin(SoloLecturaAdmin):
+    list_display = [
+        "producto",
+        "cantidad_actual",
+        "stock_minimo",
+        "fecha_actualizacion",
+    ]
+    search_fields = ["producto__nombre"]
+
+
+class MovimientoInventarioAdmin(SoloLecturaAdmin):
+    list_display = [
+        "inventario",
+        "tipo_movimiento",
+        "cantidad",
+        "fecha_movimiento",
+        "empleado",
+    ]
+    list_filter = ["tipo_movimiento"]
+    search_fields = ["inventario__producto__nombre", "motivo_movimiento"]
+
+
+class SnapshotInventarioAdmin(SoloLecturaAdmin):
+    list_display = ["inventario", "cantidad", "ultimo_movimiento", "fecha"]
+
+
 custom_admin_site.register(Group, GroupAdmin)
 custom_admin_site.register(Permission)
 
@@ -280,6 +354,7 @@ custom_admin_site.register(Rol, RolAdmin)
 custom_admin_site.register(EmpleadoRol, EmpleadoRolAdmin)
 custom_admin_site.register(Departamento)
 custom_admin_site.register(RegistroSesion)
+custom_admin_site.register(CorreoSaliente, CorreoSalienteAdmin)
 
 # Clientes
 custom_admin_site.register(Cliente)
@@ -289,8 +364,11 @@ custom_admin_site.register(SeguimientoPedido)
 
 # Productos e Inventario
 custom_admin_site.register(Producto)
-custom_admin_site.register(Inventario)
-custom_admin_site.register(MovimientoInventario)
+custom_admin_site.register(Inventario, InventarioAdmin)
+custom_admin_site.register(MovimientoInventario, MovimientoInventarioAdmin)
+custom_admin_site.register(SnapshotInventario, SnapshotInventarioAdmin)
+custom_admin_site.register(AlertaStock)
+custom_admin_site.register(TrazabilidadLote)
 custom_admin_site.register(InsumoProduccion)
 custom_admin_site.register(MovimientoInsumo)
 
@@ -313,6 +391,7 @@ custom_admin_site.register(ControlSoploBotellas)
 custom_admin_site.register(KPI)
 custom_admin_site.register(Kanban)
 custom_admin_site.register(Reporte)
+custom_admin_site.register(ArchivoAnalitico)
 
 # Chatbot
 custom_admin_site.register(SesionChatbot)
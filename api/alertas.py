@@ -0,0 +1,125 @@
+"""
+Alertas de stock bajo calculadas al escribir.
+
+Las funciones de api.stock conocen el saldo anterior y el nuevo de cada
+inventario que modifican; `registrar_cruces` compara ambos con
+`punto_reorden` y `stock_minimo` e inserta una AlertaStock solo cuando se
+cruza un umbral. Con stock sano no se ejecuta ninguna consulta adicional.
+Los clientes leen las alertas posteriores a un cursor (el id de la última
+alerta recibida) o se suscriben por server-sent events.
+"""
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from api.models import AlertaStock
+
+UMBRALES = ("punto_reorden", "stock_minimo")
+
+
+def cruces(anterior, nueva, umbrales):
+    """
+    Umbrales cruzados al pasar de `anterior` a `nueva`. Un saldo está bajo
+    el umbral cuando es menor que él, igual que en inventarios/bajo-stock.
+
+    :param umbrales: {nombre: valor}; los valores None se ignoran
+    :return: Lista de (umbral, valor, evento)
+    """
+    anterior = anterior or 0
+    nueva = nueva or 0
+    resultado = []
+    for umbral in UMBRALES:
+        valor = umbrales.get(umbral)
+        if valor is None:
+            continue
+        if anterior >= valor > nueva:
+            resultado.append((umbral, valor, "bajo"))
+        elif nueva >= valor > anterior:
+            resultado.append((umbral, valor, "recuperado"))
+    return resultado
+
+
+def registrar_cruces(cambios):
+    """
+    Registra las alertas de una operación de stock con un solo bulk_create.
+    Debe llamarse en la misma transacción que modifica los saldos.
+
+    :param cambios: Diccionarios con inventario_id, producto_id, anterior,
+        nueva, punto_reorden y stock_minimo
+    :return: Alertas creadas
+    """
+    alertas = [
+        AlertaStock(
+            inventario_id=cambio["inventario_id"],
+            producto_id=cambio["producto_id"],
+            umbral=umbral,
+            evento=evento,
+            valor_umbral=valor,
+            cantidad_anterior=cambio["anterior"] or 0,
+            cantidad=cambio["nueva"] or 0,
+        )
+        for cambio in cambios
+        for umbral, valor, evento in cruces(cambio["anterior"], cambio["nueva"], cambio)
+    ]
+    if not alertas:
+        return []
+    return AlertaStock.objects.bulk_create(alertas)
+
+
+def alertas_desde(cursor, limite=100):
+    """
+    Alertas con id mayor que `cursor`, en orden de creación (búsqueda por
+    clave primaria).
+    """
+    return (
+        AlertaStock.objects.filter(id__gt=cursor)
+        .select_related("producto")
+        .order_by("id")[:limite]
+    )
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Solo declara text/event-stream para la negociación de contenido; la
+    vista arma la respuesta con `eventos`.
+    """
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b""
+
+
+async def eventos(cursor, renderizar):
+    """
+    Genera server-sent events con las alertas posteriores a `cursor`.
+    Consulta la tabla cada ALERTAS_SSE_INTERVALO segundos y cierra la
+    conexión tras ALERTAS_SSE_DURACION; el cliente reconecta con
+    Last-Event-ID y continúa desde ahí.
+
+    Es un generador asíncrono para que uvicorn envíe cada evento al
+    generarse y la espera entre consultas no ocupe un hilo.
+
+    :param renderizar: Función síncrona que convierte una lista de alertas
+        en una lista de cadenas JSON
+    """
+    fin = time.monotonic() + settings.ALERTAS_SSE_DURACION
+    renderizar = sync_to_async(renderizar)
+    yield f"retry: {settings.ALERTAS_SSE_INTERVALO * 1000}\n\n"
+    while True:
+        alertas = [alerta async for alerta in alertas_desde(cursor)]
+        if alertas:
+            for alerta, datos in zip(alertas, await renderizar(alertas)):
+                yield f"id: {alerta.id}\nevent: alerta\ndata: {datos}\n\n"
+                cursor = alerta.id
+        if time.monotonic() >= fin:
+            return
+        if not alertas:
+            yield ": ping\n\n"
+            await asyncio.sleep(settings.ALERTAS_SSE_INTERVALO)
@@ -0,0 +1,280 @@
+"""
+Exportación analítica del historial de producción y ventas en Parquet.
+
+Cada dataset se escribe en ANALITICA_DIR/<dataset>/fecha=<AAAA-MM-DD>/ con
+la estructura particionada que leen pyarrow.dataset, DuckDB o pandas, para
+que el análisis pesado no consulte la base de datos transaccional.
+
+`exportar_dataset` es incremental: lee solo las filas con id mayor que la
+marca de agua (el mayor `hasta_id` registrado en ArchivoAnalitico), en orden
+(fecha, id), con un cursor del lado del servidor. Escribe un archivo por
+fecha, en grupos de ANALITICA_CHUNK_SIZE filas, así la memoria no depende
+del tamaño de la tabla. Cada fila se exporta una sola vez: los cambios
+posteriores (p. ej. el estado de un pedido) no se reexportan.
+"""
+
+import os
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api.models import (
+    ArchivoAnalitico,
+    ControlProduccionAgua,
+    ControlSoploBotellas,
+    DetallePedido,
+    MovimientoInventario,
+)
+
+
+def _pyarrow():
+    # Importación diferida: pyarrow es pesado y solo lo usa esta exportación
+    import pyarrow
+    import pyarrow.parquet
+
+    return pyarrow, pyarrow.parquet
+
+
+TIPOS = {
+    "entero": lambda pa: pa.int64(),
+    "texto": lambda pa: pa.string(),
+    "fecha_hora": lambda pa: pa.timestamp("us", tz="UTC"),
+    "decimal": lambda pa: pa.decimal128(10, 2),
+}
+
+
+class DatasetAnalitico:
+    """
+    Describe un dataset exportable.
+
+    :param queryset: Función que retorna el queryset de origen
+    :param campo_fecha: Campo del queryset por el que se particiona
+    :param columnas: Lista de (nombre en el archivo, campo del queryset,
+        tipo de TIPOS); debe incluir "id" y `campo_fecha`
+    """
+
+    def __init__(self, nombre, queryset, campo_fecha, columnas):
+        self.nombre = nombre
+        self.queryset = queryset
+        self.campo_fecha = campo_fecha
+        self.columnas = columnas
+
+    @property
+    def campos(self):
+        return [campo for _, campo, _ in self.columnas]
+
+
+DATASETS = {
+    dataset.nombre: dataset
+    for dataset in (
+        DatasetAnalitico(
+            "control_soplo_botellas",
+            ControlSoploBotellas.objects.all,
+            "fecha",
+            [
+                ("id", "id", "entero"),
+                ("fecha", "fecha", "fecha_hora"),
+                ("proveedor_preforma", "proveedor_preforma", "texto"),
+                ("peso_gramos", "peso_gramos", "decimal"),
+                ("volumen_botella_ml", "volumen_botella_ml", "entero"),
+                ("produccion_buena", "produccion_buena", "entero"),
+                ("produccion_danada", "produccion_danada", "entero"),
+                ("produccion_total", "produccion_total", "entero"),
+                ("empleado_id", "empleado_id", "entero"),
+            ],
+        ),
+        DatasetAnalitico(
+            "control_produccion_agua",
+            ControlProduccionAgua.objects.all,
+            "fecha_produccion",
+            [
+                ("id", "id", "entero"),
+                ("fecha_produccion", "fecha_produccion", "fecha_hora"),
+                ("numero_lote", "numero_lote", "texto"),
+                ("fecha_vencimiento", "fecha_vencimiento", "fecha_hora"),
+                ("botellas_envasadas", "botellas_envasadas", "entero"),
+                ("botellas_malogradas", "botellas_malogradas", "entero"),
+                ("tapas_malogradas", "tapas_malogradas", "entero"),
+                ("etiquetas_malogradas", "etiquetas_malogradas", "entero"),
+                ("total_botella_buenas", "total_botella_buenas", "entero"),
+                ("total_paquetes", "total_paquetes", "entero"),
+                ("empleado_id", "empleado_id", "entero"),
+                ("control_soplado_id", "control_soplado_id", "entero"),
+            ],
+        ),
+        DatasetAnalitico(
+            "detalle_pedido",
+            DetallePedido.objects.all,
+            "pedido__fecha_pedido",
+            [
+                ("id", "id", "entero"),
+                ("fecha_pedido", "pedido__fecha_pedido", "fecha_hora"),
+                ("pedido_id", "pedido_id", "entero"),
+                ("estado_pedido", "pedido__estado_pedido", "texto"),
+                ("cliente_id", "pedido__cliente_id", "entero"),
+                ("producto_id", "producto_id", "entero"),
+                ("cantidad", "cantidad", "entero"),
+                ("precio_unitario", "precio_unitario", "decimal"),
+                ("subtotal", "subtotal", "decimal"),
+            ],
+        ),
+        DatasetAnalitico(
+            "movimiento_inventario",
+            MovimientoInventario.objects.all,
+            "fecha_movimiento",
+            [
+                ("id", "id", "entero"),
+                ("fecha_movimiento", "fecha_movimiento", "fecha_hora"),
+                ("inventario_id", "inventario_id", "entero"),
+                ("producto_id", "inventario__producto_id", "entero"),
+                ("tipo_movimiento", "tipo_movimiento", "texto"),
+                ("cantidad", "cantidad", "entero"),
+                ("empleado_id", "empleado_id", "entero"),
+                ("documento_referencia", "documento_referencia", "texto"),
+            ],
+        ),
+    )
+}
+
+
+def marca_agua(nombre):
+    """
+    Mayor id ya exportado del dataset (0 si nunca se exportó).
+    """
+    return (
+        ArchivoAnalitico.objects.filter(dataset=nombre).aggregate(
+            marca=Max("hasta_id")
+        )["marca"]
+        or 0
+    )
+
+
+def ruta_absoluta(archivo):
+    return os.path.join(settings.ANALITICA_DIR, archivo.ruta)
+
+
+class _Particion:
+    """
+    Archivo Parquet de una fecha en escritura. Se escribe con un nombre
+    oculto (los lectores de datasets ignoran los archivos que empiezan con
+    punto) y se renombra al cerrarlo.
+    """
+
+    def __init__(self, dataset, fecha, esquema, bloque):
+        self.pa, pq = _pyarrow()
+        self.dataset = dataset
+        self.fecha = fecha
+        self.esquema = esquema
+        self.bloque = bloque
+        self.directorio = os.path.join(dataset.nombre, f"fecha={fecha.isoformat()}")
+        os.makedirs(
+            os.path.join(settings.ANALITICA_DIR, self.directorio), exist_ok=True
+        )
+        self.temporal = os.path.join(
+            settings.ANALITICA_DIR, self.directorio, f".{uuid.uuid4().hex}.tmp"
+        )
+        self.escritor = pq.ParquetWriter(self.temporal, esquema, compression="zstd")
+        self.columnas = [[] for _ in esquema]
+        self.filas = 0
+        self.desde_id = self.hasta_id = None
+
+    def agregar(self, fila, id_):
+        for columna, valor in zip(self.columnas, fila):
+            columna.append(valor)
+        self.filas += 1
+        self.desde_id = id_ if self.desde_id is None else min(self.desde_id, id_)
+        self.hasta_id = id_ if self.hasta_id is None else max(self.hasta_id, id_)
+        if len(self.columnas[0]) == self.bloque:
+            self._volcar()
+
+    def _volcar(self):
+        lote = self.pa.RecordBatch.from_arrays(
+            [
+                self.pa.array(columna, type=tipo)
+                for columna, tipo in zip(self.columnas, self.esquema.types)
+            ],
+            schema=self.esquema,
+        )
+        self.escritor.write_batch(lote)
+        self.columnas = [[] for _ in self.esquema]
+
+    def cerrar(self):
+        """
+        :return: ArchivoAnalitico sin guardar del archivo final
+        """
+        if self.columnas[0]:
+            self._volcar()
+        self.escritor.close()
+        ruta = os.path.join(
+            self.directorio, f"parte-{self.desde_id:012d}-{self.hasta_id:012d}.parquet"
+        )
+        final = os.path.join(settings.ANALITICA_DIR, ruta)
+        os.replace(self.temporal, final)
+        return ArchivoAnalitico(
+            dataset=self.dataset.nombre,
+            fecha=self.fecha,
+            ruta=ruta,
+            filas=self.filas,
+            desde_id=self.desde_id,
+            hasta_id=self.hasta_id,
+            tamano=os.path.getsize(final),
+        )
+
+    def descartar(self):
+        self.escritor.close()
+        if os.path.exists(self.temporal):
+            os.remove(self.temporal)
+
+
+def exportar_dataset(dataset, bloque=None):
+    """
+    Exporta las filas nuevas del dataset desde su marca de agua. Ejecutar
+    desde un solo proceso programado; dos ejecuciones simultáneas
+    exportarían las mismas filas.
+
+    :return: Archivos creados
+    """
+    pa, _ = _pyarrow()
+    bloque = bloque or settings.ANALITICA_CHUNK_SIZE
+    esquema = pa.schema(
+        [(nombre, TIPOS[tipo](pa)) for nombre, _, tipo in dataset.columnas]
+    )
+    campos = dataset.campos
+    indice_fecha = campos.index(dataset.campo_fecha)
+    indice_id = campos.index("id")
+    filas = (
+        dataset.queryset()
+        .filter(id__gt=marca_agua(dataset.nombre))
+        .order_by(dataset.campo_fecha, "id")
+        .values_list(*campos)
+        .iterator(chunk_size=bloque)
+    )
+
+    archivos = []
+    particion = None
+    try:
+        for fila in filas:
+            fecha = timezone.localdate(fila[indice_fecha])
+            if particion is None or particion.fecha != fecha:
+                if particion is not None:
+                    archivos.append(particion.cerrar())
+                particion = _Particion(dataset, fecha, esquema, bloque)
+            particion.agregar(fila, fila[indice_id])
+        if particion is not None:
+            archivos.append(particion.cerrar())
+            particion = None
+
+        with transaction.atomic():
+            return ArchivoAnalitico.objects.bulk_create(archivos)
+    except BaseException:
+        # Sin registro en la BD los archivos no avanzan la marca de agua;
+        # se eliminan para que la próxima ejecución no los duplique
+        if particion is not None:
+            particion.descartar()
+        for archivo in archivos:
+            if os.path.exists(ruta_absoluta(archivo)):
+                os.remove(ruta_absoluta(archivo))
+        raise
@@ -0,0 +1,169 @@
+"""
+Versiones asíncronas de los endpoints que usa el chatbot.
+
+Responden igual que las acciones de los ViewSets, pero sin ocupar un hilo
+mientras esperan a la base de datos o a servicios externos cuando se sirven
+con ASGI (uvicorn). Las escrituras que necesitan transacción se ejecutan con
+sync_to_async porque el ORM asíncrono aún no soporta transacciones.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from api.cache import aobtener_catalogo, respuesta_catalogo
+from api.models import Cliente, Pedido, Producto
+from api.pedidos import (
+    PedidoInvalidoError,
+    confirmar_pedido,
+    crear_pedido_temporal,
+    productos_con_stock_qs,
+)
+from api.serializers import PedidoSerializer, ProductoSerializer
+from api.stock import StockInsuficienteError
+
+
+def _respuesta(data, status=200):
+    # Mismo formato JSON que DRF (Decimal como número)
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _leer_json(request):
+    try:
+        return json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+
+
+async def _autenticar(request):
+    """
+    Aplica DEFAULT_AUTHENTICATION_CLASSES como lo hacen las acciones DRF:
+    un header Authorization rechazado responde 401 (403 si la clase no
+    define WWW-Authenticate); sin header la petición sigue como anónima.
+    """
+    for clase in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        autenticador = clase()
+        try:
+            if await sync_to_async(autenticador.authenticate)(request):
+                return None
+        except AuthenticationFailed as e:
+            data = e.detail if isinstance(e.detail, dict) else {"detail": e.detail}
+            cabecera = autenticador.authenticate_header(request)
+            response = _respuesta(data, 401 if cabecera else 403)
+            if cabecera:
+                response["WWW-Authenticate"] = cabecera
+            return response
+    return None
+
+
+@require_GET
+async def productos_disponibles(request):
+    def renderizar():
+        productos = Producto.objects.filter(estado=True, cantidad_actual__gt=0)
+        return JSONRenderer().render(ProductoSerializer(productos, many=True).data)
+
+    return respuesta_catalogo(await aobtener_catalogo(renderizar), request)
+
+
+@csrf_exempt
+@require_POST
+async def check_stock(request):
+    data = _leer_json(request) or {}
+    producto_id = data.get("producto_id")
+    cantidad = data.get("cantidad")
+
+    if not producto_id or not cantidad:
+        return _respuesta({"error": "producto_id y cantidad son requeridos."}, 400)
+
+    producto = await productos_con_stock_qs([producto_id]).afirst()
+    if producto is None:
+        return _respuesta({"detail": "No encontrado."}, 404)
+
+    if (producto.stock_inventario or 0) < cantidad:
+        return _respuesta({"disponible": False, "mensaje": "Stock insuficiente."})
+
+    return _respuesta(
+        {
+            "disponible": True,
+            "precio_unitario": producto.precio_unitario,
+            "total": producto.precio_unitario * cantidad,
+        }
+    )
+
+
+@csrf_exempt
+@require_POST
+async def crear_pedido_temp(request):
+    data = _leer_json(request) or {}
+    cliente_id = data.get("cliente_id")
+    items = data.get("items")  # Lista de {producto_id, cantidad}
+
+    if not cliente_id or not items:
+        return _respuesta({"error": "cliente_id y items son requeridos."}, 400)
+
+    try:
+        cliente = await Cliente.objects.aget(id=cliente_id)
+    except (Cliente.DoesNotExist, ValueError):
+        return _respuesta({"detail": "No encontrado."}, 404)
+
+    try:
+        pedido, total_pedido = await sync_to_async(crear_pedido_temporal)(
+            cliente, items, comentarios=data.get("comentarios", "")
+        )
+    except Http404 as e:
+        return _respuesta({"detail": str(e)}, 404)
+    except PedidoInvalidoError as e:
+        return _respuesta({"error": str(e)}, 400)
+
+    return _respuesta(
+        {"pedido": PedidoSerializer(pedido).data, "total_pedido": total_pedido}, 201
+    )
+
+
+@csrf_exempt
+@require_POST
+async def confirmar_pago(request, pk):
+    error = await _autenticar(request)
+    if error is not None:
+        return error
+
+    token = request.headers.get("Authorization")
+    if (
+        not settings.CONFIRM_PAYMENT_TOKEN
+        or token != f"Bearer {settings.CONFIRM_PAYMENT_TOKEN}"
+    ):
+        return _respuesta({"error": "Autenticación inválida."}, 403)
+
+    try:
+        pedido = await Pedido.objects.aget(pk=pk)
+    except Pedido.DoesNotExist:
+        return _respuesta({"detail": "No encontrado."}, 404)
+
+    if pedido.estado_pedido != "pendiente":
+        return _respuesta({"error": "El pedido no está en estado pendiente."}, 400)
+
+    # La distribución se entrega en on_commit al pool de hilos de
+    # programar_distribucion: una tarea del event loop se cancelaría al
+    # responder cuando la vista se sirve con WSGI
+    try:
+        await sync_to_async(confirmar_pedido)(pedido)
+    except StockInsuficienteError as e:
+        return _respuesta({"error": str(e), "faltantes": e.faltantes}, 400)
+    except Exception as e:
+        return _respuesta({"error": str(e)}, 400)
+
+    return _respuesta(
+        {
+            "success": True,
+            "mensaje": "Pago confirmado y pedido actualizado.",
+            "distribucion": "programada",
+        }
+    )
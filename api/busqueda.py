@@ -0,0 +1,216 @@
+"""
+Búsqueda de texto para Cliente, Producto y Empleado.
+
+Cada modelo tiene una columna generada `busqueda` con sus campos de texto en
+minúsculas. En PostgreSQL se consulta con full-text (índice GIN sobre
+to_tsvector) más similitud de trigramas de pg_trgm (índice GIN
+gin_trgm_ops), así los errores de tipeo también encuentran resultados. En
+SQLite se usa un índice de trigramas en memoria por modelo, que se
+reconstruye cuando cambia alguna fila (versión en la cache compartida, como
+el catálogo de api.cache) o cuando vence BUSQUEDA_INDICE_TTL, que acota lo
+que se sirve tras escrituras sin señales (update(), SQL directo).
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+# Configuración de full-text; debe coincidir con la de los índices de 0017
+CONFIGURACION = "spanish"
+# Igual que pg_trgm.word_similarity_threshold por defecto
+UMBRAL_SIMILITUD = 0.6
+
+
+def normalizar(texto):
+    """
+    Minúsculas, sin tildes y con espacios simples.
+    """
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+
+def trigramas(texto):
+    """
+    Trigramas de cada palabra, con el mismo relleno que pg_trgm
+    (dos espacios al inicio y uno al final).
+    """
+    resultado = set()
+    for palabra in re.findall(r"\w+", normalizar(texto)):
+        palabra = f"  {palabra} "
+        for i in range(len(palabra) - 2):
+            resultado.add(palabra[i : i + 3])
+    return resultado
+
+
+class IndiceTrigramas:
+    """
+    Índice invertido trigrama -> ids. La similitud es la fracción de
+    trigramas de la consulta presentes en el texto, una aproximación de
+    word_similarity de pg_trgm.
+    """
+
+    def __init__(self, filas):
+        self.textos = {}
+        self.ids_por_trigrama = defaultdict(set)
+        for id_, texto in filas:
+            self.textos[id_] = normalizar(texto)
+            for trigrama in trigramas(texto):
+                self.ids_por_trigrama[trigrama].add(id_)
+
+    def buscar(self, texto, umbral=UMBRAL_SIMILITUD):
+        """
+        :return: Lista de (id, similitud) ordenada de mayor a menor
+        """
+        consulta = trigramas(texto)
+        if not consulta:
+            return []
+        coincidencias = Counter()
+        for trigrama in consulta:
+            coincidencias.update(self.ids_por_trigrama.get(trigrama, ()))
+
+        normalizado = normalizar(texto)
+        resultado = []
+        for id_, cantidad in coincidencias.items():
+            if normalizado in self.textos[id_]:
+                similitud = 1.0
+            else:
+                similitud = cantidad / len(consulta)
+            if similitud >= umbral:
+                resultado.append((id_, similitud))
+        resultado.sort(key=lambda fila: (-fila[1], fila[0]))
+        return resultado
+
+
+INDICE_VERSION_KEY = "busqueda:version:{tabla}"
+
+# Modelo -> (versión, vencimiento, índice)
+_indices = {}
+_bloqueo = threading.Lock()
+
+
+def _clave_version(modelo):
+    return INDICE_VERSION_KEY.format(tabla=modelo._meta.db_table)
+
+
+def version_indice(modelo):
+    clave = _clave_version(modelo)
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, 1, timeout=None)
+        version = cache.get(clave, 1)
+    return version
+
+
+def indice_memoria(modelo):
+    version = version_indice(modelo)
+    with _bloqueo:
+        entrada = _indices.get(modelo)
+        if entrada and entrada[0] == version and entrada[1] > time.monotonic():
+            return entrada[2]
+        indice = IndiceTrigramas(
+            modelo.objects.values_list("id", "busqueda").iterator()
+        )
+        vence = time.monotonic() + settings.BUSQUEDA_INDICE_TTL
+        _indices[modelo] = (version, vence, indice)
+        return indice
+
+
+def invalidar_indice(modelo):
+    """
+    Incrementa la versión del índice del modelo para que todos los procesos
+    lo reconstruyan. En PostgreSQL no hay índice en memoria.
+    """
+    if connection.vendor == "postgresql":
+        return
+    try:
+        cache.incr(_clave_version(modelo))
+    except ValueError:
+        cache.add(_clave_version(modelo), 1, timeout=None)
+    with _bloqueo:
+        _indices.pop(modelo, None)
+
+
+def _condicion_postgres(modelo, texto):
+    columna = f'"{modelo._meta.db_table}"."busqueda"'
+    # La expresión de to_tsvector es idéntica a la del índice para que lo use
+    return RawSQL(
+        f"(to_tsvector('{CONFIGURACION}'::regconfig, {columna}) "
+        f"@@ plainto_tsquery('{CONFIGURACION}'::regconfig, %s) "
+        f"OR %s <%% {columna})",
+        (texto, texto),
+        output_field=BooleanField(),
+    )
+
+
+def _similitud_postgres(modelo, texto):
+    return RawSQL(
+        f'word_similarity(%s, "{modelo._meta.db_table}"."busqueda")',
+        (texto,),
+        output_field=FloatField(),
+    )
+
+
+def buscar(queryset, texto):
+    """
+    Filtra `queryset` por las filas que coinciden con `texto`. El orden del
+    queryset no cambia; para ordenar por relevancia se usa `sugerir`.
+    """
+    modelo = queryset.model
+    if connection.vendor == "postgresql":
+        texto = " ".join((texto or "").lower().split())
+        if not texto:
+            return queryset
+        return queryset.filter(_condicion_postgres(modelo, texto))
+
+    if not normalizar(texto):
+        return queryset
+    ids = [id_ for id_, _ in indice_memoria(modelo).buscar(texto)]
+    return queryset.filter(id__in=ids)
+
+
+def sugerir(queryset, texto, limite=5):
+    """
+    Las `limite` filas más parecidas a `texto`, de mayor a menor similitud.
+    Pensado para textos libres del chatbot.
+    """
+    modelo = queryset.model
+    if connection.vendor == "postgresql":
+        texto = " ".join((texto or "").lower().split())
+        if not texto:
+            return []
+        return list(
+            queryset.filter(_condicion_postgres(modelo, texto))
+            .annotate(similitud=_similitud_postgres(modelo, texto))
+            .order_by("-similitud", "id")[:limite]
+        )
+
+    similitudes = dict(indice_memoria(modelo).buscar(texto))
+    filas = list(queryset.filter(id__in=similitudes))
+    for fila in filas:
+        fila.similitud = similitudes[fila.id]
+    filas.sort(key=lambda fila: (-fila.similitud, fila.id))
+    return filas[:limite]
+
+
+class BusquedaFilter(BaseFilterBackend):
+    """
+    Filtro `?q=` para los ViewSets de modelos con columna `busqueda`.
+    """
+
+    parametro = "q"
+
+    def filter_queryset(self, request, queryset, view):
+        texto = request.query_params.get(self.parametro)
+        if not texto:
+            return queryset
+        return buscar(queryset, texto)
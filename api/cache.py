@@ -0,0 +1,130 @@
+import hashlib
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+CATALOGO_VERSION_KEY = "catalogo:version"
+CATALOGO_KEY = "catalogo:disponibles:v{version}"
+
+_local = {}
+_local_lock = threading.Lock()
+_estadisticas = {"hits_locales": 0, "hits_compartidos": 0, "misses": 0}
+
+
+def _contar(evento):
+    with _local_lock:
+        _estadisticas[evento] += 1
+
+
+def version_catalogo():
+    """
+    Retorna la versión vigente del catálogo en la cache compartida.
+    """
+    version = cache.get(CATALOGO_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGO_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOGO_VERSION_KEY, 1)
+    return version
+
+
+def invalidar_catalogo():
+    """
+    Incrementa la versión del catálogo. Las entradas anteriores quedan
+    huérfanas y expiran solas en la cache compartida.
+    """
+    try:
+        cache.incr(CATALOGO_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOGO_VERSION_KEY, 1, timeout=None)
+    with _local_lock:
+        _local.clear()
+
+
+def obtener_catalogo(renderizar):
+    """
+    Retorna la entrada cacheada del catálogo de productos disponibles.
+
+    Busca primero en la memoria del proceso, luego en la cache compartida y,
+    si no existe, llama a `renderizar()` para generar el JSON en bytes.
+
+    :param renderizar: Función que retorna el contenido JSON en bytes
+    :return: Diccionario con `contenido`, `etag` y `modificado`
+    """
+    version = version_catalogo()
+
+    # La versión solo avanza con las escrituras que ve la cache compartida;
+    # el TTL acota lo que un proceso sirve sin volver a consultarla
+    memo = _local.get(version)
+    if memo is not None and memo[1] > time.monotonic():
+        _contar("hits_locales")
+        return memo[0]
+
+    key = CATALOGO_KEY.format(version=version)
+    entrada = cache.get(key)
+    if entrada is not None:
+        _contar("hits_compartidos")
+    else:
+        _contar("misses")
+        entrada = _nueva_entrada(renderizar())
+        cache.set(key, entrada, timeout=settings.CATALOGO_CACHE_TIMEOUT)
+
+    _guardar_local(version, entrada)
+    return entrada
+
+
+async def aobtener_catalogo(renderizar):
+    """
+    Versión asíncrona de `obtener_catalogo`; `renderizar` se ejecuta en un
+    hilo, por lo que puede consultar el ORM de forma síncrona.
+    """
+    return await sync_to_async(obtener_catalogo)(renderizar)
+
+
+def _nueva_entrada(contenido):
+    return {
+        "contenido": contenido,
+        "etag": f'"{hashlib.md5(contenido).hexdigest()}"',
+        "modificado": timezone.now().replace(microsecond=0),
+    }
+
+
+def _guardar_local(version, entrada):
+    with _local_lock:
+        _local.clear()
+        _local[version] = (
+            entrada,
+            time.monotonic() + settings.CATALOGO_CACHE_LOCAL_TTL,
+        )
+
+
+def estadisticas_catalogo():
+    """
+    Retorna los contadores de hits/misses del proceso actual.
+    """
+    with _local_lock:
+        estadisticas = dict(_estadisticas)
+    estadisticas["version"] = version_catalogo()
+    return estadisticas
+
+
+def respuesta_catalogo(entrada, request):
+    """
+    Construye la respuesta del catálogo con ETag y Last-Modified, o un 304
+    si el cliente ya tiene la versión vigente.
+    """
+    modificado = entrada["modificado"].timestamp()
+    response = get_conditional_response(
+        request, etag=entrada["etag"], last_modified=modificado
+    )
+    if response is None:
+        response = HttpResponse(entrada["contenido"], content_type="application/json")
+    response["ETag"] = entrada["etag"]
+    response["Last-Modified"] = http_date(modificado)
+    return response
@@ -0,0 +1,555 @@
+"""
+Importación y exportación masiva en CSV o JSON Lines.
+
+La importación lee el archivo por bloques de CARGA_MASIVA_BLOQUE filas. Cada
+fila se valida con los campos del modelo. Las claves únicas y foráneas se
+comprueban con una consulta por bloque. Las filas válidas se escriben con
+COPY FROM STDIN en PostgreSQL y con bulk_create en otras bases. Las filas
+con error se reportan con su número de línea y no detienen la carga.
+
+La exportación usa COPY TO en PostgreSQL para CSV y un cursor del lado del
+servidor para el resto, así la memoria no crece con la tabla.
+"""
+
+import codecs
+import csv
+import io
+import json
+import tempfile
+from datetime import date, datetime
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from api import kpis, resumenes
+from api.busqueda import invalidar_indice
+from api.cache import invalidar_catalogo
+from api.clientes import invalidar_clientes, normalizar_telefono
+from api.models import Cliente, ControlProduccionAgua, Producto
+from api.streaming import iterar_async
+
+FORMATOS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+class FormatoInvalidoError(ValueError):
+    """
+    El archivo no se puede leer o sus columnas no corresponden a la entidad.
+    """
+
+
+class DefinicionCarga:
+    """
+    Describe una entidad que se importa y exporta en bloque.
+
+    :param campos: Columnas del archivo (attname del modelo), en el orden de
+        exportación
+    :param unicos: Campos con restricción única, validados por bloque
+    :param normalizar: {campo: función} aplicada al valor antes de validarlo
+    :param campo_fecha: Campo cuyo rango importado recibe `al_importar`
+    :param al_importar: Función (desde, hasta) que actualiza los datos
+        derivados; COPY y bulk_create no emiten señales
+    """
+
+    def __init__(
+        self,
+        nombre,
+        modelo,
+        campos,
+        unicos=(),
+        normalizar=None,
+        campo_fecha=None,
+        al_importar=None,
+    ):
+        self.nombre = nombre
+        self.modelo = modelo
+        self.campos = campos
+        self.unicos = unicos
+        self.normalizar = normalizar or {}
+        self.campo_fecha = campo_fecha
+        self.al_importar = al_importar
+        self.campos_modelo = {campo: modelo._meta.get_field(campo) for campo in campos}
+
+    @property
+    def requeridos(self):
+        return {
+            nombre
+            for nombre, campo in self.campos_modelo.items()
+            if not (campo.null or campo.blank or campo.has_default())
+        }
+
+
+def _al_importar_clientes(desde, hasta):
+    transaction.on_commit(invalidar_clientes)
+    transaction.on_commit(partial(invalidar_indice, Cliente))
+
+
+def _al_importar_productos(desde, hasta):
+    transaction.on_commit(invalidar_catalogo)
+    transaction.on_commit(partial(invalidar_indice, Producto))
+
+
+def _al_importar_controles(desde, hasta):
+    resumenes.reconstruir_resumenes(
+        resumenes.PRODUCCION_AGUA,
+        timezone.localdate(desde),
+        timezone.localdate(hasta),
+    )
+    kpis.recalcular_kpis(
+        [definicion.codigo for definicion in kpis.definiciones(ControlProduccionAgua)]
+    )
+
+
+CARGAS = {
+    definicion.nombre: definicion
+    for definicion in (
+        DefinicionCarga(
+            "clientes",
+            Cliente,
+            [
+                "nombre",
+                "apellido_paterno",
+                "dni",
+                "telefono",
+                "direccion",
+                "latitud",
+                "longitud",
+                "fecha_registro",
+            ],
+            unicos=["dni"],
+            normalizar={"telefono": normalizar_telefono},
+            al_importar=_al_importar_clientes,
+        ),
+        DefinicionCarga(
+            "productos",
+            Producto,
+            [
+                "nombre",
+                "descripcion",
+                "precio_unitario",
+                "unidad_medida",
+                "stock_minimo",
+                "stock_maximo",
+                "estado",
+            ],
+            al_importar=_al_importar_productos,
+        ),
+        DefinicionCarga(
+            "control-produccion-agua",
+            ControlProduccionAgua,
+            [
+                "fecha_produccion",
+                "numero_lote",
+                "fecha_vencimiento",
+                "botellas_envasadas",
+                "botellas_malogradas",
+                "tapas_malogradas",
+                "etiquetas_malogradas",
+                "total_botella_buenas",
+                "total_paquetes",
+                "empleado_id",
+                "observaciones",
+                "control_soplado_id",
+            ],
+            unicos=["numero_lote"],
+            campo_fecha="fecha_produccion",
+            al_importar=_al_importar_controles,
+        ),
+    )
+}
+
+
+def _leer_csv(definicion, lineas):
+    lector = csv.DictReader(lineas)
+    if not lector.fieldnames:
+        raise FormatoInvalidoError("El archivo está vacío.")
+    columnas = set(lector.fieldnames)
+    desconocidas = columnas - set(definicion.campos)
+    if desconocidas:
+        raise FormatoInvalidoError(
+            f"Columnas desconocidas: {', '.join(sorted(desconocidas))}"
+        )
+    faltantes = definicion.requeridos - columnas
+    if faltantes:
+        raise FormatoInvalidoError(
+            f"Faltan columnas obligatorias: {', '.join(sorted(faltantes))}"
+        )
+    for fila in lector:
+        yield lector.line_num, fila
+
+
+def _leer_jsonl(definicion, lineas):
+    for numero, linea in enumerate(lineas, start=1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            fila = None
+        yield numero, fila
+
+
+def _limpiar_valor(definicion, nombre, valor):
+    campo = definicion.campos_modelo[nombre]
+    if nombre in definicion.normalizar:
+        valor = definicion.normalizar[nombre](valor)
+    if valor in ("", None):
+        if campo.has_default():
+            return campo.get_default()
+        valor = "" if campo.blank and not campo.null else None
+
+    if campo.is_relation:
+        # La existencia se comprueba por bloque en _validar_foraneas
+        if valor is None:
+            if not campo.null:
+                raise ValidationError(campo.error_messages["null"])
+            return None
+        return campo.target_field.to_python(valor)
+
+    valor = campo.clean(valor, None)
+    if isinstance(valor, datetime) and timezone.is_naive(valor):
+        valor = timezone.make_aware(valor)
+    return valor
+
+
+def _limpiar_fila(definicion, fila):
+    """
+    :return: (valores, errores); errores es {campo: [mensajes]} o vacío
+    """
+    if not isinstance(fila, dict):
+        return None, {"fila": ["No es un objeto JSON válido."]}
+    if None in fila:
+        # csv.DictReader guarda los valores sobrantes bajo la clave None
+        return None, {"fila": ["Tiene más columnas que el encabezado."]}
+    desconocidas = set(fila) - set(definicion.campos)
+    if desconocidas:
+        return None, {
+            campo: ["Campo desconocido."] for campo in sorted(desconocidas)
+        }
+
+    valores, errores = {}, {}
+    for nombre in definicion.campos:
+        try:
+            valores[nombre] = _limpiar_valor(definicion, nombre, fila.get(nombre))
+        except ValidationError as error:
+            errores[nombre] = error.messages
+    return valores, errores
+
+
+def _validar_foraneas(definicion, validas, errores):
+    for nombre, campo in definicion.campos_modelo.items():
+        if not campo.is_relation:
+            continue
+        ids = {valores[nombre] for _, valores in validas if valores[nombre] is not None}
+        existentes = set(
+            campo.related_model._default_manager.filter(pk__in=ids).values_list(
+                "pk", flat=True
+            )
+        )
+        restantes = []
+        for linea, valores in validas:
+            if valores[nombre] is None or valores[nombre] in existentes:
+                restantes.append((linea, valores))
+            else:
+                errores.append(
+                    {"linea": linea, "errores": {nombre: ["No existe el registro."]}}
+                )
+        validas = restantes
+    return validas
+
+
+def _validar_unicos(definicion, validas, errores, vistos):
+    """
+    Descarta las filas cuyo valor único ya existe en la BD o apareció antes
+    en el archivo (`vistos` se conserva entre bloques).
+    """
+    for nombre in definicion.unicos:
+        valores = {valores[nombre] for _, valores in validas if valores[nombre]}
+        existentes = set(
+            definicion.modelo._default_manager.filter(
+                **{f"{nombre}__in": valores}
+            ).values_list(nombre, flat=True)
+        )
+        restantes = []
+        for linea, valores in validas:
+            valor = valores[nombre]
+            if valor is not None and (valor in existentes or valor in vistos[nombre]):
+                errores.append(
+                    {"linea": linea, "errores": {nombre: ["El valor ya existe."]}}
+                )
+            else:
+                restantes.append((linea, valores))
+        validas = restantes
+
+    for _, valores in validas:
+        for nombre in definicion.unicos:
+            if valores[nombre] is not None:
+                vistos[nombre].add(valores[nombre])
+    return validas
+
+
+def _texto_copy(valor):
+    """
+    Valor en el formato de texto de COPY.
+    """
+    if valor is None:
+        return "\\N"
+    if isinstance(valor, bool):
+        return "t" if valor else "f"
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return (
+        str(valor)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copiar(modelo, instancias):
+    """
+    Inserta las instancias con COPY FROM STDIN (solo PostgreSQL). Las
+    columnas generadas y el id quedan a cargo de la BD.
+    """
+    campos = [
+        campo
+        for campo in modelo._meta.concrete_fields
+        if not campo.primary_key and not campo.generated
+    ]
+    buffer = io.StringIO()
+    for instancia in instancias:
+        buffer.write(
+            "\t".join(
+                _texto_copy(
+                    campo.get_db_prep_save(campo.pre_save(instancia, True), connection)
+                )
+                for campo in campos
+            )
+        )
+        buffer.write("\n")
+    buffer.seek(0)
+
+    columnas = ", ".join(connection.ops.quote_name(campo.column) for campo in campos)
+    sql = (
+        f"COPY {connection.ops.quote_name(modelo._meta.db_table)} ({columnas}) "
+        "FROM STDIN"
+    )
+    with connection.cursor() as cursor:
+        crudo = cursor.cursor
+        if hasattr(crudo, "copy_expert"):  # psycopg2
+            crudo.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with crudo.copy(sql) as copia:
+                copia.write(buffer.getvalue())
+
+
+def _escribir(definicion, validas):
+    instancias = [definicion.modelo(**valores) for _, valores in validas]
+    if connection.vendor == "postgresql":
+        _copiar(definicion.modelo, instancias)
+    else:
+        definicion.modelo._default_manager.bulk_create(instancias, batch_size=1000)
+
+
+def _cargar_bloque(definicion, bloque, vistos):
+    """
+    Valida y escribe un bloque en su propia transacción.
+
+    :return: (filas escritas, errores por fila)
+    """
+    validas, errores = [], []
+    for linea, fila in bloque:
+        valores, errores_fila = _limpiar_fila(definicion, fila)
+        if errores_fila:
+            errores.append({"linea": linea, "errores": errores_fila})
+        else:
+            validas.append((linea, valores))
+    validas = _validar_foraneas(definicion, validas, errores)
+    validas = _validar_unicos(definicion, validas, errores, vistos)
+
+    if validas:
+        try:
+            with transaction.atomic():
+                _escribir(definicion, validas)
+        except IntegrityError as error:
+            # Otra escritura concurrente ocupó una clave única del bloque
+            errores.extend(
+                {"linea": linea, "errores": {"fila": [str(error).strip()]}}
+                for linea, _ in validas
+            )
+            validas = []
+    errores.sort(key=lambda error: error["linea"])
+    return validas, errores
+
+
+def importar(definicion, lineas, formato="csv", bloque=None, max_errores=None):
+    """
+    Importa las filas de `lineas` (texto, una línea por elemento).
+
+    :return: Diccionario con filas leídas, creados, total_errores y los
+        primeros `max_errores` errores con su número de línea
+    :raises FormatoInvalidoError: Si el formato o las columnas no son válidos
+    """
+    if formato not in FORMATOS:
+        raise FormatoInvalidoError(f"Formato no soportado: {formato}")
+    bloque = bloque or settings.CARGA_MASIVA_BLOQUE
+    if max_errores is None:
+        max_errores = settings.CARGA_MASIVA_MAX_ERRORES
+    leer = _leer_csv if formato == "csv" else _leer_jsonl
+
+    resultado = {"filas": 0, "creados": 0, "total_errores": 0, "errores": []}
+    vistos = {nombre: set() for nombre in definicion.unicos}
+    rango = {"desde": None, "hasta": None}
+
+    def cargar(actual):
+        validas, errores = _cargar_bloque(definicion, actual, vistos)
+        resultado["filas"] += len(actual)
+        resultado["creados"] += len(validas)
+        resultado["total_errores"] += len(errores)
+        espacio = max_errores - len(resultado["errores"])
+        resultado["errores"].extend(errores[:espacio])
+        if definicion.campo_fecha and validas:
+            fechas = [valores[definicion.campo_fecha] for _, valores in validas]
+            if rango["desde"] is not None:
+                fechas += [rango["desde"], rango["hasta"]]
+            rango.update(desde=min(fechas), hasta=max(fechas))
+
+    actual = []
+    for linea, fila in leer(definicion, lineas):
+        actual.append((linea, fila))
+        if len(actual) == bloque:
+            cargar(actual)
+            actual = []
+    if actual:
+        cargar(actual)
+
+    if resultado["creados"] and definicion.al_importar:
+        definicion.al_importar(rango["desde"], rango["hasta"])
+    return resultado
+
+
+def _copiar_a(definicion):
+    """
+    CSV con encabezado generado por COPY TO STDOUT.
+    """
+    columnas = ", ".join(
+        connection.ops.quote_name(campo.column)
+        for campo in definicion.campos_modelo.values()
+    )
+    tabla = connection.ops.quote_name(definicion.modelo._meta.db_table)
+    sql = (
+        f"COPY (SELECT {columnas} FROM {tabla} ORDER BY id) "
+        "TO STDOUT WITH (FORMAT csv, HEADER)"
+    )
+    with connection.cursor() as cursor:
+        crudo = cursor.cursor
+        if hasattr(crudo, "copy_expert"):
+            # psycopg2 escribe todo de una vez: se pasa a disco sobre 8 MB
+            with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as archivo:
+                crudo.copy_expert(sql, archivo)
+                archivo.seek(0)
+                while datos := archivo.read(64 * 1024):
+                    yield datos
+        else:
+            with crudo.copy(sql) as copia:
+                for datos in copia:
+                    yield bytes(datos)
+
+
+def exportar(definicion, formato="csv", bloque=None):
+    """
+    Genera el contenido de la tabla en bytes, por partes y en orden de id.
+    """
+    if formato not in FORMATOS:
+        raise FormatoInvalidoError(f"Formato no soportado: {formato}")
+    if formato == "csv" and connection.vendor == "postgresql":
+        yield from _copiar_a(definicion)
+        return
+
+    bloque = bloque or settings.CARGA_MASIVA_BLOQUE
+    filas = (
+        definicion.modelo._default_manager.order_by("id")
+        .values_list(*definicion.campos)
+        .iterator(chunk_size=bloque)
+    )
+    buffer = io.StringIO()
+    if formato == "csv":
+        escritor = csv.writer(buffer)
+        escritor.writerow(definicion.campos)
+        escribir = escritor.writerow
+    else:
+
+        def escribir(fila):
+            buffer.write(
+                json.dumps(dict(zip(definicion.campos, fila)), cls=DjangoJSONEncoder)
+            )
+            buffer.write("\n")
+
+    for numero, fila in enumerate(filas, start=1):
+        escribir(fila)
+        if numero % bloque == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def formato_de_archivo(nombre, formato=None):
+    if formato:
+        return formato
+    return "jsonl" if nombre.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+class CargaMasivaMixin:
+    """
+    Agrega `importar/` (POST multipart con `archivo` y opcional `formato`) y
+    `exportar/?formato=csv|jsonl` al ViewSet. `carga_masiva` es la clave de
+    la entidad en CARGAS.
+    """
+
+    carga_masiva = None
+
+    @action(detail=False, methods=["post"], url_path="importar")
+    def importar_archivo(self, request):
+        archivo = request.FILES.get("archivo")
+        if archivo is None:
+            return Response(
+                {"error": "Debe enviar el archivo en el campo 'archivo'"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        formato = formato_de_archivo(archivo.name, request.data.get("formato"))
+        try:
+            resultado = importar(
+                CARGAS[self.carga_masiva],
+                codecs.iterdecode(archivo, "utf-8-sig"),
+                formato,
+            )
+        except (FormatoInvalidoError, UnicodeDecodeError) as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultado, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="exportar")
+    def exportar_archivo(self, request):
+        formato = request.query_params.get("formato", "csv")
+        if formato not in FORMATOS:
+            return Response(
+                {"error": f"Formatos soportados: {', '.join(FORMATOS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        response = StreamingHttpResponse(
+            iterar_async(exportar(CARGAS[self.carga_masiva], formato)),
+            content_type=FORMATOS[formato],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{self.carga_masiva}.{formato}"'
+        )
+        return response
@@ -0,0 +1,136 @@
+"""
+Identificación de clientes para el chatbot.
+
+`resolver_cliente` devuelve el id del cliente a partir del DNI o del
+teléfono de WhatsApp. Con DNI y nombre hace un solo INSERT ... ON CONFLICT
+(dni) DO UPDATE; con solo teléfono consulta primero una cache en memoria
+teléfono -> cliente_id y luego el índice idx_clientes_telefono. Así un
+cliente que vuelve se identifica sin un INSERT fallido de por medio.
+"""
+
+import re
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from api.busqueda import invalidar_indice
+from api.models import Cliente
+from api.tiempo_viaje import CacheLRU
+
+# Campos que el chatbot puede actualizar en un cliente existente
+ACTUALIZABLES = [
+    "nombre",
+    "apellido_paterno",
+    "telefono",
+    "direccion",
+    "latitud",
+    "longitud",
+]
+
+_cache_telefonos = None
+
+
+def normalizar_telefono(telefono):
+    """
+    Solo dígitos y sin el código de país de Perú (WhatsApp envía 51 + 9
+    dígitos), para que el mismo número siempre tenga la misma clave.
+    """
+    digitos = re.sub(r"\D", "", telefono or "")
+    if len(digitos) == 11 and digitos.startswith("51"):
+        digitos = digitos[2:]
+    return digitos or None
+
+
+def _obtener_cache():
+    global _cache_telefonos
+    if _cache_telefonos is None:
+        _cache_telefonos = CacheLRU(
+            settings.CLIENTES_CACHE_MAX_ENTRADAS, settings.CLIENTES_CACHE_TTL
+        )
+    return _cache_telefonos
+
+
+def invalidar_clientes():
+    """
+    Vacía la cache de teléfonos del proceso (al modificar o eliminar un
+    cliente fuera de `resolver_cliente`).
+    """
+    _obtener_cache().clear()
+
+
+def _por_telefono(telefono):
+    cliente_id = _obtener_cache().get(telefono)
+    if cliente_id is None:
+        cliente_id = (
+            Cliente.objects.filter(telefono=telefono)
+            .order_by("-id")
+            .values_list("id", flat=True)
+            .first()
+        )
+    return cliente_id
+
+
+def _mover_telefono(anterior, nuevo, cliente_id):
+    """
+    Actualiza la cache cuando el upsert cambia el teléfono de un cliente:
+    el número anterior ya no debe resolver a él.
+    """
+    cache = _obtener_cache()
+    if anterior and anterior != nuevo:
+        cache.delete(anterior)
+    cache.set(nuevo, cliente_id)
+
+
+def _upsert_por_dni(dni, datos):
+    campos = [campo for campo in ACTUALIZABLES if datos.get(campo) is not None]
+    anterior = None
+    if "telefono" in campos:
+        anterior = normalizar_telefono(
+            Cliente.objects.filter(dni=dni).values_list("telefono", flat=True).first()
+        )
+    (cliente,) = Cliente.objects.bulk_create(
+        [Cliente(dni=dni, **{campo: datos[campo] for campo in campos})],
+        update_conflicts=True,
+        unique_fields=["dni"],
+        update_fields=campos,
+    )
+    # bulk_create no emite post_save
+    transaction.on_commit(partial(invalidar_indice, Cliente))
+    if "telefono" in campos:
+        # Las caches de otros procesos expiran con CLIENTES_CACHE_TTL
+        transaction.on_commit(
+            partial(_mover_telefono, anterior, datos["telefono"], cliente.pk)
+        )
+    return cliente.pk
+
+
+def resolver_cliente(dni=None, telefono=None, **datos):
+    """
+    Identifica (y si hace falta registra o actualiza) al cliente.
+
+    :param dni: DNI; con nombre y apellido_paterno se hace upsert por DNI
+    :param telefono: Teléfono en cualquier formato
+    :param datos: nombre, apellido_paterno, direccion, latitud, longitud
+    :return: id del cliente, o None si no existe y faltan datos para
+        registrarlo
+    """
+    telefono = normalizar_telefono(telefono)
+    datos["telefono"] = telefono
+
+    if dni and datos.get("nombre") and datos.get("apellido_paterno"):
+        cliente_id = _upsert_por_dni(dni, datos)
+    else:
+        cliente_id = _por_telefono(telefono) if telefono else None
+        if cliente_id is None and dni:
+            cliente_id = (
+                Cliente.objects.filter(dni=dni).values_list("id", flat=True).first()
+            )
+        registrable = datos.get("nombre") and datos.get("apellido_paterno")
+        if cliente_id is None and registrable:
+            campos = {campo: datos.get(campo) for campo in ACTUALIZABLES}
+            cliente_id = Cliente.objects.create(dni=dni, **campos).pk
+
+    if cliente_id is not None and telefono:
+        _obtener_cache().set(telefono, cliente_id)
+    return cliente_id
@@ -0,0 +1,203 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from api.models import CorreoSaliente
+
+logger = logging.getLogger(__name__)
+
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+
+# SendGrid acepta hasta 1000 personalizaciones por petición
+SENDGRID_MAX_DESTINATARIOS = 1000
+
+
+class SendGridTransport:
+    """
+    Envía correos con la API v3 de SendGrid reutilizando una sola sesión
+    HTTP (keep-alive) para todos los hilos del worker.
+    Los correos con el mismo asunto y contenido se agrupan en una petición.
+    """
+
+    def __init__(self, api_key=None, pool_size=10, timeout=10):
+        self.api_key = api_key or settings.SENDGRID_API_KEY
+        if not self.api_key:
+            raise ImproperlyConfigured(
+                "SendGridTransport requiere SENDGRID_API_KEY; configure la clave "
+                "o EMAIL_OUTBOX_TRANSPORT=api.correo.FakeTransport en desarrollo."
+            )
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(
+            {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+            }
+        )
+
+    def enviar(self, correos):
+        """
+        Envía un grupo de correos con el mismo asunto y contenido.
+        Lanza una excepción si el proveedor rechaza la petición.
+        """
+        primero = correos[0]
+        payload = {
+            "personalizations": [
+                {"to": [{"email": correo.destinatario}]} for correo in correos
+            ],
+            "from": {"email": settings.DEFAULT_FROM_EMAIL},
+            "subject": primero.asunto,
+            "content": [{"type": "text/html", "value": primero.contenido_html}],
+        }
+        response = self.session.post(SENDGRID_URL, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+
+    def max_lote(self):
+        return SENDGRID_MAX_DESTINATARIOS
+
+
+class FakeTransport:
+    """
+    Transporte local que solo guarda los correos enviados en memoria.
+    Útil para pruebas y desarrollo sin credenciales de SendGrid.
+    """
+
+    def __init__(self, **kwargs):
+        self.enviados = []
+        self._lock = threading.Lock()
+
+    def enviar(self, correos):
+        with self._lock:
+            self.enviados.extend(
+                {
+                    "destinatario": correo.destinatario,
+                    "asunto": correo.asunto,
+                    "contenido_html": correo.contenido_html,
+                }
+                for correo in correos
+            )
+
+    def max_lote(self):
+        return SENDGRID_MAX_DESTINATARIOS
+
+
+def obtener_transporte(**kwargs):
+    """
+    Instancia el transporte configurado en EMAIL_OUTBOX_TRANSPORT.
+    """
+    return import_string(settings.EMAIL_OUTBOX_TRANSPORT)(**kwargs)
+
+
+def encolar_correo(destinatario, asunto, contenido_html):
+    """
+    Registra un correo en la bandeja de salida para su envío en segundo plano.
+    """
+    return CorreoSaliente.objects.create(
+        destinatario=destinatario, asunto=asunto, contenido_html=contenido_html
+    )
+
+
+def _reclamar_pendientes(limite):
+    """
+    Toma hasta `limite` correos pendientes y aplaza su próximo intento para
+    que otro worker no los procese al mismo tiempo.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        correos = list(
+            CorreoSaliente.objects.select_for_update(skip_locked=True)
+            .filter(estado="pendiente", proximo_intento__lte=ahora)
+            .order_by("proximo_intento", "id")[:limite]
+        )
+        CorreoSaliente.objects.filter(id__in=[correo.id for correo in correos]).update(
+            proximo_intento=ahora + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+        )
+    return correos
+
+
+def _agrupar(correos, max_lote):
+    """
+    Agrupa los correos con el mismo asunto y contenido en lotes de hasta
+    `max_lote` destinatarios.
+    """
+    clave = lambda correo: (correo.asunto, correo.contenido_html)  # noqa: E731
+    for _, grupo in groupby(sorted(correos, key=clave), key=clave):
+        grupo = list(grupo)
+        for inicio in range(0, len(grupo), max_lote):
+            yield grupo[inicio : inicio + max_lote]
+
+
+def _registrar_resultado(lote, error):
+    ahora = timezone.now()
+    ids = [correo.id for correo in lote]
+
+    if error is None:
+        # Se borra el contenido porque puede incluir contraseñas temporales
+        CorreoSaliente.objects.filter(id__in=ids).update(
+            estado="enviado", fecha_envio=ahora, contenido_html=""
+        )
+        return
+
+    for correo in lote:
+        intentos = correo.intentos + 1
+        cambios = {}
+        if intentos >= settings.EMAIL_OUTBOX_MAX_INTENTOS:
+            estado, proximo_intento = "fallido", ahora
+            # Ya no se reintentará: no se conserva la contraseña temporal
+            cambios["contenido_html"] = ""
+        else:
+            espera = settings.EMAIL_OUTBOX_BACKOFF * (2 ** (intentos - 1))
+            estado, proximo_intento = "pendiente", ahora + timedelta(seconds=espera)
+        CorreoSaliente.objects.filter(id=correo.id).update(
+            estado=estado,
+            intentos=intentos,
+            proximo_intento=proximo_intento,
+            ultimo_error=str(error),
+            **cambios,
+        )
+
+
+def procesar_bandeja(transporte, workers=4, limite=100):
+    """
+    Envía un bloque de correos pendientes usando un pool de hilos.
+
+    :return: Tupla (enviados, con error)
+    """
+    correos = _reclamar_pendientes(limite)
+    if not correos:
+        return 0, 0
+
+    def enviar_lote(lote):
+        try:
+            transporte.enviar(lote)
+            return lote, None
+        except Exception as e:
+            logger.warning("Error al enviar %s correos: %s", len(lote), e)
+            return lote, e
+
+    enviados = fallidos = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        resultados = list(
+            pool.map(enviar_lote, _agrupar(correos, transporte.max_lote()))
+        )
+
+    # Los resultados se guardan desde el hilo principal (una conexión a la BD)
+    for lote, error in resultados:
+        _registrar_resultado(lote, error)
+        if error is None:
+            enviados += len(lote)
+        else:
+            fallidos += len(lote)
+    return enviados, fallidos
@@ -0,0 +1,59 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def configuracion_efectiva(alias="default"):
+    """
+    Resume cómo se conectará Django a la base de datos `alias`.
+    """
+    settings_dict = connections[alias].settings_dict
+    pool = settings_dict.get("OPTIONS", {}).get("pool")
+    return {
+        "motor": settings_dict["ENGINE"].rsplit(".", 1)[-1],
+        "conn_max_age": settings_dict["CONN_MAX_AGE"],
+        "conn_health_checks": settings_dict["CONN_HEALTH_CHECKS"],
+        "pool": pool if pool else False,
+        "server_side_cursors": not settings_dict["DISABLE_SERVER_SIDE_CURSORS"],
+    }
+
+
+def verificar_pool(alias="default"):
+    """
+    Con DB_POOL=1 el pool es obligatorio: cualquier proceso falla al
+    iniciar si no está activo.
+    """
+    if settings.DB_POOL == "1" and not configuracion_efectiva(alias)["pool"]:
+        raise ImproperlyConfigured(
+            "DB_POOL=1 pero el pool no está activo: requiere PostgreSQL con "
+            "psycopg 3 y psycopg_pool instalados."
+        )
+
+
+def registrar_configuracion_bd(alias="default", asgi=False):
+    """
+    Registra la configuración de conexiones efectiva. Se llama desde
+    backend.wsgi y backend.asgi, no en los comandos de manage.py.
+    """
+    configuracion = configuracion_efectiva(alias)
+    logger.info(
+        "Base de datos '%s': %s",
+        alias,
+        ", ".join(f"{clave}={valor}" for clave, valor in configuracion.items()),
+    )
+
+    if asgi and configuracion["conn_max_age"]:
+        logger.warning(
+            "CONN_MAX_AGE > 0 bajo ASGI: cada petición corre en un hilo "
+            "distinto y deja su conexión abierta. Use el pool (DB_POOL)."
+        )
+    elif not configuracion["pool"] and not configuracion["conn_max_age"]:
+        logger.warning(
+            "Sin pool ni conexiones persistentes: cada petición abre una "
+            "conexión nueva a la base de datos."
+        )
+    return configuracion
@@ -0,0 +1,411 @@
+"""
+Planificador de despacho por lotes.
+
+`planificar_despacho` toma los pedidos confirmados sin distribución, los
+agrupa por ClusterGeografico y en cada grupo arma viajes que salen de la
+tienda (STORE_COORDENADAS) y vuelven a ella:
+
+1. Matriz de minutos entre todos los puntos del grupo, calculada una sola
+   vez (haversine corregido por ROUTING_FACTOR_DESVIO, a
+   ROUTING_VELOCIDAD_KMH, más DESPACHO_MINUTOS_POR_PARADA por entrega).
+2. Ahorros de Clarke-Wright: se parte de un viaje por pedido y se unen
+   extremos de viajes en orden de mayor ahorro, mientras la carga no
+   supere la mayor Ruta.capacidad ni la duración la mayor
+   tiempo_estimado + flexibilidad.
+3. 2-opt sobre cada viaje para eliminar cruces.
+
+Cada viaje usa la Ruta más chica que lo admite y el repartidor que queda
+libre primero. Los clusters se atienden por prioridad (menor valor
+primero) y, dentro de un cluster, los viajes más largos salen antes. La
+matriz no consulta ROUTING_BACKEND: con cientos de puntos serían decenas
+de miles de consultas externas.
+"""
+
+import heapq
+import math
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+from django.utils import timezone
+
+from api.models import (
+    AsignacionRuta,
+    Cliente,
+    ClienteCluster,
+    DetallePedido,
+    Distribucion,
+    Empleado,
+    Pedido,
+    Ruta,
+)
+from api.tiempo_viaje import HaversineBackend
+
+PedidoDespacho = namedtuple("PedidoDespacho", "id demanda coordenadas")
+
+
+class DespachoError(ValueError):
+    pass
+
+
+def matriz_minutos(puntos, velocidad_kmh=None, factor_desvio=None):
+    """
+    Minutos de viaje entre cada par de puntos (lat, lon). La matriz es
+    simétrica y se calcula una sola vez por grupo.
+    """
+    velocidad_kmh = velocidad_kmh or settings.ROUTING_VELOCIDAD_KMH
+    factor_desvio = factor_desvio or settings.ROUTING_FACTOR_DESVIO
+    escala = 2 * HaversineBackend.RADIO_TIERRA_KM * factor_desvio / velocidad_kmh * 60
+    radianes = [
+        (math.radians(float(lat)), math.radians(float(lon))) for lat, lon in puntos
+    ]
+    cosenos = [math.cos(lat) for lat, _ in radianes]
+    n = len(puntos)
+    matriz = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        lat1, lon1 = radianes[i]
+        fila = matriz[i]
+        for j in range(i + 1, n):
+            lat2, lon2 = radianes[j]
+            a = (
+                math.sin((lat2 - lat1) / 2) ** 2
+                + cosenos[i] * cosenos[j] * math.sin((lon2 - lon1) / 2) ** 2
+            )
+            fila[j] = matriz[j][i] = escala * math.asin(math.sqrt(min(a, 1.0)))
+    return matriz
+
+
+def ahorros(matriz, demandas, capacidad, duracion_maxima, minutos_parada):
+    """
+    Heurística de ahorros de Clarke-Wright, versión paralela.
+
+    :param demandas: Demanda de cada nodo de la matriz (la tienda es el 0)
+    :return: Lista de viajes, cada uno una lista de nodos
+    """
+    n = len(demandas)
+    viajes = {i: [i] for i in range(1, n)}
+    # Nodo -> clave en `viajes` del viaje que lo contiene
+    viaje_de = list(range(n))
+    carga = list(demandas)
+    minutos = [2 * matriz[0][i] + minutos_parada for i in range(n)]
+    candidatos = sorted(
+        (
+            (matriz[0][i] + matriz[0][j] - matriz[i][j], i, j)
+            for i in range(1, n)
+            for j in range(i + 1, n)
+        ),
+        reverse=True,
+    )
+
+    for ahorro, i, j in candidatos:
+        if ahorro <= 0:
+            break
+        a, b = viaje_de[i], viaje_de[j]
+        if a == b or carga[a] + carga[b] > capacidad:
+            continue
+        total = minutos[a] + minutos[b] - ahorro
+        if total > duracion_maxima:
+            continue
+        # Solo se unen extremos: i debe cerrar el primero y j abrir el segundo
+        primero, segundo = viajes[a], viajes[b]
+        if primero[-1] != i:
+            if primero[0] != i:
+                continue
+            primero.reverse()
+        if segundo[0] != j:
+            if segundo[-1] != j:
+                continue
+            segundo.reverse()
+        primero.extend(segundo)
+        for nodo in segundo:
+            viaje_de[nodo] = a
+        carga[a] += carga[b]
+        minutos[a] = total
+        del viajes[b]
+    return list(viajes.values())
+
+
+def dos_opt(viaje, matriz):
+    """
+    Invierte tramos del viaje mientras acorten el recorrido (primera
+    mejora). La tienda es el inicio y el fin implícitos.
+    """
+    recorrido = [0, *viaje, 0]
+    mejora = True
+    while mejora:
+        mejora = False
+        for i in range(1, len(recorrido) - 2):
+            for j in range(i + 1, len(recorrido) - 1):
+                a, b = recorrido[i - 1], recorrido[i]
+                c, d = recorrido[j], recorrido[j + 1]
+                if matriz[a][c] + matriz[b][d] < matriz[a][b] + matriz[c][d] - 1e-9:
+                    recorrido[i : j + 1] = recorrido[j : i - 1 : -1]
+                    mejora = True
+    return recorrido[1:-1]
+
+
+class Viaje:
+    """
+    Viaje planificado: sale de la tienda, entrega `pedidos` en orden y
+    vuelve. `llegadas` son los minutos desde la salida hasta cada entrega.
+    """
+
+    def __init__(self, ruta, cluster_id, prioridad, pedidos, llegadas, carga, minutos):
+        self.ruta = ruta
+        self.cluster_id = cluster_id
+        self.prioridad = prioridad
+        self.pedidos = pedidos
+        self.llegadas = llegadas
+        self.carga = carga
+        self.minutos = minutos
+        self.empleado_id = None
+        self.salida = None
+
+    @property
+    def regreso(self):
+        return self.salida + timedelta(minutes=self.minutos)
+
+    def entregas(self):
+        """
+        Pares (pedido_id, fecha de entrega estimada).
+        """
+        for pedido_id, llegada in zip(self.pedidos, self.llegadas):
+            yield pedido_id, self.salida + timedelta(seconds=round(llegada * 60))
+
+    def como_dict(self):
+        return {
+            "ruta_id": self.ruta.id,
+            "cluster_id": self.cluster_id,
+            "empleado_id": self.empleado_id,
+            "salida": self.salida,
+            "regreso": self.regreso,
+            "carga": self.carga,
+            "minutos": round(self.minutos, 1),
+            "entregas": [
+                {"pedido_id": pedido_id, "fecha_entrega": fecha}
+                for pedido_id, fecha in self.entregas()
+            ],
+        }
+
+
+def repartidores():
+    """
+    Empleados activos cuyo puesto es DESPACHO_PUESTO_REPARTIDOR.
+    """
+    return Empleado.objects.filter(
+        estado="activo", puesto__iexact=settings.DESPACHO_PUESTO_REPARTIDOR
+    )
+
+
+def repartidor_menos_ocupado():
+    """
+    Repartidor con menos distribuciones en ruta, o None si no hay.
+    """
+    return (
+        repartidores()
+        .annotate(
+            en_ruta=Count("distribucion", filter=Q(distribucion__estado="en ruta"))
+        )
+        .order_by("en_ruta", "id")
+        .first()
+    )
+
+
+def _elegir_ruta(rutas, carga, minutos):
+    # La más chica con capacidad suficiente, prefiriendo las que cubren la
+    # duración (un pedido lejano puede superarla aun viajando solo)
+    return min(
+        (ruta for ruta in rutas if ruta.capacidad >= carga),
+        key=lambda ruta: (
+            ruta.tiempo_estimado + ruta.flexibilidad < minutos,
+            ruta.capacidad,
+            ruta.id,
+        ),
+    )
+
+
+def _pedidos_pendientes():
+    """
+    Pedidos confirmados sin distribución, agrupados por cluster:
+    {cluster_id o None: (prioridad, [PedidoDespacho])}, y la lista de
+    (pedido_id, motivo) de los que no tienen coordenadas.
+
+    Los pedidos quedan bloqueados hasta el fin de la transacción; los que
+    ya bloquea otra planificación o crear_distribucion se omiten.
+    """
+    pedidos = list(
+        Pedido.objects.select_for_update(skip_locked=True)
+        .filter(
+            ~Exists(Distribucion.objects.filter(pedido=OuterRef("pk"))),
+            estado_pedido="confirmado",
+        )
+        .order_by("fecha_pedido", "id")
+        .values_list("id", "cliente_id")
+    )
+    ids = [pedido_id for pedido_id, _ in pedidos]
+    clientes = {cliente_id for _, cliente_id in pedidos}
+    demandas = dict(
+        DetallePedido.objects.filter(pedido_id__in=ids)
+        .values("pedido_id")
+        .annotate(cantidad=Sum("cantidad"))
+        .values_list("pedido_id", "cantidad")
+    )
+    coordenadas = {
+        cliente_id: (latitud, longitud)
+        for cliente_id, latitud, longitud in Cliente.objects.filter(
+            id__in=clientes, latitud__isnull=False, longitud__isnull=False
+        ).values_list("id", "latitud", "longitud")
+    }
+    # Un cliente en varios clusters se atiende en el de menor prioridad; el
+    # orden descendente deja ese cluster como última asignación
+    cluster_de = {}
+    for cliente_id, cluster_id, prioridad in (
+        ClienteCluster.objects.filter(cliente_id__in=clientes)
+        .order_by("-cluster__prioridad", "-cluster_id")
+        .values_list("cliente_id", "cluster_id", "cluster__prioridad")
+    ):
+        cluster_de[cliente_id] = (cluster_id, prioridad)
+
+    grupos = {}
+    sin_planificar = []
+    for pedido_id, cliente_id in pedidos:
+        if cliente_id not in coordenadas:
+            sin_planificar.append((pedido_id, "El cliente no tiene coordenadas."))
+            continue
+        # Los pedidos de clientes sin cluster se atienden al final
+        cluster_id, prioridad = cluster_de.get(cliente_id, (None, math.inf))
+        _, grupo = grupos.setdefault(cluster_id, (prioridad, []))
+        grupo.append(
+            PedidoDespacho(
+                pedido_id, demandas.get(pedido_id) or 0, coordenadas[cliente_id]
+            )
+        )
+    return grupos, sin_planificar
+
+
+def _armar_viajes(cluster_id, prioridad, pedidos, rutas, minutos_parada):
+    matriz = matriz_minutos(
+        [settings.STORE_COORDENADAS, *(pedido.coordenadas for pedido in pedidos)]
+    )
+    demandas = [0, *(pedido.demanda for pedido in pedidos)]
+    capacidad = max(ruta.capacidad for ruta in rutas)
+    duracion_maxima = max(ruta.tiempo_estimado + ruta.flexibilidad for ruta in rutas)
+
+    for nodos in ahorros(matriz, demandas, capacidad, duracion_maxima, minutos_parada):
+        nodos = dos_opt(nodos, matriz)
+        llegadas, reloj, anterior = [], 0.0, 0
+        for nodo in nodos:
+            reloj += matriz[anterior][nodo]
+            llegadas.append(reloj)
+            reloj += minutos_parada
+            anterior = nodo
+        carga = sum(demandas[nodo] for nodo in nodos)
+        minutos = reloj + matriz[anterior][0]
+        yield Viaje(
+            _elegir_ruta(rutas, carga, minutos),
+            cluster_id,
+            prioridad,
+            [pedidos[nodo - 1].id for nodo in nodos],
+            llegadas,
+            carga,
+            minutos,
+        )
+
+
+def _asignar_repartidores(viajes, inicio):
+    """
+    Asigna cada viaje al repartidor que queda libre primero. Un repartidor
+    con distribuciones en ruta está libre desde su última entrega estimada.
+    """
+    disponibles = [
+        (max(hasta or inicio, inicio), empleado_id)
+        for empleado_id, hasta in repartidores()
+        .annotate(
+            hasta=Max(
+                "distribucion__fecha_entrega",
+                filter=Q(distribucion__estado="en ruta"),
+            )
+        )
+        .values_list("id", "hasta")
+    ]
+    if not disponibles:
+        raise DespachoError("No hay repartidores activos para el despacho.")
+    heapq.heapify(disponibles)
+    for viaje in viajes:
+        viaje.salida, viaje.empleado_id = heapq.heappop(disponibles)
+        heapq.heappush(disponibles, (viaje.regreso, viaje.empleado_id))
+
+
+def _guardar(viajes):
+    distribuciones = []
+    asignaciones = []
+    for viaje in viajes:
+        for pedido_id, fecha_entrega in viaje.entregas():
+            distribuciones.append(
+                Distribucion(
+                    pedido_id=pedido_id,
+                    fecha_salida=viaje.salida,
+                    fecha_entrega=fecha_entrega,
+                    estado="en ruta",
+                    empleado_id=viaje.empleado_id,
+                    # Misma clave que crear_distribucion: un reintento de
+                    # esa tarea no duplica el envío
+                    clave_idempotencia=f"pedido-{pedido_id}",
+                )
+            )
+            asignaciones.append(
+                AsignacionRuta(
+                    ruta=viaje.ruta, pedido_id=pedido_id, fecha_asignacion=viaje.salida
+                )
+            )
+    Distribucion.objects.bulk_create(distribuciones, batch_size=1000)
+    AsignacionRuta.objects.bulk_create(asignaciones, batch_size=1000)
+    return len(distribuciones)
+
+
+def planificar_despacho(guardar=True, inicio=None):
+    """
+    Planifica (y con `guardar` registra) el despacho de todos los pedidos
+    confirmados sin distribución.
+
+    :param inicio: Hora desde la que salen los viajes (por defecto, ahora)
+    :return: {"viajes": [Viaje], "sin_planificar": [(pedido_id, motivo)],
+        "distribuciones": cantidad creada}
+    """
+    inicio = inicio or timezone.now()
+    minutos_parada = settings.DESPACHO_MINUTOS_POR_PARADA
+
+    with transaction.atomic():
+        grupos, sin_planificar = _pedidos_pendientes()
+        if not grupos:
+            return {"viajes": [], "sin_planificar": sin_planificar, "distribuciones": 0}
+        if settings.STORE_COORDENADAS is None:
+            raise DespachoError("STORE_COORDENADAS no está configurado.")
+        rutas = list(Ruta.objects.order_by("capacidad", "id"))
+        if not rutas:
+            raise DespachoError("No hay rutas registradas.")
+        capacidad = max(ruta.capacidad for ruta in rutas)
+
+        viajes = []
+        for cluster_id, (prioridad, pedidos) in grupos.items():
+            excedidos = [pedido for pedido in pedidos if pedido.demanda > capacidad]
+            sin_planificar.extend(
+                (pedido.id, f"{pedido.demanda} paquetes superan la mayor capacidad.")
+                for pedido in excedidos
+            )
+            pedidos = [pedido for pedido in pedidos if pedido.demanda <= capacidad]
+            if pedidos:
+                viajes.extend(
+                    _armar_viajes(cluster_id, prioridad, pedidos, rutas, minutos_parada)
+                )
+        viajes.sort(key=lambda viaje: (viaje.prioridad, -viaje.minutos))
+        _asignar_repartidores(viajes, inicio)
+
+        creadas = _guardar(viajes) if guardar else 0
+    return {
+        "viajes": viajes,
+        "sin_planificar": sin_planificar,
+        "distribuciones": creadas,
+    }
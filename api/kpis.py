@@ -0,0 +1,297 @@
+"""
+Motor de KPIs materializados.
+
+Cada KPI registrado acumula en su fila un numerador y un denominador que se
+actualizan con el delta de cada registro guardado o eliminado en el modelo
+fuente (señales pre/post save y delete). `valor_actual` se recalcula en el
+mismo UPDATE, por lo que leer un KPI es leer una fila. Las escrituras que no
+emiten señales (bulk_create, update) se corrigen con `recalcular_kpis`.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import connection
+from django.db.models import (
+    Case,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    Sum,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, NullIf, Round, TruncDate
+from django.utils import timezone
+
+from api.models import KPI, ControlProduccionAgua, ControlSoploBotellas, Distribucion
+
+CERO = Decimal("0")
+
+
+class DefinicionKPI:
+    """
+    Definición de un KPI calculado.
+
+    `numerador` y `denominador` son expresiones por fila del modelo fuente;
+    el KPI vale `suma(numerador) * factor / suma(denominador)`, o
+    `suma(numerador) * factor` si no tiene denominador. Con `campo_fecha`
+    solo se acumulan los registros del día en curso.
+    """
+
+    def __init__(
+        self,
+        codigo,
+        nombre,
+        modelo,
+        numerador,
+        denominador=None,
+        factor=1,
+        campo_fecha=None,
+        descripcion="",
+    ):
+        self.codigo = codigo
+        self.nombre = nombre
+        self.modelo = modelo
+        self.numerador = numerador
+        self.denominador = denominador
+        self.factor = Decimal(factor)
+        self.campo_fecha = campo_fecha
+        self.descripcion = descripcion
+
+    def expresiones(self):
+        """
+        Expresiones por fila con alias propios de este KPI.
+        """
+        expresiones = {f"{self.codigo}__n": self.numerador}
+        if self.denominador is not None:
+            expresiones[f"{self.codigo}__d"] = self.denominador
+        if self.campo_fecha:
+            expresiones[f"{self.codigo}__f"] = TruncDate(self.campo_fecha)
+        return expresiones
+
+    def contribucion(self, fila):
+        """
+        Retorna (numerador, denominador, fecha) de una fila leída con
+        `expresiones()`.
+        """
+        return (
+            Decimal(fila[f"{self.codigo}__n"] or 0),
+            Decimal(fila.get(f"{self.codigo}__d") or 0),
+            fila.get(f"{self.codigo}__f"),
+        )
+
+    def valor(self, delta_n=CERO, delta_d=CERO):
+        """
+        Expresión de `valor_actual` tras sumar los deltas a los acumuladores,
+        para actualizar ambos en el mismo UPDATE.
+        """
+        salida = DecimalField(max_digits=20, decimal_places=4)
+        numerador = F("numerador") + delta_n
+        if connection.vendor == "sqlite":
+            # SQLite guarda los decimales sin parte fraccionaria como enteros
+            # y la división sería entera
+            numerador = Cast(numerador, FloatField())
+        if self.denominador is None:
+            valor = ExpressionWrapper(numerador * self.factor, output_field=salida)
+        else:
+            valor = ExpressionWrapper(
+                numerador * self.factor / NullIf(F("denominador") + delta_d, CERO),
+                output_field=salida,
+            )
+        # Mismo redondeo que recalcular_kpis (valor_actual tiene 2 decimales)
+        return Round(
+            valor, 2, output_field=DecimalField(max_digits=10, decimal_places=2)
+        )
+
+    def calcular(self, numerador, denominador):
+        """
+        Valor con 2 decimales, redondeado como ROUND de SQL en `valor()`.
+        """
+        if self.denominador is None:
+            valor = numerador * self.factor
+        elif not denominador:
+            return None
+        else:
+            valor = numerador * self.factor / denominador
+        return valor.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+_registro = {}
+
+
+def registrar(definicion):
+    _registro[definicion.codigo] = definicion
+    return definicion
+
+
+def definiciones(modelo=None):
+    """
+    Definiciones registradas, opcionalmente solo las de un modelo fuente.
+    """
+    return [d for d in _registro.values() if modelo is None or d.modelo is modelo]
+
+
+def modelos_fuente():
+    return {definicion.modelo for definicion in _registro.values()}
+
+
+registrar(
+    DefinicionKPI(
+        codigo="tasa_defectos_soplado",
+        nombre="Tasa de defectos de soplado (%)",
+        modelo=ControlSoploBotellas,
+        numerador=F("produccion_danada"),
+        denominador=F("produccion_total"),
+        factor=100,
+        descripcion="Botellas dañadas sobre el total soplado.",
+    )
+)
+registrar(
+    DefinicionKPI(
+        codigo="tasa_defectos_envasado",
+        nombre="Tasa de defectos de envasado (%)",
+        modelo=ControlProduccionAgua,
+        numerador=F("botellas_malogradas"),
+        denominador=F("botellas_envasadas"),
+        factor=100,
+        descripcion="Botellas malogradas sobre las envasadas.",
+    )
+)
+registrar(
+    DefinicionKPI(
+        codigo="botellas_producidas_dia",
+        nombre="Botellas producidas hoy",
+        modelo=ControlProduccionAgua,
+        numerador=F("total_botella_buenas"),
+        campo_fecha="fecha_produccion",
+        descripcion="Botellas buenas envasadas en el día en curso.",
+    )
+)
+registrar(
+    DefinicionKPI(
+        codigo="entregas_a_tiempo",
+        nombre="Entregas a tiempo (%)",
+        modelo=Distribucion,
+        numerador=Case(When(estado="entregado", then=1), default=0),
+        denominador=Case(
+            When(estado__in=["entregado", "retrasado"], then=1), default=0
+        ),
+        factor=100,
+        descripcion="Distribuciones entregadas sobre las entregadas o retrasadas.",
+    )
+)
+
+
+def al_dia(kpi):
+    """
+    Un KPI diario sin cambios en el día conserva los acumuladores de su
+    último periodo hasta la primera escritura; al leerlo se reporta el día
+    en curso, sin registros todavía.
+    """
+    definicion = _registro.get(kpi.codigo)
+    hoy = timezone.localdate()
+    if definicion is None or not definicion.campo_fecha or kpi.periodo == hoy:
+        return kpi
+    kpi.numerador = kpi.denominador = CERO
+    kpi.valor_actual = definicion.calcular(CERO, CERO)
+    kpi.periodo = hoy
+    return kpi
+
+
+def leer_contribuciones(modelo, pk):
+    """
+    Lee en una consulta la contribución de la fila `pk` a cada KPI del
+    modelo. Retorna {codigo: (numerador, denominador, fecha)} o None si la
+    fila no existe.
+    """
+    defs = definiciones(modelo)
+    if not defs or pk is None:
+        return None
+
+    expresiones = {}
+    for definicion in defs:
+        expresiones.update(definicion.expresiones())
+    fila = modelo._default_manager.filter(pk=pk).values(**expresiones).first()
+    if fila is None:
+        return None
+    return {d.codigo: d.contribucion(fila) for d in defs}
+
+
+def aplicar_deltas(modelo, anteriores, nuevas):
+    """
+    Suma a cada KPI del modelo la diferencia entre la contribución nueva y
+    la anterior de una fila. Cualquiera de las dos puede ser None (alta o
+    baja del registro).
+    """
+    hoy = timezone.localdate()
+    for definicion in definiciones(modelo):
+        delta_n = delta_d = CERO
+        for contribuciones, signo in ((nuevas, 1), (anteriores, -1)):
+            if contribuciones is None:
+                continue
+            numerador, denominador, fecha = contribuciones[definicion.codigo]
+            if definicion.campo_fecha and fecha != hoy:
+                continue
+            delta_n += signo * numerador
+            delta_d += signo * denominador
+
+        if definicion.campo_fecha:
+            # Primer cambio del día: se reinician los acumuladores
+            KPI.objects.filter(codigo=definicion.codigo).exclude(periodo=hoy).update(
+                numerador=CERO, denominador=CERO, valor_actual=CERO, periodo=hoy
+            )
+        if not delta_n and not delta_d:
+            continue
+
+        actualizados = KPI.objects.filter(codigo=definicion.codigo).update(
+            numerador=F("numerador") + delta_n,
+            denominador=F("denominador") + delta_d,
+            valor_actual=definicion.valor(delta_n, delta_d),
+            fecha_actualizacion=timezone.now(),
+        )
+        if not actualizados:
+            # La fila del KPI aún no existe: se crea con el recálculo completo
+            recalcular_kpis([definicion.codigo])
+
+
+def recalcular_kpis(codigos=None):
+    """
+    Recalcula desde cero los KPIs indicados (o todos) agregando el modelo
+    fuente, y crea sus filas si no existen. Retorna {codigo: (anterior, nuevo)}.
+    """
+    hoy = timezone.localdate()
+    resultados = {}
+    for definicion in definiciones():
+        if codigos and definicion.codigo not in codigos:
+            continue
+
+        queryset = definicion.modelo._default_manager.all()
+        if definicion.campo_fecha:
+            queryset = queryset.annotate(_dia=TruncDate(definicion.campo_fecha)).filter(
+                _dia=hoy
+            )
+        agregados = {"n": Coalesce(Sum(definicion.numerador), 0)}
+        if definicion.denominador is not None:
+            agregados["d"] = Coalesce(Sum(definicion.denominador), 0)
+        totales = queryset.aggregate(**agregados)
+
+        kpi, _ = KPI.objects.get_or_create(
+            codigo=definicion.codigo,
+            defaults={
+                "nombre": definicion.nombre,
+                "descripcion": definicion.descripcion,
+            },
+        )
+        numerador = Decimal(totales["n"])
+        denominador = Decimal(totales.get("d", 0))
+        valor = definicion.calcular(numerador, denominador)
+
+        KPI.objects.filter(pk=kpi.pk).update(
+            numerador=numerador,
+            denominador=denominador,
+            valor_actual=valor,
+            periodo=hoy if definicion.campo_fecha else None,
+            fecha_actualizacion=timezone.now(),
+        )
+        resultados[definicion.codigo] = (kpi.valor_actual, valor)
+    return resultados
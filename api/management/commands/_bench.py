@@ -0,0 +1,121 @@
+"""
+Utilidades compartidas por los comandos de benchmark.
+
+Los benchmarks crean datos sintéticos dentro de una transacción que siempre
+se revierte, por lo que pueden ejecutarse contra cualquier base de datos sin
+dejar residuos.
+"""
+
+import statistics
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.models import (
+    Cliente,
+    CustomUser,
+    DetallePedido,
+    Empleado,
+    Inventario,
+    Pedido,
+    Producto,
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def datos_temporales():
+    """
+    Ejecuta el bloque dentro de una transacción que se revierte al final.
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback()
+    except _Rollback:
+        pass
+
+
+def medir(funcion, repeticiones=5):
+    """
+    Ejecuta `funcion` varias veces y retorna (mediana en ms, consultas SQL).
+    Cada repetición corre en su propio savepoint.
+    """
+    tiempos = []
+    consultas = 0
+    for _ in range(repeticiones):
+        with CaptureQueriesContext(connection) as contexto:
+            inicio = time.perf_counter()
+            with transaction.atomic():
+                funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas = len(contexto.captured_queries)
+    return statistics.median(tiempos), consultas
+
+
+def crear_empleado(sufijo="bench", dni="00000000"):
+    user = CustomUser.objects.create_user(email=f"{sufijo}@bench.local")
+    return Empleado.objects.create(
+        user=user,
+        nombre="Bench",
+        apellido_paterno="Bench",
+        apellido_materno="Bench",
+        dni=dni,
+        fecha_contratacion=timezone.now().date(),
+        puesto="Benchmark",
+    )
+
+
+def crear_productos(cantidad, stock=1_000_000):
+    """
+    Crea `cantidad` productos activos, cada uno con un inventario.
+    """
+    productos = Producto.objects.bulk_create(
+        [
+            Producto(
+                nombre=f"Producto bench {i}",
+                precio_unitario=Decimal("2.50"),
+                unidad_medida="paquete",
+                cantidad_actual=stock,
+                estado=True,
+            )
+            for i in range(cantidad)
+        ]
+    )
+    Inventario.objects.bulk_create(
+        [
+            Inventario(producto=producto, cantidad_actual=stock, stock_minimo=10)
+            for producto in productos
+        ]
+    )
+    return productos
+
+
+def crear_pedido(productos, cantidad_por_linea=1):
+    cliente = Cliente.objects.create(nombre="Cliente", apellido_paterno="Bench")
+    pedido = Pedido.objects.create(
+        cliente=cliente,
+        estado_pedido="pendiente",
+        total_pedido=Decimal("0"),
+        direccion_envio="Av. Benchmark 123",
+    )
+    DetallePedido.objects.bulk_create(
+        [
+            DetallePedido(
+                pedido=pedido,
+                producto=producto,
+                cantidad=cantidad_por_linea,
+                precio_unitario=producto.precio_unitario,
+                subtotal=producto.precio_unitario * cantidad_por_linea,
+            )
+            for producto in productos
+        ]
+    )
+    return pedido
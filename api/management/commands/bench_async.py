@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncRequestFactory, override_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import async_views, service, tiempo_viaje
+from api.models import Cliente, CustomUser, Pedido, Producto
+from api.views import PedidoViewSet, ProductoViewSet
+
+from ._bench import crear_productos
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara peticiones por segundo del flujo del chatbot (check-stock, "
+        "create-temp y confirm-payment) entre las acciones DRF síncronas en "
+        "hilos y las vistas async. La distribución posterior al pago se crea "
+        "en el pool de hilos de api.service en ambos casos y no se cronometra."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pedidos", type=int, default=40)
+        parser.add_argument(
+            "--concurrencia",
+            type=int,
+            default=8,
+            help="Hilos del stack síncrono y peticiones simultáneas del async.",
+        )
+
+    def handle(self, *args, **options):
+        # La distribución falla al no encontrar repartidor; no interesa aquí
+        logger = logging.getLogger("api")
+        nivel = logger.level
+        logger.setLevel(logging.CRITICAL)
+
+        # Los hilos y el event loop usan otras conexiones: los datos deben
+        # estar confirmados y se eliminan al terminar
+        productos = crear_productos(3)
+        clientes = []
+        # confirm-payment pasa por la autenticación JWT: el token del bot
+        # debe ser un JWT válido
+        usuario = CustomUser.objects.create_user(
+            "bench-async@example.com", username="bench-async"
+        )
+        self.token = str(AccessToken.for_user(usuario))
+        try:
+            with override_settings(
+                ROUTING_BACKEND="api.tiempo_viaje.HaversineBackend",
+                STORE_COORDENADAS=(-9.93, -76.24),
+                CONFIRM_PAYMENT_TOKEN=self.token,
+            ):
+                for nombre, ejecutar in (
+                    ("síncrono", self._sincrono),
+                    ("async", self._async),
+                ):
+                    cache.clear()
+                    tiempo_viaje.reiniciar()
+                    lote = self._crear_clientes(nombre, options["pedidos"])
+                    clientes.extend(cliente.id for cliente in lote)
+                    duracion, respuestas = ejecutar(
+                        lote, productos, options["concurrencia"]
+                    )
+                    estados = [r.status_code for flujo in respuestas for r in flujo]
+                    errores = sum(estado >= 400 for estado in estados)
+                    self.stdout.write(
+                        f"{nombre:>9}: {len(estados) / duracion:8.2f} peticiones/s "
+                        f"({duracion * 1000:.0f} ms, {len(estados)} peticiones, "
+                        f"{errores} errores)"
+                    )
+                tiempo_viaje.reiniciar()
+        finally:
+            logger.setLevel(nivel)
+            usuario.delete()
+            Cliente.objects.filter(id__in=clientes).delete()
+            Producto.objects.filter(id__in=[p.id for p in productos]).delete()
+
+    def _crear_clientes(self, nombre, cantidad):
+        # Una dirección distinta por cliente para que cada pedido consulte rutas
+        return Cliente.objects.bulk_create(
+            [
+                Cliente(
+                    nombre="Cliente",
+                    apellido_paterno=f"Bench {nombre}",
+                    direccion=f"Jr. Bench {nombre} {i}",
+                    latitud=Decimal("-9.93") + Decimal(i + 1) / 1000,
+                    longitud=Decimal("-76.24") - Decimal(i + 1) / 1000,
+                )
+                for i in range(cantidad)
+            ]
+        )
+
+    def _cuerpo_pedido(self, cliente, productos):
+        return {
+            "cliente_id": cliente.id,
+            "items": [{"producto_id": p.id, "cantidad": 1} for p in productos],
+        }
+
+    def _sincrono(self, clientes, productos, concurrencia):
+        factory = APIRequestFactory()
+        check_stock = ProductoViewSet.as_view({"post": "check_stock"})
+        create_temp = PedidoViewSet.as_view({"post": "create_temp"})
+        confirm_payment = PedidoViewSet.as_view(
+            {"post": "confirm_payment"}, **PedidoViewSet.confirm_payment.kwargs
+        )
+
+        def flujo(cliente):
+            try:
+                respuestas = [
+                    check_stock(
+                        factory.post(
+                            "/",
+                            {"producto_id": productos[0].id, "cantidad": 1},
+                            format="json",
+                        )
+                    ),
+                    create_temp(
+                        factory.post(
+                            "/", self._cuerpo_pedido(cliente, productos), format="json"
+                        )
+                    ),
+                ]
+                # PedidoSerializer no expone el id; se busca por cliente
+                pedido_id = Pedido.objects.values_list("id", flat=True).get(
+                    cliente=cliente
+                )
+                respuestas.append(
+                    confirm_payment(
+                        factory.post("/", HTTP_AUTHORIZATION=f"Bearer {self.token}"),
+                        pk=pedido_id,
+                    )
+                )
+                return respuestas
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            respuestas = list(pool.map(flujo, clientes))
+        duracion = time.perf_counter() - inicio
+        self._esperar_distribuciones()
+        return duracion, respuestas
+
+    def _async(self, clientes, productos, concurrencia):
+        factory = AsyncRequestFactory()
+
+        async def flujo(semaforo, cliente):
+            async with semaforo:
+                respuestas = [
+                    await async_views.check_stock(
+                        factory.post(
+                            "/",
+                            {"producto_id": productos[0].id, "cantidad": 1},
+                            content_type="application/json",
+                        )
+                    ),
+                    await async_views.crear_pedido_temp(
+                        factory.post(
+                            "/",
+                            self._cuerpo_pedido(cliente, productos),
+                            content_type="application/json",
+                        )
+                    ),
+                ]
+                pedido_id = await Pedido.objects.values_list("id", flat=True).aget(
+                    cliente=cliente
+                )
+                respuestas.append(
+                    await async_views.confirmar_pago(
+                        factory.post(
+                            "/", headers={"Authorization": f"Bearer {self.token}"}
+                        ),
+                        pk=pedido_id,
+                    )
+                )
+                return respuestas
+
+        async def ejecutar():
+            semaforo = asyncio.Semaphore(concurrencia)
+            respuestas = await asyncio.gather(
+                *(flujo(semaforo, cliente) for cliente in clientes)
+            )
+            return respuestas
+
+        inicio = time.perf_counter()
+        respuestas = asyncio.run(ejecutar())
+        duracion = time.perf_counter() - inicio
+        self._esperar_distribuciones()
+        return duracion, respuestas
+
+    def _esperar_distribuciones(self):
+        # Las distribuciones en segundo plano deben terminar antes de borrar
+        # los datos de prueba
+        service._obtener_executor().shutdown(wait=True)
+        service._executor = None
@@ -0,0 +1,92 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.carga_masiva import CARGAS, exportar, importar
+from api.models import Cliente
+
+from ._bench import datos_temporales
+
+
+def _lineas_clientes(cantidad, invalidas):
+    """
+    CSV sintético; cada `invalidas`-ésima fila tiene un DNI inválido.
+    """
+    yield "nombre,apellido_paterno,dni,telefono,direccion,latitud,longitud\n"
+    for i in range(cantidad):
+        dni = "12ab" if invalidas and i % invalidas == 0 else f"{i:08d}"
+        yield (
+            f"Cliente {i},Bench,{dni},+51 9{i:08d},Av. Benchmark {i},"
+            f"-12.{i % 100000:06d},-77.{i % 100000:06d}\n"
+        )
+
+
+def _medir(funcion):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, pico / 1024 / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa y exporta clientes sintéticos con api.carga_masiva y mide "
+        "filas por segundo y memoria máxima; verifica los conteos en la BD."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=100_000)
+        parser.add_argument(
+            "--invalidas", type=int, default=100, help="Una fila inválida cada N."
+        )
+
+    def handle(self, *args, **options):
+        with datos_temporales():
+            self._ejecutar(options)
+
+    def _ejecutar(self, options):
+        filas, invalidas = options["filas"], options["invalidas"]
+        esperadas = -(-filas // invalidas) if invalidas else 0
+        definicion = CARGAS["clientes"]
+        previos = Cliente.objects.count()
+
+        resultado, segundos, pico = _medir(
+            lambda: importar(definicion, _lineas_clientes(filas, invalidas))
+        )
+        self.stdout.write(
+            f"importar ({connection.vendor}): {filas} filas en {segundos:6.1f} s "
+            f"({filas / segundos:8.0f} filas/s), memoria máxima {pico:6.1f} MB"
+        )
+        if resultado["total_errores"] != esperadas:
+            raise CommandError(
+                f"Se esperaban {esperadas} errores y hubo {resultado['total_errores']}."
+            )
+        if Cliente.objects.count() - previos != filas - esperadas:
+            raise CommandError("La cantidad de clientes creados no coincide.")
+
+        for formato in ("csv", "jsonl"):
+            (tamano, lineas), segundos, pico = _medir(
+                lambda: self._consumir(exportar(definicion, formato))
+            )
+            self.stdout.write(
+                f"exportar {formato:5}: {lineas} líneas, {tamano / 1024:8.0f} KB en "
+                f"{segundos:6.1f} s, memoria máxima {pico:6.1f} MB"
+            )
+            esperadas_lineas = previos + filas - esperadas + (formato == "csv")
+            if lineas != esperadas_lineas:
+                raise CommandError(
+                    f"La exportación {formato} no tiene todas las filas."
+                )
+        self.stdout.write("conteos coinciden con la base de datos")
+
+    def _consumir(self, partes):
+        tamano = lineas = 0
+        for parte in partes:
+            tamano += len(parte)
+            lineas += parte.count(b"\n")
+        return tamano, lineas
@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.models import Cliente, Pedido, Producto
+from api.pedidos import confirmar_pedido
+from api.stock import reservar_stock_pedido
+
+from ._bench import crear_pedido, crear_productos
+
+
+def confirmar_con_ruta_en_bloqueo(pedido, latencia):
+    """
+    Flujo original: la consulta de rutas ocurre con el inventario bloqueado.
+    """
+    with transaction.atomic():
+        Pedido.objects.filter(pk=pedido.pk, estado_pedido="pendiente").update(
+            estado_pedido="confirmado"
+        )
+        reservar_stock_pedido(pedido)
+        time.sleep(latencia)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la cantidad de confirmaciones por segundo cuando el servicio de "
+        "rutas es lento, comparando la consulta dentro del bloqueo de "
+        "inventario con la distribución después del commit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pedidos", type=int, default=20)
+        parser.add_argument("--hilos", type=int, default=4)
+        parser.add_argument(
+            "--latencia", type=float, default=200, help="Latencia de rutas en ms."
+        )
+
+    def handle(self, *args, **options):
+        latencia = options["latencia"] / 1000
+        # Los hilos usan sus propias conexiones: los datos deben estar
+        # confirmados y se eliminan al terminar
+        productos = crear_productos(3)
+        clientes = []
+        try:
+            for nombre, confirmar in (
+                ("en bloqueo", self._en_bloqueo(latencia)),
+                ("dos fases", self._dos_fases(latencia)),
+            ):
+                pedidos = [crear_pedido(productos) for _ in range(options["pedidos"])]
+                clientes.extend(pedido.cliente_id for pedido in pedidos)
+                duracion = self._ejecutar(confirmar, pedidos, options["hilos"])
+                self.stdout.write(
+                    f"{nombre:>10}: {len(pedidos) / duracion:8.2f} confirmaciones/s "
+                    f"({duracion * 1000:.0f} ms)"
+                )
+        finally:
+            Cliente.objects.filter(id__in=clientes).delete()
+            Producto.objects.filter(id__in=[p.id for p in productos]).delete()
+
+    def _en_bloqueo(self, latencia):
+        return lambda pedido: confirmar_con_ruta_en_bloqueo(pedido, latencia)
+
+    def _dos_fases(self, latencia):
+        rutas = ThreadPoolExecutor(max_workers=4)
+        return lambda pedido: confirmar_pedido(
+            pedido, despachar=lambda *args: rutas.submit(time.sleep, latencia)
+        )
+
+    def _ejecutar(self, confirmar, pedidos, hilos):
+        def tarea(pedido):
+            try:
+                confirmar(pedido)
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            list(pool.map(tarea, pedidos))
+        return time.perf_counter() - inicio
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+
+from api.models import Cliente
+from api.views import PedidoViewSet
+
+from ._bench import crear_productos, datos_temporales, medir
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide consultas y tiempo de pedidos/create-temp según la cantidad de "
+        "items. Falla si el número de consultas depende de los items."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, nargs="+", default=[1, 5, 20, 50])
+        parser.add_argument("--repeticiones", type=int, default=5)
+
+    def handle(self, *args, **options):
+        vista = PedidoViewSet.as_view({"post": "create_temp"})
+        factory = APIRequestFactory()
+        conteos = set()
+
+        self.stdout.write(f"{'items':>6} {'mediana ms':>11} {'consultas':>10}")
+        for cantidad_items in options["items"]:
+            with datos_temporales():
+                productos = crear_productos(cantidad_items)
+                cliente = Cliente.objects.create(
+                    nombre="Cliente", apellido_paterno="Bench", direccion="Av. 123"
+                )
+                data = {
+                    "cliente_id": cliente.id,
+                    "items": [
+                        {"producto_id": producto.id, "cantidad": 1}
+                        for producto in productos
+                    ],
+                }
+
+                def crear():
+                    response = vista(factory.post("/", data, format="json"))
+                    if response.status_code != 201:
+                        raise CommandError(f"create-temp falló: {response.data}")
+
+                mediana, consultas = medir(crear, options["repeticiones"])
+                conteos.add(consultas)
+                self.stdout.write(
+                    f"{cantidad_items:>6} {mediana:>11.2f} {consultas:>10}"
+                )
+
+        if len(conteos) > 1:
+            raise CommandError(
+                f"El número de consultas varía con los items: {sorted(conteos)}"
+            )
@@ -0,0 +1,165 @@
+import math
+import random
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from api.despacho import matriz_minutos, planificar_despacho
+from api.models import (
+    AsignacionRuta,
+    Cliente,
+    ClienteCluster,
+    ClusterGeografico,
+    DetallePedido,
+    Distribucion,
+    Empleado,
+    Pedido,
+    Ruta,
+)
+
+from ._bench import crear_empleado, crear_productos, datos_temporales
+
+TIENDA = (-9.93, -76.24)
+
+
+class Command(BaseCommand):
+    help = (
+        "Planifica el despacho de pedidos confirmados sintéticos repartidos en "
+        "clusters alrededor de la tienda; mide el tiempo y verifica capacidades "
+        "y que cada pedido quede con una sola distribución."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pedidos", type=int, default=500)
+        parser.add_argument("--clusters", type=int, default=6)
+        parser.add_argument("--repartidores", type=int, default=15)
+
+    def handle(self, *args, **options):
+        with override_settings(STORE_COORDENADAS=TIENDA), datos_temporales():
+            self._ejecutar(options)
+
+    def _ejecutar(self, options):
+        rng = random.Random(0)
+        cantidad, sectores = options["pedidos"], options["clusters"]
+        (producto,) = crear_productos(1)
+        empleados = [
+            crear_empleado(f"repartidor{i}", dni=f"{90000000 + i}").id
+            for i in range(options["repartidores"])
+        ]
+        Empleado.objects.filter(id__in=empleados).update(
+            puesto=settings.DESPACHO_PUESTO_REPARTIDOR
+        )
+        Ruta.objects.bulk_create(
+            [
+                Ruta(
+                    nombre=f"Bench {capacidad}",
+                    tiempo_estimado=tiempo,
+                    capacidad=capacidad,
+                    flexibilidad=30,
+                )
+                for capacidad, tiempo in ((60, 120), (120, 180), (200, 240))
+            ]
+        )
+        clusters = ClusterGeografico.objects.bulk_create(
+            [
+                ClusterGeografico(
+                    nombre=f"Sector {i}", area_cobertura="bench", prioridad=i
+                )
+                for i in range(sectores)
+            ]
+        )
+
+        # Clientes hasta ~10 km de la tienda; el cluster es su sector angular
+        clientes, sector_de = [], []
+        for i in range(cantidad):
+            angulo = rng.uniform(0, 2 * math.pi)
+            radio = 0.09 * math.sqrt(rng.random())
+            clientes.append(
+                Cliente(
+                    nombre=f"Cliente {i}",
+                    apellido_paterno="Bench",
+                    latitud=Decimal(f"{TIENDA[0] + radio * math.sin(angulo):.6f}"),
+                    longitud=Decimal(f"{TIENDA[1] + radio * math.cos(angulo):.6f}"),
+                )
+            )
+            sector_de.append(int(angulo / (2 * math.pi) * sectores) % sectores)
+        clientes = Cliente.objects.bulk_create(clientes)
+        ClienteCluster.objects.bulk_create(
+            [
+                ClienteCluster(cliente=cliente, cluster=clusters[sector])
+                for cliente, sector in zip(clientes, sector_de)
+            ]
+        )
+        pedidos = Pedido.objects.bulk_create(
+            [
+                Pedido(
+                    cliente=cliente,
+                    estado_pedido="confirmado",
+                    total_pedido=Decimal("0"),
+                    direccion_envio="Av. Benchmark 123",
+                )
+                for cliente in clientes
+            ]
+        )
+        demandas = {pedido.id: rng.randint(1, 40) for pedido in pedidos}
+        DetallePedido.objects.bulk_create(
+            [
+                DetallePedido(
+                    pedido=pedido,
+                    producto=producto,
+                    cantidad=demandas[pedido.id],
+                    precio_unitario=producto.precio_unitario,
+                    subtotal=producto.precio_unitario * demandas[pedido.id],
+                )
+                for pedido in pedidos
+            ]
+        )
+
+        inicio = time.perf_counter()
+        plan = planificar_despacho()
+        ms = (time.perf_counter() - inicio) * 1000
+        viajes = plan["viajes"]
+        self.stdout.write(
+            f"{cantidad} pedidos, {sectores} clusters: {len(viajes)} viajes "
+            f"en {ms:8.1f} ms"
+        )
+        self._verificar(plan, pedidos, demandas)
+
+        # Referencia: un viaje de ida y vuelta por pedido
+        puntos = [TIENDA] + [(c.latitud, c.longitud) for c in clientes]
+        matriz = matriz_minutos(puntos)
+        individual = sum(
+            2 * matriz[0][i] + settings.DESPACHO_MINUTOS_POR_PARADA
+            for i in range(1, len(puntos))
+        )
+        agrupado = sum(viaje.minutos for viaje in viajes)
+        self.stdout.write(
+            f"minutos de viaje: {agrupado:8.0f} agrupados vs {individual:8.0f} "
+            f"con un viaje por pedido ({1 - agrupado / individual:.0%} menos)"
+        )
+
+    def _verificar(self, plan, pedidos, demandas):
+        # El plan también incluye los pedidos reales pendientes de la BD
+        ids = {pedido.id for pedido in pedidos}
+        planificados = [
+            pedido_id
+            for viaje in plan["viajes"]
+            for pedido_id in viaje.pedidos
+            if pedido_id in ids
+        ]
+        if sorted(planificados) != sorted(ids):
+            raise CommandError("No todos los pedidos quedaron en un solo viaje.")
+        for viaje in plan["viajes"]:
+            carga = sum(demandas.get(pedido_id, 0) for pedido_id in viaje.pedidos)
+            if carga > viaje.carga or viaje.carga > viaje.ruta.capacidad:
+                raise CommandError(f"El viaje {viaje.pedidos} excede su capacidad.")
+        if Distribucion.objects.filter(pedido_id__in=ids).count() != len(ids):
+            raise CommandError("La cantidad de distribuciones no coincide.")
+        if AsignacionRuta.objects.filter(pedido_id__in=ids).count() != len(ids):
+            raise CommandError("La cantidad de asignaciones no coincide.")
+        if planificar_despacho(guardar=False)["viajes"]:
+            raise CommandError("Una segunda planificación volvió a asignar pedidos.")
+        self.stdout.write("capacidades respetadas; una distribución por pedido")
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from api.models import CustomUser, Departamento, Empleado, EmpleadoRol, Rol
+from api.views import EmpleadoViewSet
+
+from ._bench import datos_temporales, medir
+
+
+def crear_empleados(cantidad):
+    """
+    Crea `cantidad` empleados con un rol principal y uno secundario.
+    """
+    departamento = Departamento.objects.create(nombre="Bench")
+    principal = Rol.objects.create(nombre="Bench principal", departamento=departamento)
+    secundario = Rol.objects.create(
+        nombre="Bench secundario", departamento=departamento
+    )
+    usuarios = CustomUser.objects.bulk_create(
+        [
+            CustomUser(email=f"empleado{i}@bench.local", username=f"bench_{i}")
+            for i in range(cantidad)
+        ]
+    )
+    empleados = Empleado.objects.bulk_create(
+        [
+            Empleado(
+                user=usuario,
+                nombre="Bench",
+                apellido_paterno="Bench",
+                apellido_materno="Bench",
+                dni=f"{i:08d}",
+                fecha_contratacion=timezone.now().date(),
+                puesto="Benchmark",
+                departamento_principal=departamento,
+            )
+            for i, usuario in enumerate(usuarios)
+        ]
+    )
+    EmpleadoRol.objects.bulk_create(
+        [
+            EmpleadoRol(empleado=empleado, rol=rol, es_rol_principal=es_principal)
+            for empleado in empleados
+            for rol, es_principal in ((principal, True), (secundario, False))
+        ]
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide consultas y tiempo del listado de empleados. Falla si el número "
+        "de consultas depende de la cantidad de empleados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--empleados", type=int, nargs="+", default=[10, 100, 500])
+        parser.add_argument("--repeticiones", type=int, default=3)
+
+    def handle(self, *args, **options):
+        vista = EmpleadoViewSet.as_view({"get": "list"})
+        factory = APIRequestFactory()
+        conteos = set()
+
+        self.stdout.write(f"{'empleados':>10} {'mediana ms':>11} {'consultas':>10}")
+        for cantidad in options["empleados"]:
+            with datos_temporales():
+                crear_empleados(cantidad)
+                mediana, consultas = medir(
+                    lambda: vista(
+                        factory.get("/?page_size=1000", HTTP_HOST="localhost")
+                    ).render(),
+                    options["repeticiones"],
+                )
+                conteos.add(consultas)
+                self.stdout.write(f"{cantidad:>10} {mediana:>11.2f} {consultas:>10}")
+
+        if len(conteos) > 1:
+            raise CommandError(
+                f"El número de consultas varía con los empleados: {sorted(conteos)}"
+            )
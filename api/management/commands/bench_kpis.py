@@ -0,0 +1,95 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.utils import timezone
+
+from api.kpis import recalcular_kpis
+from api.models import KPI, ControlSoploBotellas
+
+from ._bench import crear_empleado, datos_temporales, medir
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara leer la tasa de defectos de soplado agregando toda la tabla "
+        "contra leer el KPI materializado, y verifica que los deltas "
+        "incrementales coinciden con el recálculo completo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--registros", type=int, default=50_000)
+        parser.add_argument("--cambios", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with datos_temporales():
+            self._ejecutar(options)
+
+    def _ejecutar(self, options):
+        rng = random.Random(0)
+        empleado = crear_empleado()
+        ahora = timezone.now()
+
+        def control(i):
+            total = rng.randint(100, 1000)
+            danada = rng.randint(0, total // 10)
+            return ControlSoploBotellas(
+                fecha=ahora - timedelta(minutes=i),
+                proveedor_preforma=rng.choice(["Ahise", "Damar"]),
+                peso_gramos=Decimal("20.50"),
+                volumen_botella_ml=625,
+                produccion_buena=total - danada,
+                produccion_danada=danada,
+                produccion_total=total,
+                empleado=empleado,
+            )
+
+        # bulk_create no emite señales: el recálculo parte de la tabla cargada
+        ControlSoploBotellas.objects.bulk_create(
+            [control(i) for i in range(options["registros"])], batch_size=2000
+        )
+        recalcular_kpis(["tasa_defectos_soplado"])
+
+        # Altas, ediciones y bajas por el ORM actualizan el KPI con deltas
+        for i in range(options["cambios"]):
+            operacion = rng.random()
+            if operacion < 0.5:
+                control(i).save()
+            else:
+                registro = ControlSoploBotellas.objects.order_by("?").first()
+                if operacion < 0.8:
+                    registro.produccion_danada = rng.randint(0, 50)
+                    registro.save()
+                else:
+                    registro.delete()
+        acumuladores = ("numerador", "denominador")
+        kpis = KPI.objects.filter(codigo="tasa_defectos_soplado")
+        incremental = kpis.values_list(*acumuladores).get()
+        recalcular_kpis(["tasa_defectos_soplado"])
+        recalculado = kpis.values_list(*acumuladores).get()
+
+        def agregar():
+            totales = ControlSoploBotellas.objects.aggregate(
+                danada=Sum("produccion_danada"), total=Sum("produccion_total")
+            )
+            return totales["danada"] * 100 / totales["total"]
+
+        def leer():
+            return KPI.objects.get(codigo="tasa_defectos_soplado").valor_actual
+
+        ms_agregado, _ = medir(agregar, 20)
+        ms_kpi, consultas = medir(leer, 20)
+
+        self.stdout.write(f"{options['registros']} registros de soplado")
+        self.stdout.write(f"agregado completo: {ms_agregado:8.3f} ms")
+        self.stdout.write(
+            f"KPI materializado: {ms_kpi:8.3f} ms ({consultas} consultas)"
+        )
+        self.stdout.write(
+            f"numerador/denominador incremental {incremental}, "
+            f"recálculo {recalculado}"
+        )
+        if incremental != recalculado:
+            raise CommandError("El valor incremental no coincide con el recálculo.")
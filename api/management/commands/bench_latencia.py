@@ -0,0 +1,85 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+
+def percentiles(tiempos):
+    cuantiles = statistics.quantiles(tiempos, n=100)
+    return statistics.median(tiempos), cuantiles[98]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia p50/p99 de un endpoint. Sin --url compara dentro del "
+        "proceso conexiones por petición contra la configuración efectiva "
+        "(persistentes o pool); con --url mide un servidor en ejecución."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ruta", default="/api/productos/disponibles/")
+        parser.add_argument("--peticiones", type=int, default=200)
+        parser.add_argument(
+            "--url", help="URL base de un servidor en ejecución (p. ej. gunicorn)."
+        )
+        parser.add_argument("--concurrencia", type=int, default=8)
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            self._medir_servidor(options)
+        else:
+            self._medir_en_proceso(options)
+
+    def _reportar(self, nombre, tiempos):
+        p50, p99 = percentiles(tiempos)
+        self.stdout.write(f"{nombre:>24}: p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+
+    def _medir_en_proceso(self, options):
+        client = Client(HTTP_HOST="localhost")
+        opciones = connection.settings_dict.setdefault("OPTIONS", {})
+        pool = opciones.get("pool")
+        conn_max_age = connection.settings_dict["CONN_MAX_AGE"]
+
+        # La línea base abre una conexión por petición sin pool
+        modos = [("conexión por petición", 0, None)]
+        if pool or conn_max_age:
+            nombre = "pool" if pool else "conexiones persistentes"
+            modos.append((nombre, conn_max_age, pool))
+
+        try:
+            for nombre, max_age, pool_modo in modos:
+                connection.close()
+                connection.settings_dict["CONN_MAX_AGE"] = max_age
+                if pool_modo:
+                    opciones["pool"] = pool_modo
+                else:
+                    opciones.pop("pool", None)
+                client.get(options["ruta"])  # Calentamiento
+
+                tiempos = []
+                for _ in range(options["peticiones"]):
+                    inicio = time.perf_counter()
+                    client.get(options["ruta"])
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                self._reportar(nombre, tiempos)
+        finally:
+            connection.close()
+            connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+            if pool:
+                opciones["pool"] = pool
+
+    def _medir_servidor(self, options):
+        url = options["url"].rstrip("/") + options["ruta"]
+
+        def peticion(_):
+            inicio = time.perf_counter()
+            requests.get(url, timeout=30)
+            return (time.perf_counter() - inicio) * 1000
+
+        with ThreadPoolExecutor(max_workers=options["concurrencia"]) as pool:
+            tiempos = list(pool.map(peticion, range(options["peticiones"])))
+        self._reportar(url, tiempos)
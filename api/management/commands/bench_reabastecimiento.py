@@ -0,0 +1,53 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Inventario, Kanban
+from api.reabastecimiento import planificar_reabastecimiento
+
+from ._bench import crear_productos, datos_temporales
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta el planificador de reabastecimiento sobre productos "
+        "sintéticos y verifica que una segunda pasada no cambie nada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--productos", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with datos_temporales():
+            self._ejecutar(options)
+
+    def _ejecutar(self, options):
+        rng = random.Random(0)
+        crear_productos(options["productos"])
+        inventarios = list(Inventario.objects.only("id"))
+        for inventario in inventarios:
+            inventario.cantidad_actual = rng.randint(0, 200)
+            inventario.punto_reorden = 50
+            inventario.stock_maximo = 200
+        Inventario.objects.bulk_update(
+            inventarios,
+            ["cantidad_actual", "punto_reorden", "stock_maximo"],
+            batch_size=2000,
+        )
+        esperadas = sum(
+            1 for inventario in inventarios if inventario.cantidad_actual < 50
+        )
+
+        for pasada in ("primera", "segunda"):
+            inicio = time.perf_counter()
+            resultado = planificar_reabastecimiento()
+            ms = (time.perf_counter() - inicio) * 1000
+            self.stdout.write(f"{pasada} pasada: {ms:8.1f} ms {resultado}")
+
+        if resultado != {"creadas": 0, "actualizadas": 0, "eliminadas": 0}:
+            raise CommandError("La segunda pasada modificó tarjetas.")
+        creadas = Kanban.objects.filter(automatico=True).count()
+        if creadas != esperadas:
+            raise CommandError(f"Se esperaban {esperadas} tarjetas y hay {creadas}.")
+        self.stdout.write(f"{creadas} tarjetas; la segunda pasada no cambió nada")
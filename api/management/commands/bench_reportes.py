@@ -0,0 +1,86 @@
+import gzip
+import json
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.utils import timezone
+
+from api import reportes
+from api.models import ControlProduccionAgua, Reporte
+
+from ._bench import crear_empleado, datos_temporales
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un reporte de producción sobre datos sintéticos y mide tiempo, "
+        "memoria máxima y compresión; verifica filas y totales contra la BD."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--registros", type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        with datos_temporales():
+            self._ejecutar(options)
+
+    def _ejecutar(self, options):
+        rng = random.Random(0)
+        empleado = crear_empleado()
+        ahora = timezone.now()
+
+        def control(i):
+            envasadas = rng.randint(500, 2000)
+            malogradas = rng.randint(0, envasadas // 20)
+            return ControlProduccionAgua(
+                fecha_produccion=ahora - timedelta(minutes=i),
+                numero_lote=f"BENCH-{i:08d}",
+                fecha_vencimiento=ahora + timedelta(days=180),
+                botellas_envasadas=envasadas,
+                botellas_malogradas=malogradas,
+                tapas_malogradas=0,
+                etiquetas_malogradas=0,
+                total_botella_buenas=envasadas - malogradas,
+                total_paquetes=(envasadas - malogradas) // 20,
+                empleado=empleado,
+            )
+
+        ControlProduccionAgua.objects.bulk_create(
+            [control(i) for i in range(options["registros"])], batch_size=2000
+        )
+        reporte = Reporte.objects.create(
+            titulo="Bench producción", tipo_reporte="produccion"
+        )
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        generados, fallidos = reportes.procesar_reportes(limite=1)
+        ms = (time.perf_counter() - inicio) * 1000
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if generados != 1:
+            raise CommandError(f"El reporte no se generó ({fallidos} con error).")
+
+        reporte.refresh_from_db()
+        datos = json.loads(gzip.decompress(bytes(reporte.contenido)))
+        esperado = ControlProduccionAgua.objects.aggregate(
+            botellas_envasadas=Sum("botellas_envasadas"),
+            total_paquetes=Sum("total_paquetes"),
+        )
+
+        self.stdout.write(f"{reporte.filas} filas en {ms:8.1f} ms")
+        self.stdout.write(f"memoria máxima: {pico / 1024 / 1024:6.1f} MB")
+        self.stdout.write(
+            f"tamaño: {reporte.tamano_original / 1024:8.0f} KB -> "
+            f"{reporte.tamano_comprimido / 1024:6.0f} KB comprimido"
+        )
+        if reporte.filas != options["registros"] or len(datos["filas"]) != reporte.filas:
+            raise CommandError("La cantidad de filas no coincide con la tabla.")
+        for columna, total in esperado.items():
+            if datos["totales"][columna] != total:
+                raise CommandError(f"El total de {columna} no coincide con la tabla.")
+        self.stdout.write("filas y totales coinciden con la base de datos")
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from api.models import DetallePedido, Inventario
+from api.stock import reservar_stock
+
+from ._bench import crear_pedido, crear_productos, datos_temporales, medir
+
+
+def reservar_stock_por_linea(pedido):
+    """
+    Flujo original de confirm_payment: un bloqueo y un save() por detalle.
+    """
+    detalles = DetallePedido.objects.select_for_update().filter(pedido=pedido)
+    for detalle in detalles:
+        inventario = (
+            Inventario.objects.select_for_update()
+            .filter(producto=detalle.producto)
+            .first()
+        )
+        if inventario and inventario.cantidad_actual >= detalle.cantidad:
+            inventario.cantidad_actual -= detalle.cantidad
+            inventario.save()
+        else:
+            raise ValueError(f"Stock insuficiente para {detalle.producto.nombre}")
+
+
+def reservar_stock_en_lote(pedido):
+    detalles = DetallePedido.objects.filter(pedido=pedido).select_related("producto")
+    reservar_stock(detalles, motivo="Benchmark", documento_referencia="BENCH")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la reserva de stock por línea con la reserva en lote "
+        "para pedidos de 1, 10 y 50 líneas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lineas", type=int, nargs="+", default=[1, 10, 50])
+        parser.add_argument("--repeticiones", type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'lineas':>7} {'estrategia':>10} {'mediana ms':>11} {'consultas':>10}"
+        )
+        for lineas in options["lineas"]:
+            with datos_temporales():
+                productos = crear_productos(lineas)
+                pedido = crear_pedido(productos)
+                for nombre, funcion in (
+                    ("por linea", reservar_stock_por_linea),
+                    ("en lote", reservar_stock_en_lote),
+                ):
+                    mediana, consultas = medir(
+                        lambda: funcion(pedido), options["repeticiones"]
+                    )
+                    self.stdout.write(
+                        f"{lineas:>7} {nombre:>10} {mediana:>11.2f} {consultas:>10}"
+                    )
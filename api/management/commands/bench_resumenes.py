@@ -0,0 +1,100 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.utils import timezone
+
+from api import resumenes
+from api.models import ControlSoploBotellas, ResumenSoploBotellas
+
+from ._bench import crear_empleado, datos_temporales, medir
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el resumen de producción por empleado agregando los "
+        "controles de soplado contra leer los resúmenes diarios, y verifica "
+        "que el mantenimiento en escritura coincide con la reconstrucción."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--registros", type=int, default=50_000)
+        parser.add_argument("--dias", type=int, default=90)
+        parser.add_argument("--cambios", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with datos_temporales():
+            self._ejecutar(options)
+
+    def _ejecutar(self, options):
+        rng = random.Random(0)
+        empleados = [crear_empleado(f"resumen{i}", dni=f"{i:08d}") for i in range(5)]
+        ahora = timezone.now()
+        minutos = options["dias"] * 24 * 60
+
+        def control():
+            total = rng.randint(100, 1000)
+            danada = rng.randint(0, total // 10)
+            return ControlSoploBotellas(
+                fecha=ahora - timedelta(minutes=rng.randrange(minutos)),
+                proveedor_preforma=rng.choice(["Ahise", "Damar"]),
+                peso_gramos=Decimal("20.50"),
+                volumen_botella_ml=625,
+                produccion_buena=total - danada,
+                produccion_danada=danada,
+                produccion_total=total,
+                empleado=rng.choice(empleados),
+            )
+
+        # Carga masiva sin señales y backfill, luego cambios por el ORM
+        ControlSoploBotellas.objects.bulk_create(
+            [control() for _ in range(options["registros"])], batch_size=2000
+        )
+        resumenes.reconstruir_resumenes(resumenes.SOPLO)
+        for _ in range(options["cambios"]):
+            operacion = rng.random()
+            if operacion < 0.4:
+                control().save()
+            else:
+                registro = ControlSoploBotellas.objects.order_by("?").first()
+                if operacion < 0.8:
+                    registro.fecha = ahora - timedelta(minutes=rng.randrange(minutos))
+                    registro.produccion_danada = rng.randint(0, 50)
+                    registro.empleado = rng.choice(empleados)
+                    registro.save()
+                else:
+                    registro.delete()
+
+        campos = ["fecha", "turno", "empleado_id", "proveedor_preforma", "registros"]
+        campos += resumenes.SOPLO.metricas
+        incremental = set(ResumenSoploBotellas.objects.values_list(*campos))
+        resumenes.reconstruir_resumenes(resumenes.SOPLO)
+        reconstruido = set(ResumenSoploBotellas.objects.values_list(*campos))
+
+        def agregar():
+            return list(
+                ControlSoploBotellas.objects.values("empleado_id").annotate(
+                    buena=Sum("produccion_buena"),
+                    danada=Sum("produccion_danada"),
+                    total=Sum("produccion_total"),
+                )
+            )
+
+        def leer():
+            return resumenes.consultar_resumen(resumenes.SOPLO, agrupar=["empleado"])
+
+        ms_agregado, _ = medir(agregar, 10)
+        ms_resumen, _ = medir(leer, 10)
+
+        self.stdout.write(
+            f"{options['registros']} controles, {len(reconstruido)} filas de resumen"
+        )
+        self.stdout.write(f"agregando controles: {ms_agregado:8.3f} ms")
+        self.stdout.write(f"desde resúmenes:     {ms_resumen:8.3f} ms")
+        if incremental != reconstruido:
+            raise CommandError(
+                f"{len(incremental ^ reconstruido)} filas difieren de la reconstrucción."
+            )
+        self.stdout.write("los resúmenes incrementales coinciden con la reconstrucción")
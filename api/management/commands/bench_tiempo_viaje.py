@@ -0,0 +1,79 @@
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from api import tiempo_viaje
+
+
+class BackendConLatencia(tiempo_viaje.HaversineBackend):
+    """
+    Backend offline que simula la latencia de una API externa.
+    """
+
+    nombre = "bench"
+    latencia = 0.0
+
+    def tiempo_viaje(self, destino, coordenadas=None):
+        time.sleep(self.latencia)
+        return super().tiempo_viaje(destino, coordenadas=coordenadas)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el cálculo de tiempos de viaje sin cache y con la cache por "
+        "dirección normalizada, usando un backend offline con latencia simulada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consultas", type=int, default=500)
+        parser.add_argument("--direcciones", type=int, default=50)
+        parser.add_argument(
+            "--latencia", type=float, default=20, help="Latencia simulada en ms."
+        )
+
+    def handle(self, *args, **options):
+        BackendConLatencia.latencia = options["latencia"] / 1000
+        rng = random.Random(0)
+        direcciones = [
+            (f"Jr. Benchmark {i}, Huánuco", (-9.93 + i * 0.001, -76.24 - i * 0.001))
+            for i in range(options["direcciones"])
+        ]
+        # Variantes de escritura de la misma dirección comparten la entrada
+        consultas = [
+            (
+                direccion.upper() if rng.random() < 0.5 else f" {direccion}. ",
+                coordenadas,
+            )
+            for direccion, coordenadas in (
+                rng.choice(direcciones) for _ in range(options["consultas"])
+            )
+        ]
+
+        with override_settings(
+            ROUTING_BACKEND=f"{__name__}.BackendConLatencia",
+            STORE_COORDENADAS=(-9.93, -76.24),
+        ):
+            tiempo_viaje.reiniciar()
+            backend = tiempo_viaje.obtener_backend()
+
+            inicio = time.perf_counter()
+            for direccion, coordenadas in consultas:
+                backend.tiempo_viaje(direccion, coordenadas=coordenadas)
+            sin_cache = time.perf_counter() - inicio
+
+            cache.clear()
+            inicio = time.perf_counter()
+            for direccion, coordenadas in consultas:
+                tiempo_viaje.calcular_tiempo_viaje(direccion, coordenadas=coordenadas)
+            con_cache = time.perf_counter() - inicio
+
+            tiempo_viaje.reiniciar()
+
+        self.stdout.write(
+            f"{len(consultas)} consultas, {len(direcciones)} direcciones distintas"
+        )
+        self.stdout.write(f"sin cache: {sin_cache * 1000:.1f} ms")
+        self.stdout.write(f"con cache: {con_cache * 1000:.1f} ms")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.stock import conciliar_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Reproduce los movimientos de inventario desde el último snapshot y "
+        "reporta los saldos que no coinciden con cantidad_actual."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--corregir",
+            action="store_true",
+            help="Reemplaza los saldos con diferencias por los del registro.",
+        )
+
+    def handle(self, *args, **options):
+        inventarios, productos = conciliar_stock(corregir=options["corregir"])
+
+        for fila in inventarios:
+            self.stdout.write(
+                f"Inventario {fila['id']} (producto {fila['producto_id']}): "
+                f"{fila['_actual']} registrado, {fila['_esperado']} según movimientos"
+            )
+        for fila in productos:
+            self.stdout.write(
+                f"Producto {fila['id']}: {fila['_actual']} registrado, "
+                f"{fila['_esperado']} según sus inventarios"
+            )
+
+        total = len(inventarios) + len(productos)
+        if not total:
+            self.stdout.write("Sin diferencias.")
+        elif options["corregir"]:
+            self.stdout.write(f"Diferencias corregidas: {total}")
+        else:
+            raise CommandError(f"{total} saldos con diferencias.")
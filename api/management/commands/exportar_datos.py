@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api.carga_masiva import CARGAS, FORMATOS, exportar
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta clientes, productos o controles de producción en CSV o JSON "
+        "Lines sin cargar la tabla en memoria."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("entidad", choices=list(CARGAS))
+        parser.add_argument("salida", help="Ruta del archivo, o - para stdout.")
+        parser.add_argument("--formato", choices=list(FORMATOS), default="csv")
+
+    def handle(self, *args, **options):
+        partes = exportar(CARGAS[options["entidad"]], options["formato"])
+        if options["salida"] == "-":
+            for parte in partes:
+                sys.stdout.buffer.write(parte)
+            sys.stdout.buffer.flush()
+            return
+
+        tamano = 0
+        with open(options["salida"], "wb") as archivo:
+            for parte in partes:
+                archivo.write(parte)
+                tamano += len(parte)
+        self.stderr.write(f"{tamano / 1024:.0f} KB escritos en {options['salida']}")
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.reportes import procesar_reportes
+
+
+class Command(BaseCommand):
+    help = "Genera los reportes pendientes y guarda su contenido comprimido."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limite", type=int, default=5)
+        parser.add_argument(
+            "--continuo",
+            action="store_true",
+            help="Sigue generando reportes hasta que se detenga el proceso.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=5,
+            help="Segundos de espera cuando no hay reportes pendientes.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            generados, fallidos = procesar_reportes(limite=options["limite"])
+            if generados or fallidos:
+                self.stdout.write(f"Generados: {generados}, con error: {fallidos}")
+
+            if not options["continuo"]:
+                break
+            if not generados and not fallidos:
+                time.sleep(options["intervalo"])
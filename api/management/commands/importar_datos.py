@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.carga_masiva import (
+    CARGAS,
+    FORMATOS,
+    FormatoInvalidoError,
+    formato_de_archivo,
+    importar,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa clientes, productos o controles de producción desde un "
+        "archivo CSV o JSON Lines, por bloques, y reporta los errores por fila."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("entidad", choices=list(CARGAS))
+        parser.add_argument("archivo")
+        parser.add_argument(
+            "--formato",
+            choices=list(FORMATOS),
+            help="Por defecto se deduce de la extensión del archivo.",
+        )
+        parser.add_argument(
+            "--bloque", type=int, help="Filas por transacción (CARGA_MASIVA_BLOQUE)."
+        )
+
+    def handle(self, *args, **options):
+        formato = formato_de_archivo(options["archivo"], options["formato"])
+        try:
+            with open(options["archivo"], encoding="utf-8-sig", newline="") as lineas:
+                resultado = importar(
+                    CARGAS[options["entidad"]],
+                    lineas,
+                    formato,
+                    bloque=options["bloque"],
+                )
+        except (OSError, FormatoInvalidoError, UnicodeDecodeError) as error:
+            raise CommandError(str(error))
+
+        for error in resultado["errores"]:
+            detalle = "; ".join(
+                f"{campo}: {' '.join(mensajes)}"
+                for campo, mensajes in error["errores"].items()
+            )
+            self.stdout.write(f"Línea {error['linea']}: {detalle}")
+        self.stdout.write(
+            f"{resultado['filas']} filas leídas, {resultado['creados']} creadas, "
+            f"{resultado['total_errores']} con errores"
+        )
+        if resultado["total_errores"]:
+            raise CommandError(f"{resultado['total_errores']} filas no se importaron.")
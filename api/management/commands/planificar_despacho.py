@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.despacho import DespachoError, planificar_despacho
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrupa los pedidos confirmados sin distribución en viajes por cluster "
+        "y crea sus AsignacionRuta y Distribucion."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sin-guardar",
+            action="store_true",
+            help="Solo muestra el plan, sin crear distribuciones.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            plan = planificar_despacho(guardar=not options["sin_guardar"])
+        except DespachoError as e:
+            raise CommandError(str(e))
+
+        for viaje in plan["viajes"]:
+            self.stdout.write(
+                f"Ruta {viaje.ruta.nombre} (cluster {viaje.cluster_id}), empleado "
+                f"{viaje.empleado_id}: sale {timezone.localtime(viaje.salida):%H:%M}, "
+                f"vuelve {timezone.localtime(viaje.regreso):%H:%M}, "
+                f"{viaje.carga} paquetes, pedidos "
+                f"{', '.join(map(str, viaje.pedidos))}"
+            )
+        for pedido_id, motivo in plan["sin_planificar"]:
+            self.stderr.write(f"Pedido {pedido_id}: {motivo}")
+        self.stdout.write(
+            f"Viajes: {len(plan['viajes'])}, "
+            f"distribuciones creadas: {plan['distribuciones']}, "
+            f"sin planificar: {len(plan['sin_planificar'])}"
+        )
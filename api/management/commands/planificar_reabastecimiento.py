@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.reabastecimiento import planificar_reabastecimiento
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera o ajusta las tarjetas Kanban automáticas para reponer hasta el "
+        "stock máximo los productos bajo su punto de reorden. Es idempotente; "
+        "programarlo de forma periódica."
+    )
+
+    def handle(self, *args, **options):
+        resultado = planificar_reabastecimiento()
+        self.stdout.write(
+            f"Tarjetas creadas: {resultado['creadas']}, "
+            f"actualizadas: {resultado['actualizadas']}, "
+            f"eliminadas: {resultado['eliminadas']}"
+        )
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.correo import obtener_transporte, procesar_bandeja
+
+
+class Command(BaseCommand):
+    help = "Envía los correos pendientes de la bandeja de salida."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--limite", type=int, default=100)
+        parser.add_argument(
+            "--continuo",
+            action="store_true",
+            help="Sigue procesando la bandeja hasta que se detenga el proceso.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=5,
+            help="Segundos de espera cuando la bandeja está vacía.",
+        )
+
+    def handle(self, *args, **options):
+        transporte = obtener_transporte(pool_size=options["workers"])
+
+        while True:
+            enviados, fallidos = procesar_bandeja(
+                transporte, workers=options["workers"], limite=options["limite"]
+            )
+            if enviados or fallidos:
+                self.stdout.write(f"Enviados: {enviados}, con error: {fallidos}")
+
+            if not options["continuo"]:
+                break
+            if not enviados and not fallidos:
+                time.sleep(options["intervalo"])
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.kpis import definiciones, recalcular_kpis
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula desde cero los KPIs registrados en api.kpis y corrige la "
+        "desviación de los acumuladores incrementales. Programarlo de forma "
+        "periódica (p. ej. cada noche)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "codigos", nargs="*", help="Códigos a recalcular (por defecto todos)."
+        )
+
+    def handle(self, *args, **options):
+        registrados = {definicion.codigo for definicion in definiciones()}
+        desconocidos = set(options["codigos"]) - registrados
+        if desconocidos:
+            raise CommandError(
+                f"KPIs no registrados: {', '.join(sorted(desconocidos))}"
+            )
+
+        for codigo, (anterior, nuevo) in recalcular_kpis(options["codigos"]).items():
+            marca = "" if anterior == nuevo else "  (corregido)"
+            self.stdout.write(f"{codigo}: {anterior} -> {nuevo}{marca}")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api import resumenes
+
+DEFINICIONES = {
+    "soplo": resumenes.SOPLO,
+    "produccion-agua": resumenes.PRODUCCION_AGUA,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenera los resúmenes diarios de producción (por turno, empleado y "
+        "proveedor) desde los controles registrados. Sirve como backfill "
+        "inicial y para corregir cargas que no emiten señales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--modelo", choices=list(DEFINICIONES), help="Por defecto ambos."
+        )
+        parser.add_argument("--desde", help="Fecha inicial YYYY-MM-DD (incluida).")
+        parser.add_argument("--hasta", help="Fecha final YYYY-MM-DD (incluida).")
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for parametro in ("desde", "hasta"):
+            valor = options[parametro]
+            try:
+                fechas[parametro] = parse_date(valor) if valor else None
+            except ValueError:
+                fechas[parametro] = None
+            if valor and fechas[parametro] is None:
+                raise CommandError(f"--{parametro} debe tener el formato YYYY-MM-DD.")
+
+        nombres = [options["modelo"]] if options["modelo"] else list(DEFINICIONES)
+        for nombre in nombres:
+            filas = resumenes.reconstruir_resumenes(DEFINICIONES[nombre], **fechas)
+            self.stdout.write(f"{nombre}: {filas} filas de resumen")
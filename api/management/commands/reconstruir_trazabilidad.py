@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.trazabilidad import reconstruir_trazabilidad
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenera la tabla de trazabilidad por lote desde los inventarios y "
+        "sus movimientos de inventario."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bloque",
+            type=int,
+            default=2000,
+            help="Movimientos leídos e insertados por lote.",
+        )
+
+    def handle(self, *args, **options):
+        creados = reconstruir_trazabilidad(bloque=options["bloque"])
+        self.stdout.write(f"Vínculos de trazabilidad creados: {creados}")
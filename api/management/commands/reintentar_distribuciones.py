@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from api.models import Pedido
+from api.service import crear_distribucion
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea la distribución de los pedidos confirmados que quedaron sin ella "
+        "(p. ej. si el proceso se reinició antes de ejecutar la tarea)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--minutos",
+            type=int,
+            default=5,
+            help="Solo pedidos confirmados hace más de estos minutos.",
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(minutes=options["minutos"])
+        pedidos = (
+            Pedido.objects.filter(
+                estado_pedido="confirmado",
+                distribucion__isnull=True,
+                # La tarea on_commit de una confirmación reciente puede
+                # seguir en curso; fecha_pedido es la creación del pedido
+                fecha_confirmacion__lt=limite,
+            )
+            .annotate(cantidad_paquetes=Sum("detallepedido__cantidad"))
+            .order_by("fecha_confirmacion")
+        )
+
+        creadas = fallidas = 0
+        for pedido in pedidos:
+            resultado = crear_distribucion(
+                pedido.id, pedido.direccion_envio, pedido.cantidad_paquetes or 0
+            )
+            if resultado["success"]:
+                creadas += 1
+            else:
+                fallidas += 1
+                self.stderr.write(f"Pedido {pedido.id}: {resultado['error']}")
+
+        self.stdout.write(f"Distribuciones creadas: {creadas}, fallidas: {fallidas}")
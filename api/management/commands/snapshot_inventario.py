@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from api.stock import tomar_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda un snapshot del saldo de cada inventario según sus movimientos. "
+        "Programarlo de forma periódica (p. ej. cada noche) para que la "
+        "conciliación solo reproduzca los movimientos recientes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bloque",
+            type=int,
+            default=500,
+            help="Inventarios que se bloquean por transacción.",
+        )
+
+    def handle(self, *args, **options):
+        creados = tomar_snapshots(bloque=options["bloque"])
+        self.stdout.write(f"Snapshots creados: {creados}")
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-16 20:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_remove_cliente_apellido_materno_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="movimientoinventario",
+            name="empleado",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="api.empleado",
+            ),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.3 on 2026-10-16 21:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_movimientoinventario_empleado_nullable"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CorreoSaliente",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("destinatario", models.EmailField(max_length=254)),
+                ("asunto", models.CharField(max_length=200)),
+                ("contenido_html", models.TextField()),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("pendiente", "Pendiente"),
+                            ("enviado", "Enviado"),
+                            ("fallido", "Fallido"),
+                        ],
+                        default="pendiente",
+                        max_length=10,
+                    ),
+                ),
+                ("intentos", models.PositiveIntegerField(default=0)),
+                (
+                    "proximo_intento",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("ultimo_error", models.TextField(blank=True, null=True)),
+                ("fecha_creacion", models.DateTimeField(auto_now_add=True)),
+                ("fecha_envio", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "correos_salientes",
+                "indexes": [
+                    models.Index(
+                        fields=["estado", "proximo_intento"],
+                        name="idx_correos_pendientes",
+                    )
+                ],
+            },
+        ),
+    ]
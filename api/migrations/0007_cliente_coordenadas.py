@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-16 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_correosaliente"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cliente",
+            name="latitud",
+            field=models.DecimalField(
+                blank=True, decimal_places=6, max_digits=9, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="cliente",
+            name="longitud",
+            field=models.DecimalField(
+                blank=True, decimal_places=6, max_digits=9, null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-16 21:03
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def completar_fecha_confirmacion(apps, schema_editor):
+    # Sin otro registro de la confirmación, los pedidos ya confirmados usan
+    # su fecha de creación para que reintentar_distribuciones los vea
+    Pedido = apps.get_model("api", "Pedido")
+    Pedido.objects.filter(
+        estado_pedido__in=["confirmado", "entregado"], fecha_confirmacion=None
+    ).update(fecha_confirmacion=F("fecha_pedido"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_cliente_coordenadas"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="distribucion",
+            name="clave_idempotencia",
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name="pedido",
+            name="fecha_confirmacion",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(completar_fecha_confirmacion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-16 21:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_distribucion_clave_idempotencia"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="kpi",
+            name="codigo",
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name="kpi",
+            name="denominador",
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=20),
+        ),
+        migrations.AddField(
+            model_name="kpi",
+            name="numerador",
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=20),
+        ),
+        migrations.AddField(
+            model_name="kpi",
+            name="periodo",
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 5.1.3 on 2026-10-16 21:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_kpi_acumuladores"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResumenProduccionAgua",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fecha", models.DateField()),
+                (
+                    "turno",
+                    models.CharField(
+                        choices=[
+                            ("mañana", "Mañana"),
+                            ("tarde", "Tarde"),
+                            ("noche", "Noche"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "proveedor_preforma",
+                    models.CharField(blank=True, default="", max_length=10),
+                ),
+                ("registros", models.IntegerField(default=0)),
+                ("botellas_envasadas", models.BigIntegerField(default=0)),
+                ("botellas_malogradas", models.BigIntegerField(default=0)),
+                ("tapas_malogradas", models.BigIntegerField(default=0)),
+                ("etiquetas_malogradas", models.BigIntegerField(default=0)),
+                ("total_botella_buenas", models.BigIntegerField(default=0)),
+                ("total_paquetes", models.BigIntegerField(default=0)),
+                (
+                    "empleado",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="api.empleado"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("fecha", "turno", "empleado", "proveedor_preforma"),
+                        name="uniq_resumen_produccion_agua",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ResumenSoploBotellas",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fecha", models.DateField()),
+                (
+                    "turno",
+                    models.CharField(
+                        choices=[
+                            ("mañana", "Mañana"),
+                            ("tarde", "Tarde"),
+                            ("noche", "Noche"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "proveedor_preforma",
+                    models.CharField(blank=True, default="", max_length=10),
+                ),
+                ("registros", models.IntegerField(default=0)),
+                ("produccion_buena", models.BigIntegerField(default=0)),
+                ("produccion_danada", models.BigIntegerField(default=0)),
+                ("produccion_total", models.BigIntegerField(default=0)),
+                (
+                    "empleado",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="api.empleado"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("fecha", "turno", "empleado", "proveedor_preforma"),
+                        name="uniq_resumen_soplo",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.1.3 on 2026-10-16 21:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def marcar_existentes_listos(apps, schema_editor):
+    # Los reportes anteriores ya tienen sus datos en datos_reporte
+    Reporte = apps.get_model("api", "Reporte")
+    Reporte.objects.update(estado="listo")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_resumenes_produccion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reporte",
+            name="contenido",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reporte",
+            name="estado",
+            field=models.CharField(
+                choices=[
+                    ("pendiente", "Pendiente"),
+                    ("listo", "Listo"),
+                    ("fallido", "Fallido"),
+                ],
+                default="pendiente",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="reporte",
+            name="fecha_generacion",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reporte",
+            name="filas",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reporte",
+            name="intentos",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="reporte",
+            name="parametros",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="reporte",
+            name="proximo_intento",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name="reporte",
+            name="tamano_comprimido",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reporte",
+            name="tamano_original",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reporte",
+            name="ultimo_error",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="reporte",
+            name="datos_reporte",
+            field=models.JSONField(
+                blank=True,
+                help_text="Almacena los datos del reporte en formato JSON",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(marcar_existentes_listos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="reporte",
+            index=models.Index(
+                fields=["estado", "proximo_intento"], name="idx_reportes_pendientes"
+            ),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.1.3 on 2026-10-16 21:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def snapshot_inicial(apps, schema_editor):
+    # Los saldos actuales son la base desde la que se concilian los movimientos
+    Inventario = apps.get_model("api", "Inventario")
+    MovimientoInventario = apps.get_model("api", "MovimientoInventario")
+    SnapshotInventario = apps.get_model("api", "SnapshotInventario")
+
+    ultimos = dict(
+        MovimientoInventario.objects.values("inventario_id")
+        .annotate(ultimo=Max("id"))
+        .values_list("inventario_id", "ultimo")
+        .order_by()
+    )
+    SnapshotInventario.objects.bulk_create(
+        [
+            SnapshotInventario(
+                inventario_id=inventario_id,
+                cantidad=cantidad or 0,
+                ultimo_movimiento=ultimos.get(inventario_id, 0),
+            )
+            for inventario_id, cantidad in Inventario.objects.values_list(
+                "id", "cantidad_actual"
+            ).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_reporte_generacion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SnapshotInventario",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cantidad", models.IntegerField()),
+                ("ultimo_movimiento", models.PositiveIntegerField(default=0)),
+                ("fecha", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "inventario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.inventario",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["inventario", "-id"], name="idx_snapshot_inventario"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(snapshot_inicial, migrations.RunPython.noop),
+    ]
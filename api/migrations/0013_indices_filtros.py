@@ -0,0 +1,77 @@
+# Generated by Django 5.1.3 on 2026-10-16 21:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_snapshotinventario"),
+    ]
+
+    operations = [
+        # Duplicados de los índices que ya crean unique, OneToOne y ForeignKey
+        migrations.RemoveIndex(
+            model_name="controlproduccionagua",
+            name="idx_control_produccion_lote",
+        ),
+        migrations.RemoveIndex(
+            model_name="detallepedido",
+            name="idx_detalle_pedidos_pedido",
+        ),
+        migrations.RemoveIndex(
+            model_name="detallepedido",
+            name="idx_detalle_pedidos_producto",
+        ),
+        migrations.RemoveIndex(
+            model_name="detalleventa",
+            name="idx_detalle_ventas_venta",
+        ),
+        migrations.RemoveIndex(
+            model_name="detalleventa",
+            name="idx_detalle_ventas_producto",
+        ),
+        migrations.RemoveIndex(
+            model_name="empleado",
+            name="idx_empleados_user",
+        ),
+        migrations.RemoveIndex(
+            model_name="inventario",
+            name="idx_inventario_producto",
+        ),
+        migrations.AddIndex(
+            model_name="controlproduccionagua",
+            index=models.Index(
+                fields=["empleado", "-fecha_produccion"],
+                name="idx_control_prod_empleado",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="controlproduccionagua",
+            name="empleado",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="api.empleado",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventario",
+            index=models.Index(
+                condition=models.Q(
+                    ("cantidad_actual__lt", models.F("stock_minimo"))
+                ),
+                fields=["id"],
+                name="idx_inventario_bajo_stock",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="producto",
+            index=models.Index(
+                condition=models.Q(("cantidad_actual__gt", 0), ("estado", True)),
+                fields=["id"],
+                name="idx_productos_disponibles",
+            ),
+        ),
+    ]
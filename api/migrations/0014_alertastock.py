@@ -0,0 +1,64 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0013_indices_filtros"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlertaStock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "umbral",
+                    models.CharField(
+                        choices=[
+                            ("punto_reorden", "Punto de reorden"),
+                            ("stock_minimo", "Stock mínimo"),
+                        ],
+                        max_length=15,
+                    ),
+                ),
+                (
+                    "evento",
+                    models.CharField(
+                        choices=[("bajo", "Bajo el umbral"), ("recuperado", "Recuperado")],
+                        max_length=10,
+                    ),
+                ),
+                ("valor_umbral", models.IntegerField()),
+                ("cantidad_anterior", models.IntegerField()),
+                ("cantidad", models.IntegerField()),
+                ("fecha", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "inventario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.inventario",
+                    ),
+                ),
+                (
+                    "producto",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.producto",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_alertastock"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="kanban",
+            name="automatico",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name="kanban",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("automatico", True), ("estado", "pendiente")),
+                fields=("producto",),
+                name="uniq_kanban_automatico",
+            ),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0015_kanban_automatico"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrazabilidadLote",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("numero_lote", models.CharField(max_length=100)),
+                (
+                    "tipo_movimiento",
+                    models.CharField(blank=True, max_length=10, null=True),
+                ),
+                ("cantidad", models.IntegerField(blank=True, null=True)),
+                (
+                    "documento_referencia",
+                    models.CharField(blank=True, max_length=100, null=True),
+                ),
+                ("fecha", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "cliente",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="api.cliente",
+                    ),
+                ),
+                (
+                    "control_produccion",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="api.controlproduccionagua",
+                    ),
+                ),
+                (
+                    "inventario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.inventario",
+                    ),
+                ),
+                (
+                    "movimiento",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.movimientoinventario",
+                    ),
+                ),
+                (
+                    "pedido",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="api.pedido",
+                    ),
+                ),
+                (
+                    "producto",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.producto",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["numero_lote", "fecha"], name="idx_trazabilidad_lote"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("movimiento__isnull", True)),
+                        fields=("inventario",),
+                        name="uniq_trazabilidad_inventario",
+                    )
+                ],
+            },
+        ),
+    ]
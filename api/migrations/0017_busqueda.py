@@ -0,0 +1,103 @@
+# Generated by Django 5.1.3 on 2026-10-16 23:05
+
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import Concat, Lower
+
+TABLAS = ["api_cliente", "api_producto", "api_empleado"]
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    # Full-text y trigramas solo existen en PostgreSQL; en SQLite se usa el
+    # índice en memoria de api.busqueda
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for tabla in TABLAS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{tabla}_busqueda_fts ON {tabla} "
+            f"USING gin (to_tsvector('spanish'::regconfig, busqueda))"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{tabla}_busqueda_trgm ON {tabla} "
+            f"USING gin (busqueda gin_trgm_ops)"
+        )
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for tabla in TABLAS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS idx_{tabla}_busqueda_fts")
+        schema_editor.execute(f"DROP INDEX IF EXISTS idx_{tabla}_busqueda_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0016_trazabilidadlote"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cliente",
+            name="busqueda",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=Lower(
+                    Concat(
+                        "nombre",
+                        Value(" "),
+                        "apellido_paterno",
+                        Value(" "),
+                        "dni",
+                        Value(" "),
+                        "telefono",
+                        output_field=models.TextField(),
+                    )
+                ),
+                output_field=models.TextField(),
+            ),
+        ),
+        migrations.AddField(
+            model_name="empleado",
+            name="busqueda",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=Lower(
+                    Concat(
+                        "nombre",
+                        Value(" "),
+                        "apellido_paterno",
+                        Value(" "),
+                        "apellido_materno",
+                        Value(" "),
+                        "dni",
+                        Value(" "),
+                        "puesto",
+                        output_field=models.TextField(),
+                    )
+                ),
+                output_field=models.TextField(),
+            ),
+        ),
+        migrations.AddField(
+            model_name="producto",
+            name="busqueda",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=Lower(
+                    Concat(
+                        "nombre",
+                        Value(" "),
+                        "descripcion",
+                        Value(" "),
+                        "unidad_medida",
+                        output_field=models.TextField(),
+                    )
+                ),
+                output_field=models.TextField(),
+            ),
+        ),
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-16 23:30
+
+import re
+
+from django.db import migrations, models
+
+
+def normalizar_telefonos(apps, schema_editor):
+    # Mismo formato que api.clientes.normalizar_telefono, para que la
+    # búsqueda por teléfono encuentre a los clientes existentes
+    Cliente = apps.get_model("api", "Cliente")
+    cambios = []
+    for cliente in Cliente.objects.exclude(telefono=None).only("id", "telefono"):
+        digitos = re.sub(r"\D", "", cliente.telefono)
+        if len(digitos) == 11 and digitos.startswith("51"):
+            digitos = digitos[2:]
+        digitos = digitos or None
+        if digitos != cliente.telefono:
+            cliente.telefono = digitos
+            cambios.append(cliente)
+    Cliente.objects.bulk_update(cambios, ["telefono"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0017_busqueda"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_telefonos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="cliente",
+            index=models.Index(fields=["telefono"], name="idx_clientes_telefono"),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0018_cliente_telefono"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivoAnalitico",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dataset", models.CharField(max_length=50)),
+                ("fecha", models.DateField()),
+                ("ruta", models.CharField(max_length=255, unique=True)),
+                ("filas", models.PositiveIntegerField()),
+                ("desde_id", models.BigIntegerField()),
+                ("hasta_id", models.BigIntegerField()),
+                ("tamano", models.PositiveBigIntegerField()),
+                (
+                    "fecha_creacion",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["dataset", "fecha"], name="idx_analitica_fecha"
+                    ),
+                    models.Index(
+                        fields=["dataset", "-hasta_id"],
+                        name="idx_analitica_marca_agua",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -1,14 +1,25 @@
-import os
-
-import sendgrid
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.exceptions import ValidationError
 from django.core.validators import MinLengthValidator, RegexValidator
 from django.db import models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Lower
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.crypto import get_random_string
-from sendgrid.helpers.mail import Content, Email, Mail, To
+
+
+def texto_busqueda(*campos):
+    """
+    Expresión de la columna generada `busqueda` (ver api.busqueda): los
+    campos separados por espacios y en minúsculas.
+    """
+    partes = []
+    for campo in campos:
+        if partes:
+            partes.append(Value(" "))
+        partes.append(campo)
+    return Lower(Concat(*partes, output_field=models.TextField()))
 
 
 class CustomUserManager(BaseUserManager):
@@ -133,10 +144,23 @@ class Cliente(models.Model):
     )
     telefono = models.CharField(max_length=20, null=True, blank=True)
     direccion = models.TextField(max_length=100, null=True, blank=True)
+    latitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitud = models.DecimalField(
+        max_digits=9, decimal_places=6, null=True, blank=True
+    )
     fecha_registro = models.DateTimeField(default=timezone.now)
+    busqueda = models.GeneratedField(
+        expression=texto_busqueda("nombre", "apellido_paterno", "dni", "telefono"),
+        output_field=models.TextField(),
+        db_persist=True,
+    )
 
     class Meta:
-        indexes = [models.Index(fields=["nombre"], name="idx_clientes_nombre")]
+        indexes = [
+            models.Index(fields=["nombre"], name="idx_clientes_nombre"),
+            # Identificación del cliente por su número de WhatsApp
+            models.Index(fields=["telefono"], name="idx_clientes_telefono"),
+        ]
 
     def __str__(self):
         return f"{self.nombre} {self.apellido_paterno}"
@@ -193,9 +217,13 @@ class Empleado(models.Model):
     acceso_sistema = models.BooleanField(
         default=False, verbose_name="Requiere acceso al sistema"
     )
-
-    class Meta:
-        indexes = [models.Index(fields=["user"], name="idx_empleados_user")]
+    busqueda = models.GeneratedField(
+        expression=texto_busqueda(
+            "nombre", "apellido_paterno", "apellido_materno", "dni", "puesto"
+        ),
+        output_field=models.TextField(),
+        db_persist=True,
+    )
 
     def establecer_rol_principal(self, rol_id):
         """
@@ -254,64 +282,36 @@ class Empleado(models.Model):
 
     def generar_password_temporal(self):
         # Genera una contraseña temporal segura
-        return CustomUser.objects.make_random_password(
+        return get_random_string(
             length=12,
             allowed_chars="abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!@#$%^&*",
         )
 
     def enviar_credenciales_por_email(self, credenciales, empleado=None):
         """
-        Envía credenciales de acceso al sistema por correo electrónico usando SendGrid
+        Encola el correo con las credenciales de acceso al sistema.
+        El envío lo realiza el comando `procesar_correos` fuera de la petición.
 
         :param credenciales: Diccionario con información de credenciales
         :param empleado: Instancia del empleado (opcional, para información adicional)
-        :return: Respuesta de SendGrid o None si falla
+        :return: CorreoSaliente encolado
         """
-        try:
-            # Inicializar cliente de SendGrid
-            sg = sendgrid.SendGridAPIClient(api_key=os.getenv("SENDGRID_API_KEY"))
-
-            # Correo remitente (debe ser un correo verificado)
-            from_email = Email("favio_alikhan30@hotmail.com")
-
-            # Correo destinatario
-            to_email = To(credenciales["email"])
-
-            # Asunto del correo
-            subject = "Credenciales de Acceso al Sistema"
-
-            # Preparar contexto para la plantilla
-            context = {
-                "nombre_empleado": empleado.nombre if empleado else "Estimado Empleado",
-                "username": credenciales["username"],
-                "email": credenciales["email"],
-                "password_temporal": credenciales["password_temporal"],
-            }
-
-            # Renderizar plantilla de correo
-            email_template_name = "api/credenciales.html"
-            email_body = render_to_string(email_template_name, context)
-
-            # Contenido del correo
-            content = Content("text/html", email_body)
-
-            # Crear correo
-            mail = Mail(from_email, to_email, subject, content)
-
-            # Enviar correo
-            response = sg.send(mail)
+        from api.correo import encolar_correo
 
-            # Imprimir detalles de la respuesta (opcional, para depuración)
-            print(f"SendGrid response status code: {response.status_code}")
-            print(f"SendGrid response body: {response.body}")
-            print(f"SendGrid response headers: {response.headers}")
+        # Preparar contexto para la plantilla
+        context = {
+            "nombre_empleado": empleado.nombre if empleado else "Estimado Empleado",
+            "username": credenciales["username"],
+            "email": credenciales["email"],
+            "password_temporal": credenciales["password_temporal"],
+        }
 
-            return response
+        # Renderizar plantilla de correo
+        email_body = render_to_string("api/credenciales.html", context)
 
-        except Exception as e:
-            # Loguear el error
-            print(f"Error al enviar credenciales por email: {str(e)}")
-            return None
+        return encolar_correo(
+            credenciales["email"], "Credenciales de Acceso al Sistema", email_body
+        )
 
     def __str__(self):
         return f"{self.nombre} {self.apellido_paterno} {self.apellido_materno}"
@@ -396,9 +396,22 @@ class Producto(models.Model):
     stock_maximo = models.IntegerField(null=True, blank=True)
     cantidad_actual = models.IntegerField(null=True, blank=True)
     estado = models.BooleanField(default=True)
+    busqueda = models.GeneratedField(
+        expression=texto_busqueda("nombre", "descripcion", "unidad_medida"),
+        output_field=models.TextField(),
+        db_persist=True,
+    )
 
     class Meta:
-        indexes = [models.Index(fields=["nombre"], name="idx_productos_nombre")]
+        indexes = [
+            models.Index(fields=["nombre"], name="idx_productos_nombre"),
+            # Parcial: el catálogo productos/disponibles
+            models.Index(
+                fields=["id"],
+                name="idx_productos_disponibles",
+                condition=Q(estado=True, cantidad_actual__gt=0),
+            ),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -418,7 +431,12 @@ class Inventario(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=["producto"], name="idx_inventario_producto"),
+            # Parcial: solo las filas que lista inventarios/bajo-stock
+            models.Index(
+                fields=["id"],
+                name="idx_inventario_bajo_stock",
+                condition=Q(cantidad_actual__lt=F("stock_minimo")),
+            ),
         ]
 
     @property
@@ -438,7 +456,10 @@ class MovimientoInventario(models.Model):
     tipo_movimiento = models.CharField(max_length=10, choices=TIPO_MOVIMIENTO_CHOICES)
     cantidad = models.IntegerField()
     motivo_movimiento = models.TextField()
-    empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE)
+    # Nulo para movimientos generados por el sistema (p. ej. confirmación de pago)
+    empleado = models.ForeignKey(
+        Empleado, on_delete=models.CASCADE, null=True, blank=True
+    )
     documento_referencia = models.CharField(max_length=100, null=True, blank=True)
 
     class Meta:
@@ -447,6 +468,55 @@ class MovimientoInventario(models.Model):
         ]
 
 
+class SnapshotInventario(models.Model):
+    """
+    Saldo de un inventario hasta `ultimo_movimiento` (id de
+    MovimientoInventario, incluido). La conciliación parte del último
+    snapshot y solo reproduce los movimientos posteriores.
+    """
+
+    inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE)
+    cantidad = models.IntegerField()
+    ultimo_movimiento = models.PositiveIntegerField(default=0)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["inventario", "-id"], name="idx_snapshot_inventario"
+            )
+        ]
+
+
+class AlertaStock(models.Model):
+    """
+    Cruce de un umbral de stock (punto de reorden o stock mínimo) detectado
+    al modificar el inventario en api.stock. Los clientes consultan las
+    alertas con un id mayor al último que recibieron.
+    """
+
+    UMBRAL_CHOICES = [
+        ("punto_reorden", "Punto de reorden"),
+        ("stock_minimo", "Stock mínimo"),
+    ]
+    EVENTO_CHOICES = [
+        ("bajo", "Bajo el umbral"),
+        ("recuperado", "Recuperado"),
+    ]
+
+    inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    umbral = models.CharField(max_length=15, choices=UMBRAL_CHOICES)
+    evento = models.CharField(max_length=10, choices=EVENTO_CHOICES)
+    valor_umbral = models.IntegerField()
+    cantidad_anterior = models.IntegerField()
+    cantidad = models.IntegerField()
+    fecha = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.producto_id} {self.evento} {self.umbral} ({self.cantidad})"
+
+
 class ControlSoploBotellas(models.Model):
     PROVEEDOR_CHOICES = [("Ahise", "Ahise"), ("Damar", "Damar")]
 
@@ -474,7 +544,8 @@ class ControlProduccionAgua(models.Model):
     etiquetas_malogradas = models.IntegerField()
     total_botella_buenas = models.IntegerField()
     total_paquetes = models.IntegerField()
-    empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE)
+    # Sin índice propio: lo cubre idx_control_prod_empleado
+    empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE, db_index=False)
     observaciones = models.TextField(null=True, blank=True)
     control_soplado = models.ForeignKey(
         ControlSoploBotellas, on_delete=models.SET_NULL, null=True, blank=True
@@ -485,7 +556,68 @@ class ControlProduccionAgua(models.Model):
             models.Index(
                 fields=["fecha_produccion"], name="idx_control_produccion_fecha"
             ),
-            models.Index(fields=["numero_lote"], name="idx_control_produccion_lote"),
+            models.Index(
+                fields=["empleado", "-fecha_produccion"],
+                name="idx_control_prod_empleado",
+            ),
+        ]
+
+
+TURNO_CHOICES = [
+    ("mañana", "Mañana"),
+    ("tarde", "Tarde"),
+    ("noche", "Noche"),
+]
+
+
+class ResumenSoploBotellas(models.Model):
+    """
+    Totales de ControlSoploBotellas por día, turno, empleado y proveedor,
+    mantenidos por api.resumenes en cada escritura.
+    """
+
+    fecha = models.DateField()
+    turno = models.CharField(max_length=10, choices=TURNO_CHOICES)
+    empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE)
+    proveedor_preforma = models.CharField(max_length=10, blank=True, default="")
+    registros = models.IntegerField(default=0)
+    produccion_buena = models.BigIntegerField(default=0)
+    produccion_danada = models.BigIntegerField(default=0)
+    produccion_total = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fecha", "turno", "empleado", "proveedor_preforma"],
+                name="uniq_resumen_soplo",
+            )
+        ]
+
+
+class ResumenProduccionAgua(models.Model):
+    """
+    Totales de ControlProduccionAgua por día, turno, empleado y proveedor de
+    la preforma (tomado del control de soplado asociado, si existe).
+    """
+
+    fecha = models.DateField()
+    turno = models.CharField(max_length=10, choices=TURNO_CHOICES)
+    empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE)
+    proveedor_preforma = models.CharField(max_length=10, blank=True, default="")
+    registros = models.IntegerField(default=0)
+    botellas_envasadas = models.BigIntegerField(default=0)
+    botellas_malogradas = models.BigIntegerField(default=0)
+    tapas_malogradas = models.BigIntegerField(default=0)
+    etiquetas_malogradas = models.BigIntegerField(default=0)
+    total_botella_buenas = models.BigIntegerField(default=0)
+    total_paquetes = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fecha", "turno", "empleado", "proveedor_preforma"],
+                name="uniq_resumen_produccion_agua",
+            )
         ]
 
 
@@ -537,6 +669,8 @@ class Pedido(models.Model):
     direccion_envio = models.TextField()
     fecha_entrega_estimada = models.DateTimeField(null=True, blank=True)
     comentarios = models.TextField(null=True, blank=True)
+    # Momento del pago confirmado; la distribución se crea después
+    fecha_confirmacion = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         indexes = [
@@ -552,12 +686,6 @@ class DetallePedido(models.Model):
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
 
-    class Meta:
-        indexes = [
-            models.Index(fields=["pedido"], name="idx_detalle_pedidos_pedido"),
-            models.Index(fields=["producto"], name="idx_detalle_pedidos_producto"),
-        ]
-
 
 class Venta(models.Model):
     ESTADO_VENTA_CHOICES = [
@@ -583,12 +711,6 @@ class DetalleVenta(models.Model):
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
 
-    class Meta:
-        indexes = [
-            models.Index(fields=["venta"], name="idx_detalle_ventas_venta"),
-            models.Index(fields=["producto"], name="idx_detalle_ventas_producto"),
-        ]
-
 
 class Produccion(models.Model):
     ESTADO_PRODUCCION_CHOICES = [
@@ -646,6 +768,10 @@ class Distribucion(models.Model):
     fecha_entrega = models.DateTimeField(null=True, blank=True)
     estado = models.CharField(max_length=15, choices=ESTADO_CHOICES)
     empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE)
+    # Evita duplicar la distribución cuando la tarea se reintenta
+    clave_idempotencia = models.CharField(
+        max_length=64, unique=True, null=True, blank=True
+    )
 
     class Meta:
         indexes = [models.Index(fields=["estado"], name="idx_distribucion_estado")]
@@ -661,6 +787,12 @@ class KPI(models.Model):
         max_digits=10, decimal_places=2, null=True, blank=True
     )
     fecha_actualizacion = models.DateTimeField(auto_now=True)
+    # KPIs calculados por api.kpis; nulo para los registrados a mano
+    codigo = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    numerador = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+    denominador = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+    # Día que acumulan los KPIs diarios
+    periodo = models.DateField(null=True, blank=True)
 
 
 class Kanban(models.Model):
@@ -674,9 +806,19 @@ class Kanban(models.Model):
     cantidad = models.IntegerField()
     fecha = models.DateTimeField()
     estado = models.CharField(max_length=15, choices=ESTADO_CHOICES)
+    # Tarjetas creadas por api.reabastecimiento
+    automatico = models.BooleanField(default=False)
 
     class Meta:
         indexes = [models.Index(fields=["estado"], name="idx_kanban_estado")]
+        constraints = [
+            # Una sola tarjeta automática pendiente por producto
+            models.UniqueConstraint(
+                fields=["producto"],
+                condition=Q(estado="pendiente", automatico=True),
+                name="uniq_kanban_automatico",
+            )
+        ]
 
 
 class ClusterGeografico(models.Model):
@@ -759,15 +901,149 @@ class SeguimientoPedido(models.Model):
         db_table = "seguimiento_pedidos"
 
 
+class TrazabilidadLote(models.Model):
+    """
+    Vínculos precalculados de un lote: una fila por inventario que lo
+    contiene (sin movimiento) y una por cada movimiento de ese inventario,
+    con el pedido y cliente que lo recibieron. Lo mantiene api.trazabilidad
+    al escribir, así un retiro de lote se responde con una sola consulta
+    por `numero_lote`.
+    """
+
+    numero_lote = models.CharField(max_length=100)
+    control_produccion = models.ForeignKey(
+        ControlProduccionAgua, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    movimiento = models.OneToOneField(
+        MovimientoInventario, on_delete=models.CASCADE, null=True, blank=True
+    )
+    tipo_movimiento = models.CharField(max_length=10, null=True, blank=True)
+    cantidad = models.IntegerField(null=True, blank=True)
+    documento_referencia = models.CharField(max_length=100, null=True, blank=True)
+    pedido = models.ForeignKey(Pedido, on_delete=models.SET_NULL, null=True, blank=True)
+    cliente = models.ForeignKey(
+        Cliente, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["numero_lote", "fecha"], name="idx_trazabilidad_lote"
+            )
+        ]
+        constraints = [
+            # Una fila base (sin movimiento) por inventario
+            models.UniqueConstraint(
+                fields=["inventario"],
+                condition=Q(movimiento__isnull=True),
+                name="uniq_trazabilidad_inventario",
+            ),
+        ]
+
+
 class Reporte(models.Model):
+    ESTADO_CHOICES = [
+        ("pendiente", "Pendiente"),
+        ("listo", "Listo"),
+        ("fallido", "Fallido"),
+    ]
+
     titulo = models.CharField(max_length=100, validators=[MinLengthValidator(1)])
     descripcion = models.TextField(null=True, blank=True)
     fecha_creacion = models.DateTimeField(default=timezone.now)
     tipo_reporte = models.CharField(max_length=50)
+    # Datos cargados a mano; los reportes generados usan `contenido`
     datos_reporte = models.JSONField(
-        help_text="Almacena los datos del reporte en formato JSON"
+        null=True,
+        blank=True,
+        help_text="Almacena los datos del reporte en formato JSON",
+    )
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(
+        max_length=10, choices=ESTADO_CHOICES, default="pendiente"
     )
+    # JSON comprimido con gzip por api.reportes
+    contenido = models.BinaryField(null=True, blank=True)
+    tamano_comprimido = models.PositiveIntegerField(null=True, blank=True)
+    tamano_original = models.PositiveIntegerField(null=True, blank=True)
+    filas = models.PositiveIntegerField(null=True, blank=True)
+    intentos = models.PositiveIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    fecha_generacion = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["estado", "proximo_intento"], name="idx_reportes_pendientes"
+            )
+        ]
 
     def __str__(self):
         return self.titulo
         return self.titulo
+
+
+class ArchivoAnalitico(models.Model):
+    """
+    Archivo Parquet exportado por api.analitica: las filas de un dataset con
+    id entre `desde_id` y `hasta_id` cuya fecha cae en `fecha`. El mayor
+    `hasta_id` de un dataset es su marca de agua para la exportación
+    incremental.
+    """
+
+    dataset = models.CharField(max_length=50)
+    fecha = models.DateField()
+    ruta = models.CharField(max_length=255, unique=True)
+    filas = models.PositiveIntegerField()
+    desde_id = models.BigIntegerField()
+    hasta_id = models.BigIntegerField()
+    tamano = models.PositiveBigIntegerField()
+    fecha_creacion = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["dataset", "fecha"], name="idx_analitica_fecha"),
+            models.Index(
+                fields=["dataset", "-hasta_id"], name="idx_analitica_marca_agua"
+            ),
+        ]
+
+
+class CorreoSaliente(models.Model):
+    """
+    Bandeja de salida de correos. Los correos se encolan dentro de la
+    petición y el comando `procesar_correos` los envía en segundo plano.
+    """
+
+    ESTADO_CHOICES = [
+        ("pendiente", "Pendiente"),
+        ("enviado", "Enviado"),
+        ("fallido", "Fallido"),
+    ]
+
+    destinatario = models.EmailField()
+    asunto = models.CharField(max_length=200)
+    contenido_html = models.TextField()
+    estado = models.CharField(
+        max_length=10, choices=ESTADO_CHOICES, default="pendiente"
+    )
+    intentos = models.PositiveIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    ultimo_error = models.TextField(null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["estado", "proximo_intento"], name="idx_correos_pendientes"
+            )
+        ]
+        db_table = "correos_salientes"
+
+    def __str__(self):
+        return f"{self.asunto} -> {self.destinatario} ({self.estado})"
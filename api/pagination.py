@@ -0,0 +1,94 @@
+from django.http import StreamingHttpResponse
+from rest_framework import pagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from api.streaming import iterar_async
+
+
+def orden_cursor(view, por_defecto="-id"):
+    """
+    `cursor_ordering` de la vista como tupla de columnas.
+    """
+    ordering = getattr(view, "cursor_ordering", por_defecto)
+    if isinstance(ordering, str):
+        return (ordering,)
+    return tuple(ordering)
+
+
+class CursorPagination(pagination.CursorPagination):
+    """
+    Paginación por cursor para todos los listados de la API.
+
+    Cada ViewSet define `cursor_ordering` con una columna indexada y "-id"
+    como desempate (p. ej. ("-fecha_pedido", "-id")), para que las filas con
+    la misma fecha no se repitan ni se salten entre páginas; por defecto se
+    ordena por "-id".
+    """
+
+    ordering = "-id"
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        return orden_cursor(view, self.ordering)
+
+
+class StreamingListMixin:
+    """
+    Permite exportar el listado completo con `?stream=1` como un arreglo JSON
+    que se genera por bloques, sin cargar toda la tabla en memoria.
+    `cursor_ordering` define también el orden de la paginación por cursor.
+    """
+
+    cursor_ordering = "-id"
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("stream") in ("1", "true"):
+            queryset = self.filter_queryset(self.get_queryset()).order_by(
+                *orden_cursor(self)
+            )
+            return StreamingHttpResponse(
+                iterar_async(self.stream_json(queryset)),
+                content_type="application/json",
+            )
+        return super().list(request, *args, **kwargs)
+
+    def listar_paginado(self, queryset):
+        """
+        Respuesta paginada (con `cursor_ordering`) para las acciones de
+        listado propias del ViewSet.
+        """
+        pagina = self.paginate_queryset(queryset)
+        if pagina is None:
+            return Response(self.get_serializer(queryset, many=True).data)
+        serializer = self.get_serializer(pagina, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def stream_json(self, queryset):
+        renderer = JSONRenderer()
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+
+        yield b"["
+        separador = b""
+        bloque = []
+        for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+            bloque.append(obj)
+            if len(bloque) == self.stream_chunk_size:
+                yield separador + self._render_bloque(
+                    renderer, serializer_class, context, bloque
+                )
+                separador = b","
+                bloque = []
+        if bloque:
+            yield separador + self._render_bloque(
+                renderer, serializer_class, context, bloque
+            )
+        yield b"]"
+
+    def _render_bloque(self, renderer, serializer_class, context, bloque):
+        data = serializer_class(bloque, many=True, context=context).data
+        # Se quitan los corchetes para concatenar los bloques en un solo arreglo
+        return renderer.render(data)[1:-1]
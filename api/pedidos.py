@@ -0,0 +1,205 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.http import Http404
+from django.utils import timezone
+
+from api.models import DetallePedido, Inventario, Pedido, Producto
+from api.service import programar_distribucion
+from api.stock import reservar_stock_pedido
+
+
+class PedidoInvalidoError(ValueError):
+    """
+    Error de validación de los items de un pedido.
+    """
+
+
+def normalizar_items(items):
+    """
+    Valida la lista de items {producto_id, cantidad} y convierte sus valores
+    a enteros.
+
+    :raises PedidoInvalidoError: Si algún item está mal formado
+    """
+    normalizados = []
+    for item in items:
+        try:
+            producto_id = int(item["producto_id"])
+            cantidad = int(item["cantidad"])
+        except (KeyError, TypeError, ValueError):
+            raise PedidoInvalidoError(
+                "Cada item debe tener producto_id y cantidad enteros."
+            )
+        if cantidad <= 0:
+            raise PedidoInvalidoError("La cantidad debe ser mayor a cero.")
+        normalizados.append((producto_id, cantidad))
+    return normalizados
+
+
+def productos_con_stock_qs(producto_ids):
+    """
+    Productos activos anotando en `stock_inventario` la cantidad del primer
+    inventario de cada uno, en una sola consulta.
+    """
+    stock = (
+        Inventario.objects.filter(producto=OuterRef("pk"))
+        .order_by("id")
+        .values("cantidad_actual")[:1]
+    )
+    return Producto.objects.filter(id__in=producto_ids, estado=True).annotate(
+        stock_inventario=Subquery(stock)
+    )
+
+
+def productos_con_stock(producto_ids):
+    """
+    Retorna {producto_id: producto} con el stock anotado.
+    """
+    return {producto.id: producto for producto in productos_con_stock_qs(producto_ids)}
+
+
+def verificar_stock(items):
+    """
+    Verifica disponibilidad, precio unitario y total de varios items con una
+    sola consulta. Las cantidades de un mismo producto se acumulan.
+
+    :param items: Lista de {producto_id, cantidad}
+    :return: Tupla (lista de resultados por item, total de los disponibles)
+    :raises PedidoInvalidoError: Si algún item está mal formado
+    """
+    items = normalizar_items(items)
+    productos = productos_con_stock({producto_id for producto_id, _ in items})
+
+    solicitado = defaultdict(int)
+    total = Decimal("0")
+    resultados = []
+
+    for producto_id, cantidad in items:
+        producto = productos.get(producto_id)
+        if producto is None:
+            resultados.append(
+                {
+                    "producto_id": producto_id,
+                    "cantidad": cantidad,
+                    "disponible": False,
+                    "mensaje": "Producto no encontrado.",
+                }
+            )
+            continue
+
+        solicitado[producto_id] += cantidad
+        if (producto.stock_inventario or 0) < solicitado[producto_id]:
+            resultados.append(
+                {
+                    "producto_id": producto_id,
+                    "cantidad": cantidad,
+                    "disponible": False,
+                    "mensaje": "Stock insuficiente.",
+                }
+            )
+            continue
+
+        subtotal = producto.precio_unitario * cantidad
+        total += subtotal
+        resultados.append(
+            {
+                "producto_id": producto_id,
+                "cantidad": cantidad,
+                "disponible": True,
+                "precio_unitario": producto.precio_unitario,
+                "total": subtotal,
+            }
+        )
+
+    return resultados, total
+
+
+def crear_pedido_temporal(cliente, items, comentarios=""):
+    """
+    Crea un pedido pendiente con sus detalles usando un número fijo de
+    consultas, sin importar la cantidad de items.
+
+    :param cliente: Cliente que realiza el pedido
+    :param items: Lista de {producto_id, cantidad}
+    :return: Tupla (pedido, total_pedido)
+    :raises Http404: Si algún producto no existe o está inactivo
+    :raises PedidoInvalidoError: Si los items son inválidos o falta stock
+    """
+    items = normalizar_items(items)
+    productos = productos_con_stock({producto_id for producto_id, _ in items})
+
+    solicitado = defaultdict(int)
+    total_pedido = Decimal("0")
+    detalles = []
+
+    for producto_id, cantidad in items:
+        producto = productos.get(producto_id)
+        if producto is None:
+            raise Http404(f"No existe el producto {producto_id}.")
+
+        solicitado[producto_id] += cantidad
+        if (producto.stock_inventario or 0) < solicitado[producto_id]:
+            raise PedidoInvalidoError(
+                f"Stock insuficiente para el producto {producto.nombre}."
+            )
+
+        subtotal = producto.precio_unitario * cantidad
+        total_pedido += subtotal
+        detalles.append(
+            DetallePedido(
+                producto=producto,
+                cantidad=cantidad,
+                precio_unitario=producto.precio_unitario,
+                subtotal=subtotal,
+            )
+        )
+
+    with transaction.atomic():
+        pedido = Pedido.objects.create(
+            cliente=cliente,
+            estado_pedido="pendiente",
+            total_pedido=total_pedido,
+            direccion_envio=cliente.direccion,
+            comentarios=comentarios,
+        )
+        for detalle in detalles:
+            detalle.pedido = pedido
+        DetallePedido.objects.bulk_create(detalles)
+
+    return pedido, total_pedido
+
+
+def confirmar_pedido(pedido, despachar=programar_distribucion):
+    """
+    Confirma un pedido pendiente en dos fases.
+
+    Fase uno (transacción corta): cambia el estado y descuenta el stock.
+    Fase dos (después del commit): `despachar` crea la distribución, que
+    consulta el servicio de rutas sin mantener bloqueos de inventario.
+
+    :raises PedidoInvalidoError: Si el pedido ya no está pendiente
+    :raises StockInsuficienteError: Si algún producto no tiene stock suficiente
+    """
+    with transaction.atomic():
+        # Actualización condicional: dos confirmaciones simultáneas no
+        # pueden descontar el stock dos veces
+        fecha_confirmacion = timezone.now()
+        actualizados = Pedido.objects.filter(
+            pk=pedido.pk, estado_pedido="pendiente"
+        ).update(estado_pedido="confirmado", fecha_confirmacion=fecha_confirmacion)
+        if not actualizados:
+            raise PedidoInvalidoError("El pedido no está en estado pendiente.")
+
+        detalles, _ = reservar_stock_pedido(pedido)
+        cantidad_paquetes = sum(detalle.cantidad for detalle in detalles)
+
+        transaction.on_commit(
+            lambda: despachar(pedido.id, pedido.direccion_envio, cantidad_paquetes)
+        )
+
+    pedido.estado_pedido = "confirmado"
+    pedido.fecha_confirmacion = fecha_confirmacion
+    return detalles
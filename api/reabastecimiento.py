@@ -0,0 +1,116 @@
+"""
+Planificador de reabastecimiento con tarjetas Kanban.
+
+Recorre el stock agregado por producto en una sola consulta y, cuando la
+posición (stock más tarjetas abiertas) queda bajo el punto de reorden, pide
+lo necesario para llegar al stock máximo con una tarjeta automática
+pendiente. Es idempotente: volver a ejecutarlo sin cambios de stock no crea
+ni modifica tarjetas.
+"""
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api.models import Inventario, Kanban
+
+ESTADOS_ABIERTOS = ["pendiente", "en proceso"]
+
+
+def cantidad_a_pedir(stock, en_camino, punto_reorden, stock_maximo):
+    """
+    Cantidad para reponer hasta `stock_maximo` si la posición (stock más lo
+    que ya está en camino) está bajo el punto de reorden; si no, 0.
+    """
+    if punto_reorden is None or stock_maximo is None:
+        return 0
+    posicion = stock + en_camino
+    if posicion >= punto_reorden:
+        return 0
+    return max(stock_maximo - posicion, 0)
+
+
+def _primero(valor, alternativo):
+    return valor if valor is not None else alternativo
+
+
+def _tarjetas_abiertas():
+    """
+    Por producto: (tarjeta automática pendiente o None, cantidad de las
+    demás tarjetas abiertas).
+    """
+    tarjetas = {}
+    for tarjeta in Kanban.objects.filter(estado__in=ESTADOS_ABIERTOS).only(
+        "id", "producto_id", "cantidad", "estado", "automatico"
+    ):
+        automatica, en_camino = tarjetas.get(tarjeta.producto_id, (None, 0))
+        if tarjeta.automatico and tarjeta.estado == "pendiente":
+            automatica = tarjeta
+        else:
+            en_camino += tarjeta.cantidad
+        tarjetas[tarjeta.producto_id] = (automatica, en_camino)
+    return tarjetas
+
+
+@transaction.atomic
+def planificar_reabastecimiento():
+    """
+    Crea, actualiza o elimina las tarjetas automáticas pendientes según el
+    stock actual. Los umbrales de un producto son los mayores de sus
+    inventarios o, si no tienen, los del producto.
+
+    :return: Diccionario con las tarjetas creadas, actualizadas y eliminadas
+    """
+    niveles = (
+        Inventario.objects.values(
+            "producto_id", "producto__stock_minimo", "producto__stock_maximo"
+        )
+        .annotate(
+            _stock=Coalesce(Sum("cantidad_actual"), 0),
+            _punto_reorden=Max("punto_reorden"),
+            _stock_maximo=Max("stock_maximo"),
+        )
+        .order_by()
+    )
+    tarjetas = _tarjetas_abiertas()
+    ahora = timezone.now()
+
+    crear, actualizar, eliminar = [], [], []
+    for nivel in niveles.iterator(chunk_size=2000):
+        producto_id = nivel["producto_id"]
+        automatica, en_camino = tarjetas.get(producto_id, (None, 0))
+        cantidad = cantidad_a_pedir(
+            nivel["_stock"],
+            en_camino,
+            _primero(nivel["_punto_reorden"], nivel["producto__stock_minimo"]),
+            _primero(nivel["_stock_maximo"], nivel["producto__stock_maximo"]),
+        )
+
+        if automatica is None:
+            if cantidad:
+                crear.append(
+                    Kanban(
+                        producto_id=producto_id,
+                        cantidad=cantidad,
+                        fecha=ahora,
+                        estado="pendiente",
+                        automatico=True,
+                    )
+                )
+        elif not cantidad:
+            eliminar.append(automatica.id)
+        elif automatica.cantidad != cantidad:
+            automatica.cantidad = cantidad
+            automatica.fecha = ahora
+            actualizar.append(automatica)
+
+    # ignore_conflicts: otra ejecución simultánea pudo crear la misma tarjeta
+    Kanban.objects.bulk_create(crear, batch_size=1000, ignore_conflicts=True)
+    Kanban.objects.bulk_update(actualizar, ["cantidad", "fecha"], batch_size=1000)
+    Kanban.objects.filter(id__in=eliminar).delete()
+    return {
+        "creadas": len(crear),
+        "actualizadas": len(actualizar),
+        "eliminadas": len(eliminar),
+    }
@@ -0,0 +1,500 @@
+"""
+Generación de reportes en segundo plano.
+
+Un Reporte se crea en estado "pendiente" con su tipo y parámetros; el comando
+`generar_reportes` lo toma, recorre los registros de origen con `.iterator()`
+y guarda el resultado como JSON comprimido con gzip en `Reporte.contenido`.
+El listado de reportes solo expone metadatos y el contenido se sirve por id
+en `reportes/<id>/contenido/` (JSON, JSON gzip o CSV).
+"""
+
+import csv
+import gzip
+import io
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.renderers import BaseRenderer
+
+from api.models import (
+    ControlProduccionAgua,
+    DetallePedido,
+    Inventario,
+    MovimientoInventario,
+    Producto,
+    Reporte,
+)
+from api.stock import SIGNO_MOVIMIENTO, cantidad_con_signo
+
+logger = logging.getLogger(__name__)
+
+
+class DefinicionReporte:
+    """
+    Describe un tipo de reporte.
+
+    :param columnas: Nombres de las columnas de cada fila
+    :param filas: Función (desde, hasta) que genera las filas en orden
+    :param totales: Columnas numéricas que se suman al final del reporte
+    """
+
+    def __init__(self, tipo, columnas, filas, totales=()):
+        self.tipo = tipo
+        self.columnas = columnas
+        self.filas = filas
+        self.totales = totales
+
+
+def _rango(queryset, campo, desde, hasta):
+    if desde:
+        queryset = queryset.filter(**{f"{campo}__date__gte": desde})
+    if hasta:
+        queryset = queryset.filter(**{f"{campo}__date__lte": hasta})
+    return queryset
+
+
+def _filas_produccion(desde, hasta):
+    queryset = _rango(
+        ControlProduccionAgua.objects.all(), "fecha_produccion", desde, hasta
+    )
+    return (
+        queryset.order_by("fecha_produccion", "id")
+        .values_list(
+            "fecha_produccion",
+            "numero_lote",
+            "empleado__nombre",
+            "botellas_envasadas",
+            "botellas_malogradas",
+            "total_botella_buenas",
+            "total_paquetes",
+        )
+        .iterator(chunk_size=settings.REPORTES_CHUNK_SIZE)
+    )
+
+
+def _filas_ventas(desde, hasta):
+    queryset = DetallePedido.objects.filter(
+        pedido__estado_pedido__in=["confirmado", "entregado"]
+    )
+    queryset = _rango(queryset, "pedido__fecha_pedido", desde, hasta)
+    return (
+        queryset.order_by("pedido__fecha_pedido", "pedido_id", "id")
+        .values_list(
+            "pedido__fecha_pedido",
+            "pedido_id",
+            "pedido__cliente_id",
+            "producto__nombre",
+            "cantidad",
+            "precio_unitario",
+            "subtotal",
+        )
+        .iterator(chunk_size=settings.REPORTES_CHUNK_SIZE)
+    )
+
+
+def _filas_rotacion_inventario(desde, hasta):
+    """
+    Rotación por producto en el periodo: salidas / stock promedio, donde el
+    stock final se deduce del stock actual y los movimientos posteriores.
+    Los movimientos se recorren una vez; solo se acumula un total por producto.
+    """
+    movimientos = _rango(
+        MovimientoInventario.objects.all(), "fecha_movimiento", desde, hasta
+    )
+    acumulado = {}
+    for producto_id, tipo, cantidad in movimientos.values_list(
+        "inventario__producto_id", "tipo_movimiento", "cantidad"
+    ).iterator(chunk_size=settings.REPORTES_CHUNK_SIZE):
+        totales = acumulado.setdefault(
+            producto_id, {"entrada": 0, "salida": 0, "ajuste": 0}
+        )
+        totales[tipo] += cantidad
+
+    stock_final = dict(
+        Inventario.objects.filter(producto_id__in=acumulado)
+        .values("producto_id")
+        .annotate(total=Sum("cantidad_actual"))
+        .values_list("producto_id", "total")
+        .order_by()
+    )
+    if hasta:
+        posteriores = (
+            MovimientoInventario.objects.filter(
+                inventario__producto_id__in=acumulado,
+                fecha_movimiento__date__gt=hasta,
+            )
+            .values("inventario__producto_id")
+            .annotate(neto=Sum(cantidad_con_signo()))
+            .values_list("inventario__producto_id", "neto")
+            .order_by()
+        )
+        for producto_id, neto in posteriores:
+            stock_final[producto_id] = (stock_final.get(producto_id) or 0) - neto
+
+    nombres = dict(
+        Producto.objects.filter(id__in=acumulado).values_list("id", "nombre")
+    )
+    for producto_id in sorted(acumulado):
+        totales = acumulado[producto_id]
+        final = stock_final.get(producto_id) or 0
+        neto = sum(totales[tipo] * signo for tipo, signo in SIGNO_MOVIMIENTO.items())
+        inicial = final - neto
+        promedio = (inicial + final) / 2
+        rotacion = round(totales["salida"] / promedio, 4) if promedio > 0 else None
+        yield (
+            producto_id,
+            nombres.get(producto_id),
+            inicial,
+            totales["entrada"],
+            totales["salida"],
+            totales["ajuste"],
+            final,
+            rotacion,
+        )
+
+
+REPORTES = {
+    definicion.tipo: definicion
+    for definicion in (
+        DefinicionReporte(
+            tipo="produccion",
+            columnas=[
+                "fecha_produccion",
+                "numero_lote",
+                "empleado",
+                "botellas_envasadas",
+                "botellas_malogradas",
+                "total_botella_buenas",
+                "total_paquetes",
+            ],
+            filas=_filas_produccion,
+            totales=[
+                "botellas_envasadas",
+                "botellas_malogradas",
+                "total_botella_buenas",
+                "total_paquetes",
+            ],
+        ),
+        DefinicionReporte(
+            tipo="ventas",
+            columnas=[
+                "fecha_pedido",
+                "pedido_id",
+                "cliente_id",
+                "producto",
+                "cantidad",
+                "precio_unitario",
+                "subtotal",
+            ],
+            filas=_filas_ventas,
+            totales=["cantidad", "subtotal"],
+        ),
+        DefinicionReporte(
+            tipo="rotacion_inventario",
+            columnas=[
+                "producto_id",
+                "producto",
+                "stock_inicial",
+                "entradas",
+                "salidas",
+                "ajustes",
+                "stock_final",
+                "rotacion",
+            ],
+            filas=_filas_rotacion_inventario,
+            totales=["entradas", "salidas", "ajustes"],
+        ),
+    )
+}
+
+
+def validar_parametros(tipo, parametros):
+    """
+    Verifica el tipo de reporte y normaliza sus parámetros (desde, hasta).
+    Lanza ValueError con un mensaje para el cliente si no son válidos.
+    """
+    if tipo not in REPORTES:
+        raise ValueError(
+            f"Tipo de reporte desconocido. Opciones: {', '.join(sorted(REPORTES))}."
+        )
+    if not isinstance(parametros, dict):
+        raise ValueError("Los parámetros deben ser un objeto.")
+
+    desconocidos = set(parametros) - {"desde", "hasta"}
+    if desconocidos:
+        raise ValueError(
+            f"Parámetros desconocidos: {', '.join(sorted(desconocidos))}."
+        )
+
+    normalizados = {}
+    for clave in ("desde", "hasta"):
+        valor = parametros.get(clave)
+        if valor in (None, ""):
+            continue
+        fecha = parse_date(str(valor))
+        if fecha is None:
+            raise ValueError(f"'{clave}' debe tener el formato AAAA-MM-DD.")
+        normalizados[clave] = fecha.isoformat()
+    if normalizados.get("desde", "") > normalizados.get("hasta", "9999-12-31"):
+        raise ValueError("'desde' no puede ser posterior a 'hasta'.")
+    return normalizados
+
+
+def comprimir_reporte(tipo, parametros):
+    """
+    Genera el reporte y lo escribe fila por fila en un gzip, de modo que en
+    memoria solo se mantiene un bloque de filas y el resultado comprimido.
+
+    :return: Tupla (contenido comprimido, tamaño sin comprimir, filas)
+    """
+    definicion = REPORTES[tipo]
+    desde = parse_date(parametros.get("desde") or "")
+    hasta = parse_date(parametros.get("hasta") or "")
+    indices = [definicion.columnas.index(columna) for columna in definicion.totales]
+    totales = [0] * len(indices)
+    encoder = DjangoJSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+    buffer = io.BytesIO()
+    tamano = filas = 0
+    # mtime=0 para que el mismo reporte produzca siempre los mismos bytes
+    with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as archivo:
+
+        def escribir(texto):
+            nonlocal tamano
+            datos = texto.encode()
+            tamano += len(datos)
+            archivo.write(datos)
+
+        escribir(
+            '{"tipo":%s,"parametros":%s,"columnas":%s,"filas":['
+            % (
+                encoder.encode(tipo),
+                encoder.encode(parametros),
+                encoder.encode(definicion.columnas),
+            )
+        )
+        for fila in definicion.filas(desde, hasta):
+            escribir(("," if filas else "") + encoder.encode(list(fila)))
+            for posicion, indice in enumerate(indices):
+                totales[posicion] += fila[indice] or 0
+            filas += 1
+        escribir(
+            '],"totales":%s}'
+            % encoder.encode(dict(zip(definicion.totales, totales)))
+        )
+    return buffer.getvalue(), tamano, filas
+
+
+def generar_reporte(reporte):
+    """
+    Genera el contenido de `reporte` y lo marca como listo.
+    """
+    contenido, tamano, filas = comprimir_reporte(
+        reporte.tipo_reporte, reporte.parametros
+    )
+    Reporte.objects.filter(id=reporte.id).update(
+        estado="listo",
+        contenido=contenido,
+        tamano_comprimido=len(contenido),
+        tamano_original=tamano,
+        filas=filas,
+        fecha_generacion=timezone.now(),
+        ultimo_error=None,
+    )
+
+
+def encolar_regeneracion(reporte):
+    """
+    Vuelve a dejar el reporte pendiente para que un worker lo regenere.
+    """
+    Reporte.objects.filter(id=reporte.id).update(
+        estado="pendiente", intentos=0, proximo_intento=timezone.now()
+    )
+
+
+def _reclamar_pendientes(limite):
+    """
+    Toma hasta `limite` reportes pendientes y aplaza su próximo intento para
+    que otro worker no los genere al mismo tiempo.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        reportes = list(
+            Reporte.objects.select_for_update(skip_locked=True)
+            .filter(estado="pendiente", proximo_intento__lte=ahora)
+            .only("id", "tipo_reporte", "parametros", "intentos")
+            .order_by("proximo_intento", "id")[:limite]
+        )
+        Reporte.objects.filter(id__in=[reporte.id for reporte in reportes]).update(
+            proximo_intento=ahora + timedelta(seconds=settings.REPORTES_LEASE)
+        )
+    return reportes
+
+
+def _registrar_error(reporte, error):
+    ahora = timezone.now()
+    intentos = reporte.intentos + 1
+    if intentos >= settings.REPORTES_MAX_INTENTOS:
+        estado, proximo_intento = "fallido", ahora
+    else:
+        espera = settings.REPORTES_BACKOFF * (2 ** (intentos - 1))
+        estado, proximo_intento = "pendiente", ahora + timedelta(seconds=espera)
+    Reporte.objects.filter(id=reporte.id).update(
+        estado=estado,
+        intentos=intentos,
+        proximo_intento=proximo_intento,
+        ultimo_error=str(error),
+    )
+
+
+def procesar_reportes(limite=5):
+    """
+    Genera un bloque de reportes pendientes, uno tras otro.
+
+    :return: Tupla (generados, con error)
+    """
+    generados = fallidos = 0
+    for reporte in _reclamar_pendientes(limite):
+        try:
+            generar_reporte(reporte)
+            generados += 1
+        except Exception as e:
+            logger.exception("Error al generar el reporte %s", reporte.id)
+            _registrar_error(reporte, e)
+            fallidos += 1
+    return generados, fallidos
+
+
+def _celda(valor):
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return valor
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Declara text/csv para la negociación de contenido; el reporte en sí lo
+    arma la vista con `filas_csv`. Las demás respuestas (estado pendiente,
+    errores) se escriben como CSV con una columna por clave.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        filas = data if isinstance(data, list) else [data]
+        salida = io.StringIO()
+        escritor = csv.writer(salida)
+        if all(isinstance(fila, dict) for fila in filas):
+            columnas = list(dict.fromkeys(clave for fila in filas for clave in fila))
+            escritor.writerow(columnas)
+            for fila in filas:
+                escritor.writerow([_celda(fila.get(columna)) for columna in columnas])
+        else:
+            for fila in filas:
+                escritor.writerow([_celda(fila)])
+        return salida.getvalue().encode(self.charset)
+
+
+class _Eco:
+    def write(self, valor):
+        return valor
+
+
+class _LectorJSON:
+    """
+    Lee valores JSON consecutivos de un archivo de texto por bloques, para
+    recorrer un reporte sin cargarlo completo en memoria.
+    """
+
+    def __init__(self, archivo, bloque=64 * 1024):
+        self.archivo = archivo
+        self.bloque = bloque
+        self.texto = ""
+        self.posicion = 0
+        self.decoder = json.JSONDecoder()
+
+    def _leer(self):
+        datos = self.archivo.read(self.bloque)
+        if not datos:
+            return False
+        self.texto = self.texto[self.posicion :] + datos
+        self.posicion = 0
+        return True
+
+    def mirar(self):
+        """
+        Siguiente carácter que no es espacio, sin consumirlo.
+        """
+        while True:
+            while (
+                self.posicion < len(self.texto)
+                and self.texto[self.posicion].isspace()
+            ):
+                self.posicion += 1
+            if self.posicion < len(self.texto):
+                return self.texto[self.posicion]
+            if not self._leer():
+                raise ValueError("El contenido del reporte está incompleto.")
+
+    def esperar(self, *simbolos):
+        simbolo = self.mirar()
+        if simbolo not in simbolos:
+            raise ValueError(f"Contenido del reporte inválido cerca de {simbolo!r}.")
+        self.posicion += 1
+        return simbolo
+
+    def valor(self):
+        self.mirar()
+        while True:
+            try:
+                valor, fin = self.decoder.raw_decode(self.texto, self.posicion)
+            except json.JSONDecodeError:
+                if not self._leer():
+                    raise
+                continue
+            # Un número al final del bloque puede continuar en el siguiente
+            if fin == len(self.texto) and self._leer():
+                continue
+            self.posicion = fin
+            return valor
+
+
+def filas_csv(contenido):
+    """
+    Genera el reporte comprimido como líneas CSV con las columnas como
+    encabezado. El gzip se descomprime por bloques y cada fila se escribe
+    apenas se decodifica.
+    """
+    escritor = csv.writer(_Eco())
+    with gzip.GzipFile(fileobj=io.BytesIO(contenido)) as comprimido:
+        lector = _LectorJSON(io.TextIOWrapper(comprimido, encoding="utf-8"))
+        lector.esperar("{")
+        while lector.mirar() != "}":
+            clave = lector.valor()
+            lector.esperar(":")
+            if clave == "columnas":
+                yield escritor.writerow(lector.valor())
+            elif clave == "filas":
+                lector.esperar("[")
+                if lector.mirar() == "]":
+                    lector.esperar("]")
+                else:
+                    while True:
+                        yield escritor.writerow(lector.valor())
+                        if lector.esperar(",", "]") == "]":
+                            break
+            else:
+                lector.valor()
+            if lector.esperar(",", "}") == "}":
+                return
@@ -0,0 +1,270 @@
+"""
+Resúmenes de producción por día, turno, empleado y proveedor.
+
+Cada guardado o eliminación de un control de soplado o de producción de agua
+resta su aporte del resumen anterior y lo suma al nuevo con UPDATE ... F(),
+por lo que los totales se consultan sin recorrer los registros originales.
+Los controles de producción toman el proveedor de su control de soplado:
+`mover_producciones` los reubica cuando éste cambia de proveedor o se
+elimina (el SET_NULL es un UPDATE sin señales). Las escrituras que no emiten
+señales (update, bulk_create) se corrigen con `reconstruir_resumenes`, que
+regenera los resúmenes desde cero (backfill o corrección).
+"""
+
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractHour, TruncDate
+from django.utils import timezone
+
+from api.models import (
+    ControlProduccionAgua,
+    ControlSoploBotellas,
+    ResumenProduccionAgua,
+    ResumenSoploBotellas,
+)
+
+# Turnos por hora local de inicio (incluida) y fin (excluida); el resto es noche
+TURNOS = [("mañana", 6, 14), ("tarde", 14, 22)]
+TURNO_RESTANTE = "noche"
+
+
+def turno_de(fecha):
+    hora = timezone.localtime(fecha).hour
+    for turno, inicio, fin in TURNOS:
+        if inicio <= hora < fin:
+            return turno
+    return TURNO_RESTANTE
+
+
+def turno_expresion(campo_hora):
+    """
+    Equivalente en SQL de `turno_de` sobre una anotación con la hora local.
+    """
+    return Case(
+        *(
+            When(
+                Q(**{f"{campo_hora}__gte": inicio, f"{campo_hora}__lt": fin}),
+                then=Value(turno),
+            )
+            for turno, inicio, fin in TURNOS
+        ),
+        default=Value(TURNO_RESTANTE),
+        output_field=CharField(),
+    )
+
+
+class DefinicionResumen:
+    """
+    Relaciona un modelo de control con su tabla de resumen.
+
+    :param campo_fecha: Fecha del registro original
+    :param proveedor: Ruta al proveedor de la preforma desde el registro
+    :param metricas: Campos que se suman, con el mismo nombre en el resumen
+    :param dano: (dañado, total) para calcular la tasa de daño
+    """
+
+    def __init__(self, modelo, resumen, campo_fecha, proveedor, metricas, dano):
+        self.modelo = modelo
+        self.resumen = resumen
+        self.campo_fecha = campo_fecha
+        self.proveedor = proveedor
+        self.metricas = metricas
+        self.dano = dano
+
+    def leer(self, pk):
+        """
+        Retorna (clave, valores) del registro `pk` o None si no existe.
+        """
+        if pk is None:
+            return None
+        fila = (
+            self.modelo._default_manager.filter(pk=pk)
+            .values(self.campo_fecha, "empleado_id", *self.metricas)
+            .annotate(_proveedor=F(self.proveedor))
+            .first()
+        )
+        if fila is None:
+            return None
+        fecha = fila[self.campo_fecha]
+        clave = {
+            "fecha": timezone.localdate(fecha),
+            "turno": turno_de(fecha),
+            "empleado_id": fila["empleado_id"],
+            "proveedor_preforma": fila["_proveedor"] or "",
+        }
+        return clave, {metrica: fila[metrica] or 0 for metrica in self.metricas}
+
+
+SOPLO = DefinicionResumen(
+    modelo=ControlSoploBotellas,
+    resumen=ResumenSoploBotellas,
+    campo_fecha="fecha",
+    proveedor="proveedor_preforma",
+    metricas=["produccion_buena", "produccion_danada", "produccion_total"],
+    dano=("produccion_danada", "produccion_total"),
+)
+PRODUCCION_AGUA = DefinicionResumen(
+    modelo=ControlProduccionAgua,
+    resumen=ResumenProduccionAgua,
+    campo_fecha="fecha_produccion",
+    proveedor="control_soplado__proveedor_preforma",
+    metricas=[
+        "botellas_envasadas",
+        "botellas_malogradas",
+        "tapas_malogradas",
+        "etiquetas_malogradas",
+        "total_botella_buenas",
+        "total_paquetes",
+    ],
+    dano=("botellas_malogradas", "botellas_envasadas"),
+)
+DEFINICIONES = {
+    definicion.modelo: definicion for definicion in (SOPLO, PRODUCCION_AGUA)
+}
+
+
+def _sumar(resumen, clave, registros, deltas, inicial=None):
+    """
+    Suma los deltas al resumen `clave`. Si la fila no existe y se pasa
+    `inicial` (valores del registro), la crea con ellos.
+    """
+    cambios = {metrica: F(metrica) + delta for metrica, delta in deltas.items()}
+    cambios["registros"] = F("registros") + registros
+    if resumen.objects.filter(**clave).update(**cambios) or inicial is None:
+        return
+
+    try:
+        with transaction.atomic():
+            resumen.objects.create(registros=1, **clave, **inicial)
+    except IntegrityError:
+        # Otra escritura creó el resumen entre el UPDATE y el INSERT
+        resumen.objects.filter(**clave).update(**cambios)
+
+
+def aplicar_cambio(modelo, anterior, nuevo):
+    """
+    Mueve el aporte de un registro del resumen `anterior` al `nuevo`; cada
+    uno es el resultado de `DefinicionResumen.leer` o None.
+    """
+    definicion = DEFINICIONES[modelo]
+    resumen = definicion.resumen
+
+    if anterior and nuevo and anterior[0] == nuevo[0]:
+        clave, valores = nuevo
+        deltas = {m: valores[m] - anterior[1][m] for m in definicion.metricas}
+        if any(deltas.values()):
+            _sumar(resumen, clave, 0, deltas, inicial=valores)
+        return
+
+    if anterior:
+        clave, valores = anterior
+        _sumar(resumen, clave, -1, {m: -v for m, v in valores.items()})
+        resumen.objects.filter(registros__lte=0, **clave).delete()
+    if nuevo:
+        clave, valores = nuevo
+        _sumar(resumen, clave, 1, valores, inicial=valores)
+
+
+def mover_producciones(proveedor_anterior, ids):
+    """
+    Mueve el aporte de los controles de producción `ids` del resumen con
+    `proveedor_anterior` al de su proveedor actual.
+    """
+    for pk in ids:
+        nuevo = PRODUCCION_AGUA.leer(pk)
+        if nuevo is None or nuevo[0]["proveedor_preforma"] == proveedor_anterior:
+            continue
+        clave, valores = nuevo
+        anterior = ({**clave, "proveedor_preforma": proveedor_anterior}, valores)
+        aplicar_cambio(ControlProduccionAgua, anterior, nuevo)
+
+
+@transaction.atomic
+def reconstruir_resumenes(definicion, desde=None, hasta=None):
+    """
+    Regenera el resumen de `definicion` entre las fechas dadas (incluidas)
+    agregando los registros originales. Retorna la cantidad de filas creadas.
+    """
+    filtro_resumen = {}
+    queryset = definicion.modelo._default_manager.annotate(
+        _dia=TruncDate(definicion.campo_fecha)
+    )
+    if desde:
+        filtro_resumen["fecha__gte"] = desde
+        queryset = queryset.filter(_dia__gte=desde)
+    if hasta:
+        filtro_resumen["fecha__lte"] = hasta
+        queryset = queryset.filter(_dia__lte=hasta)
+
+    grupos = (
+        queryset.annotate(_hora=ExtractHour(definicion.campo_fecha))
+        .annotate(
+            _turno=turno_expresion("_hora"),
+            _proveedor=Coalesce(F(definicion.proveedor), Value("")),
+        )
+        .values("_dia", "_turno", "empleado_id", "_proveedor")
+        .annotate(
+            _registros=Count("id"),
+            **{f"_{m}": Sum(m) for m in definicion.metricas},
+        )
+        .order_by()
+    )
+
+    definicion.resumen.objects.filter(**filtro_resumen).delete()
+    filas = definicion.resumen.objects.bulk_create(
+        [
+            definicion.resumen(
+                fecha=grupo["_dia"],
+                turno=grupo["_turno"],
+                empleado_id=grupo["empleado_id"],
+                proveedor_preforma=grupo["_proveedor"],
+                registros=grupo["_registros"],
+                **{m: grupo[f"_{m}"] or 0 for m in definicion.metricas},
+            )
+            for grupo in grupos.iterator()
+        ],
+        batch_size=1000,
+    )
+    return len(filas)
+
+
+AGRUPACIONES = {
+    "fecha": ["fecha"],
+    "turno": ["turno"],
+    "empleado": ["empleado_id", "empleado__nombre"],
+    "proveedor": ["proveedor_preforma"],
+}
+
+
+def consultar_resumen(definicion, desde=None, hasta=None, agrupar=()):
+    """
+    Suma las métricas del resumen en el rango de fechas, agrupadas por los
+    criterios de AGRUPACIONES, y agrega la tasa de daño en porcentaje.
+    """
+    queryset = definicion.resumen.objects.all()
+    if desde:
+        queryset = queryset.filter(fecha__gte=desde)
+    if hasta:
+        queryset = queryset.filter(fecha__lte=hasta)
+
+    campos = [campo for criterio in agrupar for campo in AGRUPACIONES[criterio]]
+    metricas = ["registros", *definicion.metricas]
+    # Alias con prefijo: una anotación no puede llamarse como un campo
+    sumas = {f"_{m}": Sum(m) for m in metricas}
+    if campos:
+        filas = list(queryset.values(*campos).annotate(**sumas).order_by(*campos))
+    else:
+        filas = [queryset.aggregate(**sumas)]
+
+    danado, total = definicion.dano
+    for fila in filas:
+        for metrica in metricas:
+            fila[metrica] = fila.pop(f"_{metrica}") or 0
+        fila["tasa_dano"] = (
+            (Decimal(fila[danado]) * 100 / fila[total]).quantize(Decimal("0.01"))
+            if fila[total]
+            else None
+        )
+    return filas
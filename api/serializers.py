@@ -1,9 +1,16 @@
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+from api import reportes, stock
+from api.clientes import normalizar_telefono
+
 from .models import (
     KPI,
+    AlertaStock,
+    ArchivoAnalitico,
     Cliente,
     ControlCalidad,
     ControlProduccionAgua,
@@ -129,7 +136,7 @@ class EmpleadoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Empleado
-        fields = "__all__"
+        exclude = ["busqueda"]
         extra_kwargs = {
             "user": {
                 "read_only": True
@@ -159,7 +166,10 @@ class EmpleadoSerializer(serializers.ModelSerializer):
         """
         Retorna información del rol principal
         """
-        rol_principal = obj.empleadorol_set.filter(es_rol_principal=True).first()
+        # Se recorre en memoria para aprovechar los roles precargados
+        rol_principal = next(
+            (rol for rol in obj.empleadorol_set.all() if rol.es_rol_principal), None
+        )
         if rol_principal:
             return {"id": rol_principal.rol.id, "nombre": rol_principal.rol.nombre}
         return None
@@ -412,7 +422,11 @@ class EmpleadoDeleteSerializer(serializers.ModelSerializer):
 class ClienteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cliente
-        fields = "__all__"
+        exclude = ["busqueda"]
+
+    def validate_telefono(self, value):
+        # Mismo formato que usa clientes/resolve para buscar por teléfono
+        return normalizar_telefono(value)
 
 
 class ProductoSerializer(serializers.ModelSerializer):
@@ -420,7 +434,9 @@ class ProductoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Producto
-        fields = "__all__"
+        exclude = ["busqueda"]
+        # Suma de sus inventarios, la mantiene api.stock
+        read_only_fields = ["cantidad_actual"]
 
 
 class InventarioSerializer(serializers.ModelSerializer):
@@ -428,12 +444,91 @@ class InventarioSerializer(serializers.ModelSerializer):
         model = Inventario
         fields = "__all__"  # Incluye todos los campos del modelo
 
+    def validate_cantidad_actual(self, value):
+        if self.instance is not None and value != self.instance.cantidad_actual:
+            raise serializers.ValidationError(
+                "El stock se modifica con movimientos de inventario "
+                "o con actualizar-stock."
+            )
+        if value is not None and value < 0:
+            raise serializers.ValidationError("La cantidad no puede ser negativa.")
+        return value
+
+    @transaction.atomic
+    def create(self, validated_data):
+        # El stock inicial entra como movimiento para que el registro cuadre
+        cantidad = validated_data.pop("cantidad_actual", None) or 0
+        inventario = super().create({**validated_data, "cantidad_actual": 0})
+        if cantidad:
+            stock.registrar_movimiento(inventario, "entrada", cantidad, "Stock inicial")
+            inventario.refresh_from_db(fields=["cantidad_actual"])
+        return inventario
+
+
+class AlertaStockSerializer(serializers.ModelSerializer):
+    producto_nombre = serializers.CharField(source="producto.nombre", read_only=True)
+
+    class Meta:
+        model = AlertaStock
+        fields = "__all__"
+
+
+class AjusteStockSerializer(serializers.Serializer):
+    inventario_id = serializers.IntegerField()
+    cantidad = serializers.IntegerField(help_text="Delta con signo (+n / -n)")
+
+
+class ArchivoAnaliticoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivoAnalitico
+        exclude = ["ruta"]
+
+
+class ResolverClienteSerializer(serializers.Serializer):
+    dni = serializers.RegexField(
+        r"^\d{8}$",
+        required=False,
+        allow_null=True,
+        error_messages={"invalid": "El DNI debe contener 8 dígitos numéricos"},
+    )
+    telefono = serializers.CharField(
+        max_length=20, required=False, allow_null=True, allow_blank=True
+    )
+    nombre = serializers.CharField(max_length=100, required=False)
+    apellido_paterno = serializers.CharField(max_length=100, required=False)
+    direccion = serializers.CharField(
+        max_length=100, required=False, allow_null=True, allow_blank=True
+    )
+    latitud = serializers.DecimalField(
+        max_digits=9, decimal_places=6, required=False, allow_null=True
+    )
+    longitud = serializers.DecimalField(
+        max_digits=9, decimal_places=6, required=False, allow_null=True
+    )
+
+    def validate(self, attrs):
+        if not attrs.get("dni") and not normalizar_telefono(attrs.get("telefono")):
+            raise serializers.ValidationError("Debe proporcionar dni o telefono.")
+        return attrs
+
 
 class MovimientoInventarioSerializer(serializers.ModelSerializer):
     class Meta:
         model = MovimientoInventario
         fields = "__all__"
 
+    def validate(self, attrs):
+        if attrs["tipo_movimiento"] == "ajuste":
+            if not attrs["cantidad"]:
+                raise serializers.ValidationError(
+                    {"cantidad": "Un ajuste no puede ser cero."}
+                )
+        elif attrs["cantidad"] <= 0:
+            raise serializers.ValidationError(
+                {"cantidad": "Debe ser mayor que cero; use un ajuste para corregir."}
+            )
+        return attrs
+
 
 class DetallePedidoSerializer(serializers.ModelSerializer):
     class Meta:
@@ -498,9 +593,57 @@ class KPISerializer(serializers.ModelSerializer):
     class Meta:
         model = KPI
         fields = "__all__"
+        # Los acumuladores los mantiene api.kpis
+        read_only_fields = ["numerador", "denominador", "periodo"]
 
 
 class ReporteSerializer(serializers.ModelSerializer):
+    """
+    Solo metadatos: el contenido se descarga en reportes/<id>/contenido/.
+    `datos_reporte` se acepta para reportes cargados a mano; solo los tipos
+    de api.reportes.REPORTES se encolan para generarse.
+    """
+
     class Meta:
         model = Reporte
-        fields = "__all__"
+        exclude = ["contenido"]
+        read_only_fields = [
+            "estado",
+            "tamano_comprimido",
+            "tamano_original",
+            "filas",
+            "intentos",
+            "proximo_intento",
+            "fecha_generacion",
+            "ultimo_error",
+        ]
+        extra_kwargs = {"datos_reporte": {"write_only": True}}
+
+    def validate(self, attrs):
+        if attrs.get("datos_reporte") is not None:
+            attrs["estado"] = "listo"
+            return attrs
+
+        if self.instance is None or {"tipo_reporte", "parametros"} & set(attrs):
+            tipo = attrs.get(
+                "tipo_reporte", getattr(self.instance, "tipo_reporte", None)
+            )
+            if tipo not in reportes.REPORTES:
+                # Tipos sin generador se guardan como antes, sin encolar nada
+                attrs["estado"] = "listo"
+                return attrs
+            parametros = attrs.get(
+                "parametros", getattr(self.instance, "parametros", None) or {}
+            )
+            try:
+                attrs["parametros"] = reportes.validar_parametros(tipo, parametros)
+            except ValueError as e:
+                raise serializers.ValidationError({"parametros": str(e)})
+            # Se encola (o re-encola) la generación con los nuevos parámetros
+            attrs.update(
+                estado="pendiente",
+                intentos=0,
+                proximo_intento=timezone.now(),
+                contenido=None,
+            )
+        return attrs
@@ -1,36 +1,47 @@
 # services/google_maps.py
 
-from datetime import datetime, timedelta, timezone
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-import googlemaps
 from django.conf import settings
-from django.db import transaction
+from django.db import IntegrityError, connection, transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
-from api.models import Distribucion, Empleado, Pedido
+from api import tiempo_viaje
+from api.despacho import repartidor_menos_ocupado
+from api.models import Distribucion, Pedido
 
+logger = logging.getLogger(__name__)
 
-def calcular_tiempo_viaje(destino):
-    gmaps = googlemaps.Client(key=settings.GOOGLE_MAPS_API_KEY)
-    origen = settings.STORE_ADDRESS
-    now = datetime.now()
+_executor = None
+_executor_lock = threading.Lock()
 
-    directions_result = gmaps.directions(
-        origin=origen, destination=destino, mode="driving", departure_time=now
-    )
-
-    if not directions_result:
-        return None
 
-    duration_seconds = directions_result[0]["legs"][0]["duration"][
-        "value"
-    ]  # Duración en segundos
-    duration = timedelta(seconds=duration_seconds)
-    return duration
+def calcular_tiempo_viaje(destino, coordenadas=None):
+    return tiempo_viaje.calcular_tiempo_viaje(destino, coordenadas=coordenadas)
 
 
 def crear_distribucion(pedido_id, direccion_cliente, cantidad_paquetes):
-    pedido = get_object_or_404(Pedido, id=pedido_id, estado_pedido="confirmado")
+    """
+    Crea la distribución de un pedido confirmado. Es idempotente: si el
+    pedido ya tiene una distribución con su clave, se retorna la existente,
+    por lo que la tarea puede reintentarse sin duplicar envíos.
+    """
+    pedido = get_object_or_404(
+        Pedido.objects.select_related("cliente"),
+        id=pedido_id,
+        estado_pedido="confirmado",
+    )
+    clave_idempotencia = f"pedido-{pedido.id}"
+
+    existente = Distribucion.objects.filter(
+        clave_idempotencia=clave_idempotencia
+    ).first()
+    if existente:
+        return {"success": True, "data": existente}
 
     try:
         cantidad = int(cantidad_paquetes)
@@ -43,38 +54,61 @@ def crear_distribucion(pedido_id, direccion_cliente, cantidad_paquetes):
         hora_confirmacion = timezone.now()  # Usar timezone-aware
         fecha_salida = hora_confirmacion + diferencia_departure
 
-        # Calcular tiempo de viaje usando Directions API
-        tiempo_viaje = calcular_tiempo_viaje(direccion_cliente)
-        if not tiempo_viaje:
+        # Calcular tiempo de viaje (cacheado por dirección)
+        cliente = pedido.cliente
+        coordenadas = (
+            (cliente.latitud, cliente.longitud)
+            if cliente.latitud is not None and cliente.longitud is not None
+            else None
+        )
+        duracion_viaje = calcular_tiempo_viaje(direccion_cliente, coordenadas)
+        if not duracion_viaje:
             return {
                 "success": False,
                 "error": "No se pudo calcular el tiempo de viaje.",
             }
 
-        fecha_entrega_estimada = fecha_salida + tiempo_viaje
+        fecha_entrega_estimada = fecha_salida + duracion_viaje
 
-        # Asignar un empleado disponible
-        empleado = Empleado.objects.filter(disponible=True).first()
+        # Empleado no tiene un campo de disponibilidad: se asigna el
+        # repartidor activo con menos distribuciones en ruta
+        empleado = repartidor_menos_ocupado()
         if not empleado:
             return {
                 "success": False,
-                "error": "No hay empleados disponibles para la distribución.",
+                "error": "No hay repartidores activos para la distribución.",
             }
 
         with transaction.atomic():
+            # Mismo bloqueo que toma planificar_despacho: si el planificador
+            # tiene el pedido, se espera su commit y se usa su distribución
+            list(
+                Pedido.objects.select_for_update()
+                .filter(pk=pedido.pk)
+                .values_list("id", flat=True)
+            )
+            existente = Distribucion.objects.filter(
+                clave_idempotencia=clave_idempotencia
+            ).first()
+            if existente:
+                return {"success": True, "data": existente}
             distribucion = Distribucion.objects.create(
                 pedido=pedido,
                 fecha_salida=fecha_salida,
                 fecha_entrega=fecha_entrega_estimada,
                 estado="en ruta",
                 empleado=empleado,
+                clave_idempotencia=clave_idempotencia,
             )
 
-            empleado.disponible = False  # Marcar como no disponible
-            empleado.save()
-
         return {"success": True, "data": distribucion}
 
+    except IntegrityError:
+        # Otro intento concurrente ya creó la distribución
+        return {
+            "success": True,
+            "data": Distribucion.objects.get(clave_idempotencia=clave_idempotencia),
+        }
     except ValueError:
         return {
             "success": False,
@@ -82,3 +116,57 @@ def crear_distribucion(pedido_id, direccion_cliente, cantidad_paquetes):
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
+
+
+def _obtener_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.DISTRIBUCION_WORKERS,
+                    thread_name_prefix="distribucion",
+                )
+    return _executor
+
+
+def _crear_distribucion_registrando(pedido_id, direccion_cliente, cantidad_paquetes):
+    try:
+        resultado = crear_distribucion(pedido_id, direccion_cliente, cantidad_paquetes)
+        if not resultado["success"]:
+            logger.warning(
+                "No se pudo crear la distribución del pedido %s: %s",
+                pedido_id,
+                resultado["error"],
+            )
+    except Exception:
+        logger.exception("Error al crear la distribución del pedido %s", pedido_id)
+
+
+def _crear_distribucion_en_segundo_plano(
+    pedido_id, direccion_cliente, cantidad_paquetes
+):
+    try:
+        _crear_distribucion_registrando(pedido_id, direccion_cliente, cantidad_paquetes)
+    finally:
+        # El hilo no pasa por el ciclo de request/response de Django
+        connection.close()
+
+
+def programar_distribucion(pedido_id, direccion_cliente, cantidad_paquetes):
+    """
+    Crea la distribución fuera de la petición, en un hilo del proceso.
+    Debe llamarse con transaction.on_commit para que el pedido confirmado
+    ya sea visible. Los pedidos que queden sin distribución se recuperan
+    con el comando `reintentar_distribuciones`.
+    """
+    if not settings.DISTRIBUCION_ASINCRONA:
+        # En el hilo de la petición: su conexión la cierra Django
+        _crear_distribucion_registrando(pedido_id, direccion_cliente, cantidad_paquetes)
+        return
+    _obtener_executor().submit(
+        _crear_distribucion_en_segundo_plano,
+        pedido_id,
+        direccion_cliente,
+        cantidad_paquetes,
+    )
@@ -1,7 +1,22 @@
+from functools import partial
+
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
+from api import busqueda, kpis, resumenes, trazabilidad
+from api.cache import invalidar_catalogo
+from api.clientes import invalidar_clientes
+from api.models import (
+    Cliente,
+    ControlProduccionAgua,
+    ControlSoploBotellas,
+    Empleado,
+    Inventario,
+    Producto,
+)
+
 
 @receiver(post_save, sender=User)
 def update_empleado_email(sender, instance, **kwargs):
@@ -9,3 +24,136 @@ def update_empleado_email(sender, instance, **kwargs):
         empleado = instance.empleado
         empleado.email = instance.email
         empleado.save()
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Inventario)
+@receiver(post_delete, sender=Inventario)
+def invalidar_catalogo_productos(sender, instance, **kwargs):
+    # Se invalida al confirmar la transacción para no cachear datos sin commit
+    transaction.on_commit(invalidar_catalogo)
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Empleado)
+@receiver(post_delete, sender=Empleado)
+def invalidar_indice_busqueda(sender, instance, **kwargs):
+    # Solo afecta al índice en memoria (SQLite); en PostgreSQL no hay nada
+    transaction.on_commit(partial(busqueda.invalidar_indice, sender))
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+def invalidar_cache_clientes(sender, instance, **kwargs):
+    transaction.on_commit(invalidar_clientes)
+
+
+@receiver(post_save, sender=Inventario)
+def vincular_lote_inventario(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    trazabilidad.vincular_inventario(instance)
+
+
+@receiver(post_save, sender=ControlProduccionAgua)
+def renombrar_lote_trazabilidad(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    trazabilidad.renombrar_lote(instance)
+
+
+def guardar_contribucion_kpi(sender, instance, **kwargs):
+    # Contribución de la fila antes del cambio, para aplicar solo el delta
+    if kwargs.get("raw"):
+        return
+    instance._kpi_anteriores = kpis.leer_contribuciones(sender, instance.pk)
+
+
+def actualizar_kpis_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anteriores = None if created else getattr(instance, "_kpi_anteriores", None)
+    kpis.aplicar_deltas(
+        sender, anteriores, kpis.leer_contribuciones(sender, instance.pk)
+    )
+
+
+def actualizar_kpis_eliminado(sender, instance, **kwargs):
+    kpis.aplicar_deltas(sender, getattr(instance, "_kpi_anteriores", None), None)
+
+
+for modelo in kpis.modelos_fuente():
+    pre_save.connect(guardar_contribucion_kpi, sender=modelo)
+    pre_delete.connect(guardar_contribucion_kpi, sender=modelo)
+    post_save.connect(actualizar_kpis_guardado, sender=modelo)
+    post_delete.connect(actualizar_kpis_eliminado, sender=modelo)
+
+
+def guardar_resumen_anterior(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    definicion = resumenes.DEFINICIONES[sender]
+    instance._resumen_anterior = definicion.leer(instance.pk)
+
+
+def actualizar_resumen_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    definicion = resumenes.DEFINICIONES[sender]
+    resumenes.aplicar_cambio(
+        sender,
+        getattr(instance, "_resumen_anterior", None),
+        definicion.leer(instance.pk),
+    )
+
+
+def actualizar_resumen_eliminado(sender, instance, **kwargs):
+    resumenes.aplicar_cambio(sender, getattr(instance, "_resumen_anterior", None), None)
+
+
+for modelo in resumenes.DEFINICIONES:
+    pre_save.connect(guardar_resumen_anterior, sender=modelo)
+    pre_delete.connect(guardar_resumen_anterior, sender=modelo)
+    post_save.connect(actualizar_resumen_guardado, sender=modelo)
+    post_delete.connect(actualizar_resumen_eliminado, sender=modelo)
+
+
+def _proveedor_anterior(instance):
+    anterior = getattr(instance, "_resumen_anterior", None)
+    return anterior[0]["proveedor_preforma"] if anterior else None
+
+
+@receiver(pre_delete, sender=ControlSoploBotellas)
+def guardar_producciones_del_soplado(sender, instance, **kwargs):
+    # Después del SET_NULL ya no se pueden encontrar por control_soplado
+    instance._producciones = list(
+        ControlProduccionAgua.objects.filter(control_soplado=instance).values_list(
+            "id", flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=ControlSoploBotellas)
+def mover_producciones_guardado(sender, instance, created, raw=False, **kwargs):
+    proveedor = _proveedor_anterior(instance)
+    if raw or created or proveedor is None:
+        return
+    if proveedor == (instance.proveedor_preforma or ""):
+        return
+    resumenes.mover_producciones(
+        proveedor,
+        ControlProduccionAgua.objects.filter(control_soplado=instance).values_list(
+            "id", flat=True
+        ),
+    )
+
+
+@receiver(post_delete, sender=ControlSoploBotellas)
+def mover_producciones_eliminado(sender, instance, **kwargs):
+    proveedor = _proveedor_anterior(instance)
+    if proveedor is not None:
+        resumenes.mover_producciones(proveedor, getattr(instance, "_producciones", []))
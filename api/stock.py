@@ -0,0 +1,579 @@
+"""
+Movimientos de stock.
+
+MovimientoInventario es un registro de solo inserción y la fuente de verdad
+del stock: cada cambio aplica un UPDATE ... F() sobre Inventario (y su
+reflejo en Producto) e inserta el movimiento en la misma transacción.
+`cantidad_actual` es el saldo materializado para leer el stock en O(1);
+`tomar_snapshots` guarda saldos periódicos y `conciliar_stock` reproduce los
+movimientos desde el último snapshot para detectar diferencias.
+"""
+
+from collections import OrderedDict
+
+from django.db import connection, transaction
+from django.db.models import (
+    Case,
+    F,
+    IntegerField,
+    Max,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api.alertas import registrar_cruces
+from api.cache import invalidar_catalogo
+from api.models import (
+    DetallePedido,
+    Inventario,
+    MovimientoInventario,
+    Producto,
+    SnapshotInventario,
+)
+from api.trazabilidad import registrar_movimientos
+
+# Efecto de cada tipo de movimiento sobre el stock; los ajustes llevan su signo
+SIGNO_MOVIMIENTO = {"entrada": 1, "salida": -1, "ajuste": 1}
+
+
+class StockInsuficienteError(ValueError):
+    """
+    Se lanza cuando uno o más productos no tienen stock suficiente.
+    `faltantes` contiene el detalle por producto para reportarlo al cliente.
+    """
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        nombres = ", ".join(faltante["producto"] for faltante in faltantes)
+        super().__init__(f"Stock insuficiente para {nombres}")
+
+
+def cantidad_con_signo(prefijo=""):
+    """
+    Expresión SQL con el efecto de un movimiento sobre el stock.
+    `prefijo` permite usarla desde otra tabla (p. ej. "movimientoinventario__").
+    """
+    return Case(
+        *(
+            When(
+                **{f"{prefijo}tipo_movimiento": tipo},
+                then=F(f"{prefijo}cantidad") * signo,
+            )
+            for tipo, signo in SIGNO_MOVIMIENTO.items()
+        ),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _sumar_a_productos(deltas):
+    """
+    Refleja en Producto.cantidad_actual los deltas {producto_id: delta}
+    con un solo UPDATE.
+    """
+    deltas = {producto_id: delta for producto_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    delta = Case(
+        *[When(id=producto_id, then=Value(d)) for producto_id, d in deltas.items()],
+        output_field=IntegerField(),
+    )
+    Producto.objects.filter(id__in=deltas.keys()).update(
+        cantidad_actual=Coalesce(F("cantidad_actual"), 0) + delta
+    )
+
+
+def _cantidades_por_producto(detalles):
+    """
+    Agrupa las cantidades solicitadas por producto conservando el orden
+    en que aparecen en el pedido.
+    """
+    cantidades = OrderedDict()
+    for detalle in detalles:
+        cantidades.setdefault(detalle.producto_id, [detalle.producto, 0])
+        cantidades[detalle.producto_id][1] += detalle.cantidad
+    return cantidades
+
+
+def reservar_stock(detalles, motivo, documento_referencia=None, empleado=None):
+    """
+    Descuenta del inventario las cantidades de los detalles de un pedido.
+
+    Bloquea todas las filas de inventario afectadas en una sola consulta
+    ordenada por id (evita deadlocks entre pedidos concurrentes), aplica un
+    único UPDATE condicional y registra los movimientos con bulk_create.
+    Debe llamarse dentro de una transacción.
+
+    :param detalles: Detalles del pedido (con `producto` ya cargado)
+    :param motivo: Motivo que se guarda en cada MovimientoInventario
+    :param documento_referencia: Referencia del documento que origina la salida
+    :param empleado: Empleado responsable (opcional para operaciones del sistema)
+    :return: Lista de MovimientoInventario creados
+    :raises StockInsuficienteError: Si algún producto no tiene stock suficiente
+    """
+    cantidades = _cantidades_por_producto(detalles)
+    if not cantidades:
+        return []
+
+    inventarios = (
+        Inventario.objects.select_for_update()
+        .filter(producto_id__in=cantidades.keys())
+        .order_by("id")
+    )
+
+    # Se usa el primer inventario de cada producto, igual que el flujo original
+    inventario_por_producto = {}
+    for inventario in inventarios:
+        inventario_por_producto.setdefault(inventario.producto_id, inventario)
+
+    faltantes = []
+    for producto_id, (producto, cantidad) in cantidades.items():
+        inventario = inventario_por_producto.get(producto_id)
+        disponible = (inventario.cantidad_actual or 0) if inventario else 0
+        if disponible < cantidad:
+            faltantes.append(
+                {
+                    "producto_id": producto_id,
+                    "producto": producto.nombre,
+                    "solicitado": cantidad,
+                    "disponible": disponible,
+                }
+            )
+
+    if faltantes:
+        raise StockInsuficienteError(faltantes)
+
+    descuentos = {
+        inventario_por_producto[producto_id].id: cantidad
+        for producto_id, (_, cantidad) in cantidades.items()
+    }
+    descuento = Case(
+        *[
+            When(id=inv_id, then=Value(cantidad))
+            for inv_id, cantidad in descuentos.items()
+        ],
+        output_field=IntegerField(),
+    )
+    ahora = timezone.now()
+
+    actualizados = Inventario.objects.filter(
+        id__in=descuentos.keys(), cantidad_actual__gte=descuento
+    ).update(
+        cantidad_actual=F("cantidad_actual") - descuento, fecha_actualizacion=ahora
+    )
+
+    if actualizados != len(descuentos):
+        # Solo ocurre si el stock cambió sin pasar por el bloqueo
+        raise StockInsuficienteError(
+            [
+                {
+                    "producto_id": producto_id,
+                    "producto": producto.nombre,
+                    "solicitado": cantidad,
+                    "disponible": None,
+                }
+                for producto_id, (producto, cantidad) in cantidades.items()
+            ]
+        )
+
+    _sumar_a_productos(
+        {producto_id: -cantidad for producto_id, (_, cantidad) in cantidades.items()}
+    )
+    cambios = []
+    for producto_id, (_, cantidad) in cantidades.items():
+        inventario = inventario_por_producto[producto_id]
+        cambios.append(
+            {
+                "inventario_id": inventario.id,
+                "producto_id": producto_id,
+                "anterior": inventario.cantidad_actual,
+                "nueva": inventario.cantidad_actual - cantidad,
+                "punto_reorden": inventario.punto_reorden,
+                "stock_minimo": inventario.stock_minimo,
+            }
+        )
+    registrar_cruces(cambios)
+
+    # update() no emite post_save: se invalida el catálogo explícitamente
+    transaction.on_commit(invalidar_catalogo)
+
+    movimientos = MovimientoInventario.objects.bulk_create(
+        [
+            MovimientoInventario(
+                inventario_id=inv_id,
+                fecha_movimiento=ahora,
+                tipo_movimiento="salida",
+                cantidad=cantidad,
+                motivo_movimiento=motivo,
+                empleado=empleado,
+                documento_referencia=documento_referencia,
+            )
+            for inv_id, cantidad in descuentos.items()
+        ]
+    )
+    registrar_movimientos(
+        movimientos,
+        {
+            inventario.id: {
+                "producto_id": inventario.producto_id,
+                "control_produccion_id": inventario.control_produccion_id,
+            }
+            for inventario in inventario_por_producto.values()
+        },
+    )
+    return movimientos
+
+
+def reservar_stock_pedido(pedido, empleado=None):
+    """
+    Reserva el stock de todos los detalles de un pedido.
+
+    :return: Tupla (detalles del pedido, movimientos creados)
+    """
+    detalles = list(
+        DetallePedido.objects.filter(pedido=pedido).select_related("producto")
+    )
+    with transaction.atomic():
+        movimientos = reservar_stock(
+            detalles,
+            motivo=f"Salida por confirmación del pedido {pedido.id}",
+            documento_referencia=f"PEDIDO-{pedido.id}",
+            empleado=empleado,
+        )
+    return detalles, movimientos
+
+
+def _aplicar_deltas(deltas, permitir_negativo=False):
+    """
+    Suma {inventario_id: delta} a los saldos con un solo
+    UPDATE ... SET cantidad_actual = cantidad_actual + delta ... RETURNING,
+    sin leer las filas antes. Si `permitir_negativo` es False, las filas que
+    quedarían en negativo no se actualizan.
+
+    :return: {inventario_id: fila} de las filas actualizadas, con
+        producto_id, la nueva cantidad, los umbrales de alerta y el lote
+    """
+    caso = "CASE id %s END" % " ".join(["WHEN %s THEN %s"] * len(deltas))
+    parametros_caso = [valor for par in deltas.items() for valor in par]
+    nuevo = f"COALESCE(cantidad_actual, 0) + {caso}"
+    sql = (
+        f"UPDATE {connection.ops.quote_name(Inventario._meta.db_table)} "
+        f"SET cantidad_actual = {nuevo}, fecha_actualizacion = %s "
+        f"WHERE id IN ({', '.join(['%s'] * len(deltas))})"
+    )
+    parametros = [
+        *parametros_caso,
+        connection.ops.adapt_datetimefield_value(timezone.now()),
+        *deltas,
+    ]
+    if not permitir_negativo:
+        sql += f" AND {nuevo} >= 0"
+        parametros += parametros_caso
+    columnas = [
+        "producto_id",
+        "cantidad_actual",
+        "punto_reorden",
+        "stock_minimo",
+        "control_produccion_id",
+    ]
+    sql += f" RETURNING id, {', '.join(columnas)}"
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return {fila[0]: dict(zip(columnas, fila[1:])) for fila in cursor.fetchall()}
+
+
+def _registrar_alertas(deltas, saldos):
+    registrar_cruces(
+        {
+            "inventario_id": inventario_id,
+            "producto_id": fila["producto_id"],
+            "anterior": fila["cantidad_actual"] - deltas[inventario_id],
+            "nueva": fila["cantidad_actual"],
+            "punto_reorden": fila["punto_reorden"],
+            "stock_minimo": fila["stock_minimo"],
+        }
+        for inventario_id, fila in saldos.items()
+    )
+
+
+def _faltantes(deltas, saldos):
+    """
+    Detalle para StockInsuficienteError de los inventarios que no se
+    actualizaron. Lanza Inventario.DoesNotExist si alguno no existe.
+    """
+    pendientes = [
+        inventario_id for inventario_id in deltas if inventario_id not in saldos
+    ]
+    filas = {
+        fila["id"]: fila
+        for fila in Inventario.objects.filter(id__in=pendientes).values(
+            "id", "producto_id", "producto__nombre", "cantidad_actual"
+        )
+    }
+    inexistentes = set(pendientes) - set(filas)
+    if inexistentes:
+        raise Inventario.DoesNotExist(
+            f"No existen los inventarios {', '.join(map(str, sorted(inexistentes)))}"
+        )
+    return [
+        {
+            "inventario_id": inventario_id,
+            "producto_id": filas[inventario_id]["producto_id"],
+            "producto": filas[inventario_id]["producto__nombre"],
+            "solicitado": -deltas[inventario_id],
+            "disponible": filas[inventario_id]["cantidad_actual"],
+        }
+        for inventario_id in pendientes
+    ]
+
+
+def ajustar_stock(
+    ajustes, motivo, empleado=None, documento_referencia=None, permitir_negativo=False
+):
+    """
+    Aplica ajustes +n/-n a uno o varios inventarios en una transacción: un
+    UPDATE con RETURNING para los saldos, uno para Producto y un bulk_create
+    de los movimientos de ajuste.
+
+    :param ajustes: Pares (inventario_id, delta); los ids repetidos se suman
+    :return: {inventario_id: nueva cantidad}
+    :raises StockInsuficienteError: Si algún saldo quedaría negativo (no se
+        aplica ningún ajuste)
+    :raises Inventario.DoesNotExist: Si algún inventario no existe
+    """
+    deltas = {}
+    for inventario_id, delta in ajustes:
+        deltas[inventario_id] = deltas.get(inventario_id, 0) + delta
+    deltas = {inventario_id: d for inventario_id, d in sorted(deltas.items()) if d}
+    if not deltas:
+        return {}
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        saldos = _aplicar_deltas(deltas, permitir_negativo)
+        if len(saldos) != len(deltas):
+            # La excepción revierte las filas que sí se actualizaron
+            raise StockInsuficienteError(_faltantes(deltas, saldos))
+
+        por_producto = {}
+        for inventario_id, fila in saldos.items():
+            producto_id = fila["producto_id"]
+            por_producto[producto_id] = (
+                por_producto.get(producto_id, 0) + deltas[inventario_id]
+            )
+        _sumar_a_productos(por_producto)
+        _registrar_alertas(deltas, saldos)
+        movimientos = MovimientoInventario.objects.bulk_create(
+            [
+                MovimientoInventario(
+                    inventario_id=inventario_id,
+                    fecha_movimiento=ahora,
+                    tipo_movimiento="ajuste",
+                    cantidad=delta,
+                    motivo_movimiento=motivo,
+                    empleado=empleado,
+                    documento_referencia=documento_referencia,
+                )
+                for inventario_id, delta in deltas.items()
+            ]
+        )
+        registrar_movimientos(movimientos, saldos)
+        transaction.on_commit(invalidar_catalogo)
+    return {
+        inventario_id: fila["cantidad_actual"] for inventario_id, fila in saldos.items()
+    }
+
+
+def registrar_movimiento(
+    inventario,
+    tipo_movimiento,
+    cantidad,
+    motivo,
+    empleado=None,
+    documento_referencia=None,
+    fecha=None,
+    permitir_negativo=False,
+):
+    """
+    Aplica un movimiento de stock con un UPDATE ... RETURNING y lo inserta en
+    el registro de movimientos dentro de la misma transacción.
+
+    :param cantidad: Positiva para entradas y salidas; con signo para ajustes
+    :param permitir_negativo: Si es False, una salida que deje el stock
+        negativo no se aplica
+    :return: MovimientoInventario creado
+    :raises StockInsuficienteError: Si no hay stock suficiente
+    """
+    deltas = {inventario.id: SIGNO_MOVIMIENTO[tipo_movimiento] * cantidad}
+
+    with transaction.atomic():
+        saldos = _aplicar_deltas(deltas, permitir_negativo)
+        if not saldos:
+            raise StockInsuficienteError(_faltantes(deltas, saldos))
+        _sumar_a_productos({inventario.producto_id: deltas[inventario.id]})
+        _registrar_alertas(deltas, saldos)
+        movimiento = MovimientoInventario.objects.create(
+            inventario_id=inventario.id,
+            fecha_movimiento=fecha or timezone.now(),
+            tipo_movimiento=tipo_movimiento,
+            cantidad=cantidad,
+            motivo_movimiento=motivo,
+            empleado=empleado,
+            documento_referencia=documento_referencia,
+        )
+        registrar_movimientos([movimiento], saldos)
+        transaction.on_commit(invalidar_catalogo)
+    return movimiento
+
+
+def fijar_stock(inventario_id, cantidad, motivo, empleado=None):
+    """
+    Registra un conteo físico: bloquea el inventario y guarda un ajuste por
+    la diferencia con el saldo actual.
+
+    :return: MovimientoInventario creado o None si no hubo diferencia
+    """
+    with transaction.atomic():
+        inventario = Inventario.objects.select_for_update().get(id=inventario_id)
+        delta = cantidad - (inventario.cantidad_actual or 0)
+        if not delta:
+            return None
+        return registrar_movimiento(
+            inventario,
+            "ajuste",
+            delta,
+            motivo,
+            empleado=empleado,
+            permitir_negativo=True,
+        )
+
+
+def tomar_snapshots(bloque=500):
+    """
+    Guarda para cada inventario el saldo que resulta de sus movimientos junto
+    con el último movimiento incluido. Cada bloque bloquea sus filas de
+    inventario, así ningún movimiento en curso queda fuera del saldo.
+
+    :return: Cantidad de snapshots creados
+    """
+    ids = list(Inventario.objects.order_by("id").values_list("id", flat=True))
+    creados = 0
+    for inicio in range(0, len(ids), bloque):
+        grupo = ids[inicio : inicio + bloque]
+        with transaction.atomic():
+            list(
+                Inventario.objects.select_for_update()
+                .filter(id__in=grupo)
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            saldos = _saldos_esperados().filter(id__in=grupo).values_list(
+                "id", "_esperado"
+            )
+            ultimos = dict(
+                MovimientoInventario.objects.filter(inventario_id__in=grupo)
+                .values("inventario_id")
+                .annotate(ultimo=Max("id"))
+                .values_list("inventario_id", "ultimo")
+                .order_by()
+            )
+            ahora = timezone.now()
+            creados += len(
+                SnapshotInventario.objects.bulk_create(
+                    [
+                        SnapshotInventario(
+                            inventario_id=inventario_id,
+                            cantidad=cantidad,
+                            ultimo_movimiento=ultimos.get(inventario_id, 0),
+                            fecha=ahora,
+                        )
+                        for inventario_id, cantidad in saldos
+                    ]
+                )
+            )
+    return creados
+
+
+def _saldos_esperados():
+    """
+    Inventarios anotados con el saldo que resulta de su último snapshot más
+    los movimientos posteriores, calculado en una sola consulta.
+    """
+    ultimo_snapshot = SnapshotInventario.objects.filter(
+        inventario=OuterRef("pk")
+    ).order_by("-id")
+    movimientos = (
+        MovimientoInventario.objects.filter(
+            inventario=OuterRef("pk"), id__gt=OuterRef("_ultimo_movimiento")
+        )
+        .values("inventario")
+        .annotate(total=Sum(cantidad_con_signo()))
+        .values("total")
+    )
+    return (
+        Inventario.objects.annotate(
+            _base=Coalesce(Subquery(ultimo_snapshot.values("cantidad")[:1]), 0),
+            _ultimo_movimiento=Coalesce(
+                Subquery(ultimo_snapshot.values("ultimo_movimiento")[:1]), 0
+            ),
+        )
+        .annotate(
+            _esperado=F("_base")
+            + Coalesce(Subquery(movimientos, output_field=IntegerField()), 0),
+            _actual=Coalesce(F("cantidad_actual"), 0),
+        )
+        .order_by("id")
+    )
+
+
+def _sin_cambios(fila):
+    filtro = Q(cantidad_actual=fila["_actual"])
+    if fila["_actual"] == 0:
+        filtro |= Q(cantidad_actual__isnull=True)
+    return filtro
+
+
+def conciliar_stock(corregir=False):
+    """
+    Compara el saldo materializado de cada inventario con el que resulta de
+    reproducir los movimientos desde su último snapshot, y el stock de cada
+    producto con la suma de sus inventarios.
+
+    :param corregir: Reemplaza los saldos con diferencias por los esperados
+    :return: Tupla (diferencias de inventario, diferencias de producto)
+    """
+    diferencias = list(
+        _saldos_esperados()
+        .exclude(_actual=F("_esperado"))
+        .values("id", "producto_id", "_actual", "_esperado")
+    )
+    productos = list(
+        Producto.objects.annotate(
+            _actual=Coalesce(F("cantidad_actual"), 0),
+            _esperado=Coalesce(Sum("inventario__cantidad_actual"), 0),
+        )
+        .filter(~Q(_actual=F("_esperado")))
+        .values("id", "_actual", "_esperado")
+        .order_by("id")
+    )
+
+    if corregir:
+        with transaction.atomic():
+            # Condicional: no pisa un movimiento aplicado después de leer
+            for fila in diferencias:
+                Inventario.objects.filter(_sin_cambios(fila), id=fila["id"]).update(
+                    cantidad_actual=fila["_esperado"]
+                )
+            for fila in productos:
+                Producto.objects.filter(_sin_cambios(fila), id=fila["id"]).update(
+                    cantidad_actual=fila["_esperado"]
+                )
+        transaction.on_commit(invalidar_catalogo)
+    return diferencias, productos
@@ -0,0 +1,44 @@
+"""
+Contenido por partes para StreamingHttpResponse bajo ASGI.
+
+Con uvicorn, Django lee por completo un iterador síncrono antes de enviar
+el primer byte, lo que anula el streaming con memoria acotada. `iterar_async`
+recorre el generador síncrono (que puede usar el ORM y cursores del lado del
+servidor) en el hilo de la petición y entrega bloques de hasta
+BLOQUE_ASYNC bytes a medida que se generan. Con WSGI (runserver, pruebas)
+Django consume el iterador asíncrono completo antes de responder; el proceso
+web de producción corre con uvicorn (Procfile).
+"""
+
+from asgiref.sync import sync_to_async
+
+BLOQUE_ASYNC = 64 * 1024
+
+
+def _leer_bloque(iterador, tamano):
+    """
+    Junta partes del iterador hasta `tamano` bytes; b"" al terminar.
+    """
+    bloque = bytearray()
+    for parte in iterador:
+        bloque += parte.encode() if isinstance(parte, str) else parte
+        if len(bloque) >= tamano:
+            break
+    return bytes(bloque)
+
+
+async def iterar_async(partes, tamano=BLOQUE_ASYNC):
+    """
+    Iterador asíncrono sobre `partes` (bytes o str) para StreamingHttpResponse.
+    Cada bloque se lee con un solo salto al hilo de la petición.
+    """
+    iterador = iter(partes)
+    leer = sync_to_async(_leer_bloque)
+    try:
+        while bloque := await leer(iterador, tamano):
+            yield bloque
+    finally:
+        # Si el cliente se desconecta, el generador libera su cursor
+        cerrar = getattr(iterador, "close", None)
+        if cerrar is not None:
+            await sync_to_async(cerrar)()
@@ -1,3 +1,1233 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import (
+    AsyncRequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api import (
+    async_views,
+    busqueda,
+    correo,
+    kpis,
+    reportes,
+    resumenes,
+    tiempo_viaje,
+)
+from api.clientes import invalidar_clientes, resolver_cliente
+from api.despacho import planificar_despacho
+from api.management.commands._bench import crear_empleado, crear_pedido, crear_productos
+from api.management.commands.bench_empleados import crear_empleados
+from api.models import (
+    KPI,
+    AsignacionRuta,
+    Cliente,
+    ClienteCluster,
+    ClusterGeografico,
+    ControlProduccionAgua,
+    ControlSoploBotellas,
+    CorreoSaliente,
+    CustomUser,
+    DetallePedido,
+    Distribucion,
+    Inventario,
+    MovimientoInventario,
+    Pedido,
+    Producto,
+    Reporte,
+    ResumenProduccionAgua,
+    Ruta,
+)
+from api.pedidos import (
+    PedidoInvalidoError,
+    confirmar_pedido,
+    crear_pedido_temporal,
+)
+from api.service import crear_distribucion
+from api.stock import (
+    StockInsuficienteError,
+    _aplicar_deltas,
+    ajustar_stock,
+    reservar_stock,
+)
+from api.views import (
+    ControlProduccionAguaViewSet,
+    DistribucionViewSet,
+    EmpleadoViewSet,
+    InventarioViewSet,
+    PedidoViewSet,
+    ProductoViewSet,
+    ReporteViewSet,
+)
+
+
+def contar_consultas(funcion):
+    with CaptureQueriesContext(connection) as contexto:
+        funcion()
+    return len(contexto.captured_queries)
+
+
+def items_de(productos):
+    return [{"producto_id": producto.id, "cantidad": 1} for producto in productos]
+
+
+class CrearPedidoTemporalTests(TestCase):
+    """
+    create-temp debe usar las mismas consultas con 1 item que con muchos.
+    """
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            nombre="Cliente", apellido_paterno="Test", direccion="Av. 123"
+        )
+        self.uno = crear_productos(1)
+        self.varios = crear_productos(20)
+
+    def test_consultas_constantes(self):
+        # La primera llamada calienta caches del proceso (content types, etc.)
+        crear_pedido_temporal(self.cliente, items_de(self.uno))
+        consultas = contar_consultas(
+            lambda: crear_pedido_temporal(self.cliente, items_de(self.uno))
+        )
+        with self.assertNumQueries(consultas):
+            crear_pedido_temporal(self.cliente, items_de(self.varios))
+
+    def test_consultas_constantes_vista(self):
+        vista = PedidoViewSet.as_view({"post": "create_temp"})
+        factory = APIRequestFactory()
+
+        def crear(productos):
+            data = {"cliente_id": self.cliente.id, "items": items_de(productos)}
+            response = vista(factory.post("/", data, format="json"))
+            self.assertEqual(response.status_code, 201, response.data)
+
+        crear(self.uno)
+        consultas = contar_consultas(lambda: crear(self.uno))
+        with self.assertNumQueries(consultas):
+            crear(self.varios)
+
+
+@override_settings(CHECK_STOCK_MAX_ITEMS=5)
+class CheckStockBulkTests(TestCase):
+    """
+    check-stock-bulk rechaza las peticiones con demasiados items.
+    """
+
+    def consultar(self, items):
+        vista = ProductoViewSet.as_view({"post": "check_stock_bulk"})
+        request = APIRequestFactory().post("/", {"items": items}, format="json")
+        return vista(request)
+
+    def test_limite_de_items(self):
+        productos = crear_productos(6)
+
+        respuesta = self.consultar(items_de(productos[:5]))
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertTrue(respuesta.data["disponible"])
+
+        respuesta = self.consultar(items_de(productos))
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn("5 items", respuesta.data["error"])
+
+
+class ReservarStockTests(TestCase):
+    """
+    reservar_stock agrupa por producto y no deja cambios si falta stock.
+    """
+
+    def setUp(self):
+        self.a, self.b = crear_productos(2, stock=10)
+
+    def detalles(self, *pares):
+        return [
+            DetallePedido(producto=producto, cantidad=cantidad)
+            for producto, cantidad in pares
+        ]
+
+    def saldos(self):
+        return {
+            producto.id: (
+                Inventario.objects.get(producto=producto).cantidad_actual,
+                Producto.objects.get(pk=producto.pk).cantidad_actual,
+            )
+            for producto in (self.a, self.b)
+        }
+
+    def test_faltante_reporta_detalle(self):
+        with self.assertRaises(StockInsuficienteError) as error:
+            reservar_stock(self.detalles((self.a, 2), (self.b, 11)), "Prueba")
+
+        self.assertEqual(
+            error.exception.faltantes,
+            [
+                {
+                    "producto_id": self.b.id,
+                    "producto": self.b.nombre,
+                    "solicitado": 11,
+                    "disponible": 10,
+                }
+            ],
+        )
+
+    def test_productos_repetidos_se_suman(self):
+        movimientos = reservar_stock(
+            self.detalles((self.a, 3), (self.b, 1), (self.a, 4)), "Prueba"
+        )
+
+        self.assertEqual(
+            sorted((m.inventario.producto_id, m.cantidad) for m in movimientos),
+            sorted([(self.a.id, 7), (self.b.id, 1)]),
+        )
+        self.assertEqual(self.saldos(), {self.a.id: (3, 3), self.b.id: (9, 9)})
+
+    def test_repetidos_que_superan_el_stock_fallan(self):
+        # Cada línea cabe por separado, la suma no
+        with self.assertRaises(StockInsuficienteError) as error:
+            reservar_stock(self.detalles((self.a, 6), (self.a, 5)), "Prueba")
+        self.assertEqual(error.exception.faltantes[0]["solicitado"], 11)
+
+    def test_fallo_no_modifica_stock_ni_movimientos(self):
+        with self.assertRaises(StockInsuficienteError):
+            with transaction.atomic():
+                reservar_stock(self.detalles((self.a, 5), (self.b, 20)), "Prueba")
+
+        self.assertEqual(self.saldos(), {self.a.id: (10, 10), self.b.id: (10, 10)})
+        self.assertFalse(MovimientoInventario.objects.exists())
+
+
+class AjustarStockTests(TestCase):
+    """
+    Ajustes +n/-n: un saldo negativo se rechaza sin aplicar el lote y las
+    cantidades retornadas son las nuevas.
+    """
+
+    def setUp(self):
+        self.a, self.b = crear_productos(2, stock=10)
+        self.inv_a = Inventario.objects.get(producto=self.a)
+        self.inv_b = Inventario.objects.get(producto=self.b)
+
+    def cantidad(self, inventario):
+        inventario.refresh_from_db()
+        return inventario.cantidad_actual
+
+    def test_aplicar_deltas_retorna_nuevos_saldos(self):
+        saldos = _aplicar_deltas({self.inv_a.id: -4, self.inv_b.id: 5})
+
+        self.assertEqual(saldos[self.inv_a.id]["cantidad_actual"], 6)
+        self.assertEqual(saldos[self.inv_b.id]["cantidad_actual"], 15)
+        self.assertEqual(saldos[self.inv_a.id]["producto_id"], self.a.id)
+
+    def test_aplicar_deltas_omite_saldo_negativo(self):
+        saldos = _aplicar_deltas({self.inv_a.id: -11, self.inv_b.id: -10})
+
+        self.assertEqual(list(saldos), [self.inv_b.id])
+        self.assertEqual(self.cantidad(self.inv_a), 10)
+        self.assertEqual(self.cantidad(self.inv_b), 0)
+
+    def test_aplicar_deltas_permite_negativo(self):
+        saldos = _aplicar_deltas({self.inv_a.id: -11}, permitir_negativo=True)
+        self.assertEqual(saldos[self.inv_a.id]["cantidad_actual"], -1)
+
+    def test_ajuste_negativo_revierte_el_lote(self):
+        with self.assertRaises(StockInsuficienteError) as error:
+            ajustar_stock([(self.inv_b.id, 3), (self.inv_a.id, -11)], "Prueba")
+
+        self.assertEqual(error.exception.faltantes[0]["inventario_id"], self.inv_a.id)
+        self.assertEqual(error.exception.faltantes[0]["solicitado"], 11)
+        self.assertEqual(self.cantidad(self.inv_a), 10)
+        self.assertEqual(self.cantidad(self.inv_b), 10)
+        self.assertFalse(MovimientoInventario.objects.exists())
+
+    def test_endpoint_lote(self):
+        vista = InventarioViewSet.as_view({"post": "ajustar_stock_lote"})
+        data = {
+            "ajustes": [
+                {"inventario_id": self.inv_a.id, "cantidad": -3},
+                {"inventario_id": self.inv_b.id, "cantidad": 2},
+                {"inventario_id": self.inv_a.id, "cantidad": -1},
+            ]
+        }
+        respuesta = vista(APIRequestFactory().post("/", data, format="json"))
+
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(
+            sorted(
+                (fila["inventario_id"], fila["cantidad_actual"])
+                for fila in respuesta.data["inventarios"]
+            ),
+            sorted([(self.inv_a.id, 6), (self.inv_b.id, 12)]),
+        )
+        self.assertEqual(Producto.objects.get(pk=self.a.pk).cantidad_actual, 6)
+
+    def test_endpoint_rechaza_negativo(self):
+        vista = InventarioViewSet.as_view({"post": "ajustar_stock_inventario"})
+        request = APIRequestFactory().post("/", {"cantidad": -11}, format="json")
+        respuesta = vista(request, pk=self.inv_a.id)
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.data["faltantes"][0]["disponible"], 10)
+        self.assertEqual(self.cantidad(self.inv_a), 10)
+
+    def test_endpoint_inventario_inexistente(self):
+        vista = InventarioViewSet.as_view({"post": "ajustar_stock_inventario"})
+        request = APIRequestFactory().post("/", {"cantidad": 1}, format="json")
+        respuesta = vista(request, pk=self.inv_b.id + 100)
+        self.assertEqual(respuesta.status_code, 404)
+
+
+@skipUnless(connection.vendor == "sqlite", "Índice en memoria de SQLite")
+class IndiceBusquedaTests(TestCase):
+    """
+    El índice en memoria se reconstruye al cambiar la versión compartida o
+    al vencer su TTL, aunque la escritura no emita señales.
+    """
+
+    def setUp(self):
+        cache.clear()
+        (self.producto,) = crear_productos(1)
+        self.addCleanup(busqueda.invalidar_indice, Producto)
+
+    def encontrados(self, texto):
+        return list(busqueda.buscar(Producto.objects.all(), texto))
+
+    def renombrar(self):
+        # update() no emite post_save
+        Producto.objects.filter(pk=self.producto.pk).update(nombre="Agua mineral")
+
+    def test_version_compartida(self):
+        self.assertEqual(self.encontrados("mineral"), [])
+        self.renombrar()
+        self.assertEqual(self.encontrados("mineral"), [])
+
+        # Otro proceso invalida el índice
+        cache.incr(busqueda._clave_version(Producto))
+        self.assertEqual(self.encontrados("mineral"), [self.producto])
+
+    @override_settings(BUSQUEDA_INDICE_TTL=0)
+    def test_ttl_vencido(self):
+        self.assertEqual(self.encontrados("mineral"), [])
+        self.renombrar()
+        self.assertEqual(self.encontrados("mineral"), [self.producto])
+
+
+class ListadoEmpleadosTests(TestCase):
+    """
+    El listado de empleados debe usar las mismas consultas con 1 empleado
+    que con muchos.
+    """
+
+    def listar(self):
+        vista = EmpleadoViewSet.as_view({"get": "list"})
+        request = APIRequestFactory().get("/?page_size=1000", HTTP_HOST="localhost")
+        return vista(request).render()
+
+    def test_consultas_constantes(self):
+        with transaction.atomic():
+            crear_empleados(1)
+            self.listar()
+            consultas = contar_consultas(self.listar)
+            transaction.set_rollback(True)
+
+        crear_empleados(50)
+        with self.assertNumQueries(consultas):
+            response = self.listar()
+        self.assertEqual(len(response.data["results"]), 50)
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN de PostgreSQL")
+class IndicesTests(TestCase):
+    """
+    Los filtros frecuentes de la API deben usar su índice parcial o compuesto.
+    """
+
+    planes = [
+        (
+            "idx_inventario_bajo_stock",
+            lambda: Inventario.objects.filter(cantidad_actual__lt=F("stock_minimo")),
+        ),
+        (
+            "idx_productos_disponibles",
+            lambda: Producto.objects.filter(estado=True, cantidad_actual__gt=0),
+        ),
+        (
+            "idx_control_prod_empleado",
+            lambda: ControlProduccionAgua.objects.filter(empleado_id=1).order_by(
+                "-fecha_produccion"
+            ),
+        ),
+    ]
+
+    def test_filtros_usan_indices(self):
+        with connection.cursor() as cursor:
+            # Con tablas pequeñas el planificador prefiere un seq scan
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        for indice, queryset in self.planes:
+            with self.subTest(indice=indice):
+                plan = queryset().explain()
+                self.assertIn(indice, plan)
+
+
+class ResolverClienteTests(TestCase):
+    """
+    Upsert por DNI y búsqueda por teléfono con la cache de teléfonos.
+    """
+
+    def setUp(self):
+        invalidar_clientes()
+        self.addCleanup(invalidar_clientes)
+
+    def registrar(self, telefono, nombre="Ana"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return resolver_cliente(
+                dni="12345678",
+                telefono=telefono,
+                nombre=nombre,
+                apellido_paterno="Quispe",
+            )
+
+    def test_actualiza_por_dni(self):
+        cliente_id = self.registrar("51987654321")
+        self.assertEqual(self.registrar("912345678", nombre="Ana María"), cliente_id)
+
+        cliente = Cliente.objects.get()
+        self.assertEqual(cliente.pk, cliente_id)
+        self.assertEqual(cliente.nombre, "Ana María")
+        self.assertEqual(cliente.telefono, "912345678")
+
+    def test_telefono_anterior_deja_de_resolver(self):
+        cliente_id = self.registrar("987654321")
+        # Deja el número anterior en la cache
+        self.assertEqual(resolver_cliente(telefono="987654321"), cliente_id)
+
+        self.registrar("912345678")
+
+        self.assertIsNone(resolver_cliente(telefono="987654321"))
+        self.assertEqual(resolver_cliente(telefono="912345678"), cliente_id)
+
+    def test_solo_telefono(self):
+        cliente = Cliente.objects.create(
+            nombre="Ana", apellido_paterno="Quispe", telefono="987654321"
+        )
+
+        self.assertEqual(resolver_cliente(telefono="+51 987 654 321"), cliente.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver_cliente(telefono="987-654-321"), cliente.pk)
+        self.assertIsNone(resolver_cliente(telefono="900000000"))
+        self.assertEqual(Cliente.objects.count(), 1)
+
+
+@override_settings(CONFIRM_PAYMENT_TOKEN="token-del-bot")
+class ConfirmarPagoAutenticacionTests(TestCase):
+    """
+    confirm-payment autentica igual con la acción DRF y con la vista async.
+    """
+
+    def setUp(self):
+        cliente = Cliente.objects.create(
+            nombre="Cliente", apellido_paterno="Test", direccion="Av. 123"
+        )
+        self.pedido, _ = crear_pedido_temporal(cliente, items_de(crear_productos(1)))
+
+    def test_token_no_jwt_rechazado(self):
+        vista = PedidoViewSet.as_view(
+            {"post": "confirm_payment"}, **PedidoViewSet.confirm_payment.kwargs
+        )
+        request = APIRequestFactory().post(
+            "/", HTTP_AUTHORIZATION="Bearer token-del-bot"
+        )
+        sincrona = vista(request, pk=self.pedido.pk)
+
+        request = AsyncRequestFactory().post(
+            "/", headers={"Authorization": "Bearer token-del-bot"}
+        )
+        asincrona = async_to_sync(async_views.confirmar_pago)(
+            request, pk=self.pedido.pk
+        )
+
+        self.assertEqual(sincrona.status_code, 401)
+        self.assertEqual(asincrona.status_code, 401)
+        self.assertEqual(asincrona["WWW-Authenticate"], sincrona["WWW-Authenticate"])
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado_pedido, "pendiente")
+
+
+@override_settings(
+    ROUTING_BACKEND="api.tiempo_viaje.HaversineBackend",
+    STORE_COORDENADAS=(-9.93, -76.24),
+    ROUTING_MINUTOS_SIN_COORDENADAS=30,
+    DISTRIBUCION_ASINCRONA=False,
+)
+class TiempoViajeTests(TestCase):
+    """
+    Backend offline: clientes sin coordenadas y claves de cache.
+    """
+
+    def setUp(self):
+        cache.clear()
+        tiempo_viaje.reiniciar()
+        self.addCleanup(tiempo_viaje.reiniciar)
+
+    def test_sin_coordenadas_usa_estimacion_fija(self):
+        self.assertEqual(
+            tiempo_viaje.calcular_tiempo_viaje("Jr. Sin Coordenadas 123"),
+            timedelta(minutes=30),
+        )
+
+    def test_coordenadas_forman_parte_de_la_clave(self):
+        cerca = tiempo_viaje.calcular_tiempo_viaje("Av. 123", (-9.931, -76.241))
+        lejos = tiempo_viaje.calcular_tiempo_viaje("Av. 123", (-9.99, -76.30))
+        self.assertLess(cerca, lejos)
+        self.assertEqual(
+            tiempo_viaje.calcular_tiempo_viaje("av 123", (-9.93101, -76.24099)),
+            cerca,
+        )
+
+    def test_confirmar_pago_sin_coordenadas_crea_distribucion(self):
+        repartidor = crear_empleado()
+        repartidor.puesto = "repartidor"
+        repartidor.save()
+        pedido = crear_pedido(crear_productos(1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            confirmar_pedido(pedido)
+
+        distribucion = Distribucion.objects.get(pedido=pedido)
+        self.assertEqual(distribucion.empleado, repartidor)
+        self.assertEqual(
+            distribucion.fecha_entrega - distribucion.fecha_salida,
+            timedelta(minutes=30),
+        )
+
+
+@override_settings(
+    ROUTING_BACKEND="api.tiempo_viaje.HaversineBackend",
+    ROUTING_MINUTOS_SIN_COORDENADAS=30,
+    DISTRIBUCION_ASINCRONA=False,
+)
+class ConfirmacionDosFasesTests(TestCase):
+    """
+    confirmar_pedido descuenta el stock en la transacción y despacha después
+    del commit; la distribución se crea una sola vez por pedido.
+    """
+
+    def setUp(self):
+        cache.clear()
+        tiempo_viaje.reiniciar()
+        self.addCleanup(tiempo_viaje.reiniciar)
+        repartidor = crear_empleado()
+        repartidor.puesto = "repartidor"
+        repartidor.save()
+        self.productos = crear_productos(2, stock=10)
+        self.pedido = crear_pedido(self.productos, cantidad_por_linea=3)
+
+    def test_despacho_despues_del_commit(self):
+        despachos = []
+
+        def despachar(*args):
+            despachos.append(args)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            confirmar_pedido(self.pedido, despachar=despachar)
+            self.assertEqual(despachos, [])
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado_pedido, "confirmado")
+        self.assertIsNotNone(self.pedido.fecha_confirmacion)
+        self.assertEqual(
+            list(
+                Inventario.objects.filter(producto__in=self.productos)
+                .order_by("producto")
+                .values_list("cantidad_actual", flat=True)
+            ),
+            [7, 7],
+        )
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(despachos, [(self.pedido.id, "Av. Benchmark 123", 6)])
+
+    def test_segunda_confirmacion_no_descuenta(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            confirmar_pedido(self.pedido)
+        with self.assertRaises(PedidoInvalidoError):
+            confirmar_pedido(self.pedido)
+
+        self.assertEqual(
+            Inventario.objects.get(producto=self.productos[0]).cantidad_actual, 7
+        )
+        self.assertEqual(Distribucion.objects.filter(pedido=self.pedido).count(), 1)
+
+    def test_clave_idempotencia_evita_duplicados(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            confirmar_pedido(self.pedido)
+        primera = Distribucion.objects.get(pedido=self.pedido)
+
+        resultado = crear_distribucion(self.pedido.id, "Av. Benchmark 123", 6)
+
+        self.assertTrue(resultado["success"])
+        self.assertEqual(resultado["data"], primera)
+        self.assertEqual(primera.clave_idempotencia, f"pedido-{self.pedido.id}")
+        self.assertEqual(Distribucion.objects.filter(pedido=self.pedido).count(), 1)
+
+    def test_listado_filtra_por_pedido(self):
+        otro = crear_pedido(self.productos)
+        with self.captureOnCommitCallbacks(execute=True):
+            confirmar_pedido(self.pedido)
+            confirmar_pedido(otro)
+
+        vista = DistribucionViewSet.as_view({"get": "list"})
+        request = APIRequestFactory().get("/", {"pedido": self.pedido.id})
+        force_authenticate(request, user=CustomUser.objects.first())
+        respuesta = vista(request)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            [fila["pedido"] for fila in respuesta.data["results"]], [self.pedido.id]
+        )
+
+
+@override_settings(
+    STORE_COORDENADAS=(-9.93, -76.24),
+    DESPACHO_MINUTOS_POR_PARADA=5,
+)
+class PlanificarDespachoTests(TestCase):
+    """
+    Viajes por cluster, división por capacidad y asignación al repartidor
+    que queda libre primero.
+    """
+
+    def setUp(self):
+        self.productos = crear_productos(1)
+        self.repartidor = crear_empleado()
+        self.repartidor.puesto = "repartidor"
+        self.repartidor.save()
+        self.inicio = timezone.now().replace(microsecond=0)
+
+    def ruta(self, capacidad, tiempo_estimado=120):
+        return Ruta.objects.create(
+            nombre=f"Ruta {capacidad}",
+            tiempo_estimado=tiempo_estimado,
+            capacidad=capacidad,
+            flexibilidad=30,
+        )
+
+    def cluster(self, prioridad):
+        return ClusterGeografico.objects.create(
+            nombre=f"Zona {prioridad}", area_cobertura="-", prioridad=prioridad
+        )
+
+    def confirmado(self, coordenadas=None, cantidad=1, cluster=None):
+        pedido = crear_pedido(self.productos, cantidad_por_linea=cantidad)
+        Pedido.objects.filter(pk=pedido.pk).update(estado_pedido="confirmado")
+        if coordenadas:
+            latitud, longitud = coordenadas
+            Cliente.objects.filter(pk=pedido.cliente_id).update(
+                latitud=latitud, longitud=longitud
+            )
+        if cluster:
+            ClienteCluster.objects.create(cliente_id=pedido.cliente_id, cluster=cluster)
+        return pedido
+
+    def planificar(self, **kwargs):
+        return planificar_despacho(inicio=self.inicio, **kwargs)
+
+    def test_viajes_por_cluster_en_orden_de_prioridad(self):
+        self.ruta(100)
+        norte, sur = self.cluster(2), self.cluster(1)
+        pedidos_norte = {
+            self.confirmado((-9.90, -76.24), cluster=norte).id,
+            self.confirmado((-9.901, -76.241), cluster=norte).id,
+        }
+        pedidos_sur = {
+            self.confirmado((-9.96, -76.24), cluster=sur).id,
+            self.confirmado((-9.961, -76.241), cluster=sur).id,
+        }
+
+        plan = self.planificar()
+
+        self.assertEqual(
+            [(viaje.cluster_id, set(viaje.pedidos)) for viaje in plan["viajes"]],
+            [(sur.id, pedidos_sur), (norte.id, pedidos_norte)],
+        )
+        self.assertEqual(plan["distribuciones"], 4)
+        self.assertEqual(
+            set(Distribucion.objects.values_list("clave_idempotencia", flat=True)),
+            {f"pedido-{i}" for i in pedidos_norte | pedidos_sur},
+        )
+        self.assertEqual(AsignacionRuta.objects.count(), 4)
+
+    def test_divide_por_capacidad(self):
+        chica, grande = self.ruta(5), self.ruta(10)
+        for cantidad in (6, 6, 4):
+            self.confirmado((-9.90, -76.24), cantidad=cantidad)
+        excedido = self.confirmado((-9.90, -76.24), cantidad=12)
+        sin_coordenadas = self.confirmado()
+        lejano = self.confirmado((-9.96, -76.24), cantidad=3, cluster=self.cluster(1))
+
+        plan = self.planificar(guardar=False)
+
+        self.assertEqual(
+            sorted((viaje.carga, viaje.ruta) for viaje in plan["viajes"]),
+            [(3, chica), (6, grande), (10, grande)],
+        )
+        (viaje,) = [viaje for viaje in plan["viajes"] if viaje.carga == 3]
+        self.assertEqual(viaje.pedidos, [lejano.id])
+        self.assertEqual(
+            sorted(pedido_id for pedido_id, _ in plan["sin_planificar"]),
+            [excedido.id, sin_coordenadas.id],
+        )
+        self.assertFalse(Distribucion.objects.exists())
+
+    def test_asigna_al_repartidor_libre_primero(self):
+        self.ruta(1)
+        ocupado = crear_empleado("ocupado", "22222222")
+        ocupado.puesto = "Repartidor"
+        ocupado.save()
+        Distribucion.objects.create(
+            pedido=crear_pedido(self.productos),
+            fecha_salida=self.inicio,
+            fecha_entrega=self.inicio + timedelta(hours=2),
+            estado="en ruta",
+            empleado=ocupado,
+        )
+        for latitud in (-9.90, -9.96, -9.93):
+            self.confirmado((latitud, -76.20))
+
+        viajes = self.planificar(guardar=False)["viajes"]
+
+        self.assertEqual(len(viajes), 3)
+        self.assertEqual(
+            [viaje.empleado_id for viaje in viajes], [self.repartidor.id] * 3
+        )
+        self.assertEqual(viajes[0].salida, self.inicio)
+        for anterior, siguiente in zip(viajes, viajes[1:]):
+            self.assertEqual(siguiente.salida, anterior.regreso)
+
+    def test_crear_distribucion_usa_la_del_plan(self):
+        self.ruta(10)
+        pedido = self.confirmado((-9.90, -76.24))
+        self.planificar()
+
+        resultado = crear_distribucion(pedido.id, pedido.direccion_envio, 1)
+
+        self.assertEqual(resultado["data"], Distribucion.objects.get(pedido=pedido))
+        self.assertEqual(Distribucion.objects.filter(pedido=pedido).count(), 1)
+
+
+@skipUnless(connection.vendor == "postgresql", "FOR UPDATE de PostgreSQL")
+@override_settings(
+    ROUTING_BACKEND="api.tiempo_viaje.HaversineBackend",
+    ROUTING_MINUTOS_SIN_COORDENADAS=30,
+)
+class DistribucionConcurrenteTests(TransactionTestCase):
+    """
+    crear_distribucion espera al planificador que tiene el pedido bloqueado
+    y retorna su distribución; ninguno de los dos falla por la clave.
+    """
+
+    def test_espera_al_planificador(self):
+        repartidor = crear_empleado()
+        repartidor.puesto = "repartidor"
+        repartidor.save()
+        pedido = crear_pedido(crear_productos(1))
+        Pedido.objects.filter(pk=pedido.pk).update(estado_pedido="confirmado")
+        resultados = []
+
+        def tarea_de_distribucion():
+            try:
+                resultados.append(
+                    crear_distribucion(pedido.id, pedido.direccion_envio, 1)
+                )
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            # Como _pedidos_pendientes: bloquea el pedido y luego inserta
+            Pedido.objects.select_for_update().get(pk=pedido.pk)
+            hilo = threading.Thread(target=tarea_de_distribucion)
+            hilo.start()
+            hilo.join(timeout=1)
+            self.assertTrue(hilo.is_alive())
+            planificada = Distribucion.objects.create(
+                pedido=pedido,
+                fecha_salida=timezone.now(),
+                estado="en ruta",
+                empleado=repartidor,
+                clave_idempotencia=f"pedido-{pedido.id}",
+            )
+        hilo.join(timeout=10)
+
+        self.assertFalse(hilo.is_alive())
+        self.assertEqual(resultados[0]["data"], planificada)
+
+
+def crear_soplado(empleado, danada=5, total=100, **campos):
+    return ControlSoploBotellas.objects.create(
+        fecha=campos.pop("fecha", timezone.now()),
+        proveedor_preforma=campos.pop("proveedor_preforma", "Ahise"),
+        peso_gramos=Decimal("20.00"),
+        volumen_botella_ml=625,
+        produccion_buena=total - danada,
+        produccion_danada=danada,
+        produccion_total=total,
+        empleado=empleado,
+        **campos,
+    )
+
+
+def crear_produccion(empleado, lote, buenas=90, malogradas=10, **campos):
+    fecha = campos.pop("fecha_produccion", timezone.now())
+    return ControlProduccionAgua.objects.create(
+        fecha_produccion=fecha,
+        numero_lote=lote,
+        fecha_vencimiento=fecha + timedelta(days=180),
+        botellas_envasadas=buenas + malogradas,
+        botellas_malogradas=malogradas,
+        tapas_malogradas=0,
+        etiquetas_malogradas=0,
+        total_botella_buenas=buenas,
+        total_paquetes=buenas // 15,
+        empleado=empleado,
+        **campos,
+    )
+
+
+class KPIIncrementalTests(TestCase):
+    """
+    Los deltas aplicados por las señales deben dejar cada KPI igual que
+    recalcular_kpis en altas, modificaciones y bajas.
+    """
+
+    maxDiff = None
+
+    def setUp(self):
+        self.empleado = crear_empleado()
+        kpis.recalcular_kpis()
+
+    def estado(self):
+        return {
+            kpi.codigo: (kpi.numerador, kpi.denominador, kpi.valor_actual, kpi.periodo)
+            for kpi in KPI.objects.exclude(codigo=None)
+        }
+
+    def assertIgualRecalculo(self):
+        incremental = self.estado()
+        kpis.recalcular_kpis()
+        self.assertEqual(incremental, self.estado())
+
+    def test_soplado(self):
+        primero = crear_soplado(self.empleado, danada=5, total=100)
+        crear_soplado(self.empleado, danada=1, total=50)
+        self.assertIgualRecalculo()
+
+        primero.produccion_danada = 20
+        primero.save()
+        self.assertIgualRecalculo()
+
+        primero.delete()
+        self.assertIgualRecalculo()
+        self.assertEqual(
+            KPI.objects.get(codigo="tasa_defectos_soplado").valor_actual,
+            Decimal("2.00"),
+        )
+
+    def test_produccion_diaria(self):
+        ayer = timezone.now() - timedelta(days=1)
+        hoy = crear_produccion(self.empleado, "L-1", buenas=90)
+        anterior = crear_produccion(
+            self.empleado, "L-2", buenas=45, fecha_produccion=ayer
+        )
+        self.assertIgualRecalculo()
+
+        # Pasa al día en curso: su contribución entra al KPI diario
+        anterior.fecha_produccion = timezone.now()
+        anterior.save()
+        self.assertIgualRecalculo()
+
+        hoy.total_botella_buenas = 30
+        hoy.save()
+        self.assertIgualRecalculo()
+
+        hoy.delete()
+        self.assertIgualRecalculo()
+        self.assertEqual(
+            KPI.objects.get(codigo="botellas_producidas_dia").valor_actual,
+            Decimal("45.00"),
+        )
+
+    def test_entregas(self):
+        pedido = crear_pedido(crear_productos(1))
+        distribuciones = [
+            Distribucion.objects.create(
+                pedido=pedido,
+                fecha_salida=timezone.now(),
+                estado="en ruta",
+                empleado=self.empleado,
+            )
+            for _ in range(3)
+        ]
+        self.assertIgualRecalculo()
+
+        for distribucion, estado in zip(distribuciones, ["entregado", "retrasado"]):
+            distribucion.estado = estado
+            distribucion.save()
+        self.assertIgualRecalculo()
+
+        distribuciones[1].delete()
+        self.assertIgualRecalculo()
+        self.assertEqual(
+            KPI.objects.get(codigo="entregas_a_tiempo").valor_actual,
+            Decimal("100.00"),
+        )
+
+    def test_al_dia_reporta_el_dia_en_curso(self):
+        ayer = timezone.localdate() - timedelta(days=1)
+        KPI.objects.filter(codigo="botellas_producidas_dia").update(
+            numerador=50, valor_actual=50, periodo=ayer
+        )
+
+        kpi = kpis.al_dia(KPI.objects.get(codigo="botellas_producidas_dia"))
+        self.assertEqual(
+            (kpi.numerador, kpi.valor_actual, kpi.periodo),
+            (0, Decimal("0.00"), timezone.localdate()),
+        )
+
+        # La primera escritura del día reinicia los acumuladores del día anterior
+        crear_produccion(self.empleado, "L-1", buenas=90)
+        self.assertEqual(
+            KPI.objects.get(codigo="botellas_producidas_dia").numerador, 90
+        )
+        self.assertIgualRecalculo()
+
+
+class AccionesPaginadasTests(TestCase):
+    """
+    Las acciones de listado propias usan la paginación por cursor.
+    """
+
+    def test_por_empleado(self):
+        empleado = crear_empleado()
+        for numero in range(3):
+            crear_produccion(empleado, f"L-{numero}")
+        vista = ControlProduccionAguaViewSet.as_view({"get": "por_empleado"})
+
+        respuesta = vista(
+            APIRequestFactory().get("/", {"page_size": 2}), empleado_id=empleado.id
+        )
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.data["results"]), 2)
+        self.assertIsNotNone(respuesta.data["next"])
+
+    def test_bajo_stock(self):
+        crear_productos(3, stock=5)
+        vista = InventarioViewSet.as_view({"get": "listar_bajo_stock"})
+
+        respuesta = vista(APIRequestFactory().get("/"))
+
+        self.assertEqual(len(respuesta.data["results"]), 3)
+        self.assertIsNone(respuesta.data["next"])
+
+
+class ResumenesIncrementalesTests(TestCase):
+    """
+    Los resúmenes mantenidos por las señales deben coincidir con
+    reconstruir_resumenes.
+    """
+
+    maxDiff = None
+
+    def setUp(self):
+        self.empleado = crear_empleado()
+        self.otro = crear_empleado("otro", "11111111")
+
+    def filas(self, definicion):
+        campos = [
+            "fecha",
+            "turno",
+            "empleado_id",
+            "proveedor_preforma",
+            "registros",
+            *definicion.metricas,
+        ]
+        return sorted(definicion.resumen.objects.values_list(*campos))
+
+    def assertIgualReconstruccion(self):
+        for definicion in (resumenes.SOPLO, resumenes.PRODUCCION_AGUA):
+            incremental = self.filas(definicion)
+            resumenes.reconstruir_resumenes(definicion)
+            self.assertEqual(incremental, self.filas(definicion))
+
+    def test_altas_modificaciones_y_bajas(self):
+        manana = timezone.localtime().replace(hour=9)
+        noche = manana.replace(hour=23)
+        soplado = crear_soplado(self.empleado, fecha=manana)
+        crear_soplado(self.empleado, danada=2, fecha=manana)
+        crear_soplado(self.otro, fecha=noche, proveedor_preforma="Damar")
+        produccion = crear_produccion(
+            self.empleado, "L-1", fecha_produccion=manana, control_soplado=soplado
+        )
+        crear_produccion(self.empleado, "L-2", fecha_produccion=manana)
+        self.assertIgualReconstruccion()
+
+        # Cambia de turno, de día y de empleado
+        soplado.fecha = noche - timedelta(days=1)
+        soplado.empleado = self.otro
+        soplado.save()
+        produccion.fecha_produccion = noche
+        produccion.botellas_malogradas = 30
+        produccion.save()
+        self.assertIgualReconstruccion()
+
+        produccion.delete()
+        ControlSoploBotellas.objects.filter(empleado=self.otro).first().delete()
+        self.assertIgualReconstruccion()
+
+    def test_cambio_de_proveedor_del_soplado(self):
+        soplado = crear_soplado(self.empleado, proveedor_preforma="Ahise")
+        crear_produccion(self.empleado, "L-1", control_soplado=soplado)
+
+        soplado.proveedor_preforma = "Damar"
+        soplado.save()
+
+        self.assertEqual(
+            list(
+                ResumenProduccionAgua.objects.values_list(
+                    "proveedor_preforma", flat=True
+                )
+            ),
+            ["Damar"],
+        )
+        self.assertIgualReconstruccion()
+
+    def test_soplado_eliminado_deja_produccion_sin_proveedor(self):
+        # SET_NULL actualiza las producciones sin emitir señales
+        soplado = crear_soplado(self.empleado, proveedor_preforma="Damar")
+        crear_produccion(self.empleado, "L-1", control_soplado=soplado)
+        crear_produccion(self.empleado, "L-2")
+
+        soplado.delete()
+
+        self.assertEqual(
+            list(
+                ResumenProduccionAgua.objects.values_list(
+                    "proveedor_preforma", "registros"
+                )
+            ),
+            [("", 2)],
+        )
+        self.assertIgualReconstruccion()
+
+
+def comprimir(datos):
+    return gzip.compress(json.dumps(datos).encode())
+
+
+def como_csv(filas):
+    salida = io.StringIO()
+    csv.writer(salida).writerows(filas)
+    return salida.getvalue()
+
+
+class ReportesCSVTests(TestCase):
+    """
+    Lectura del reporte por bloques y respuestas CSV de la descarga.
+    """
+
+    def test_filas_csv(self):
+        filas = [[1, "Agua, 625 ml", 12.5], [2, 'Dice "hola"', None]]
+        contenido = comprimir(
+            {
+                "tipo": "ventas",
+                "parametros": {"desde": "2026-01-01", "extra": [1, {"a": "}"}]},
+                "columnas": ["id", "producto", "monto"],
+                "filas": filas,
+                "totales": {"monto": 12.5},
+            }
+        )
+
+        self.assertEqual(
+            "".join(reportes.filas_csv(contenido)),
+            como_csv([["id", "producto", "monto"], *filas]),
+        )
+
+    def test_filas_csv_sin_filas(self):
+        contenido = comprimir({"columnas": ["id"], "filas": [], "totales": {}})
+        self.assertEqual("".join(reportes.filas_csv(contenido)), "id\r\n")
+
+    def test_lector_numeros_entre_bloques(self):
+        texto = ' [12345.678, -9e3] {"clave": "valor largo"}  123456789'
+        for bloque in (1, 2, 3, 7):
+            lector = reportes._LectorJSON(io.StringIO(texto), bloque=bloque)
+            self.assertEqual(
+                [lector.valor(), lector.valor(), lector.valor()],
+                [[12345.678, -9000.0], {"clave": "valor largo"}, 123456789],
+                bloque,
+            )
+
+    def test_lector_contenido_incompleto(self):
+        lector = reportes._LectorJSON(io.StringIO('{"filas": [1, 2'), bloque=4)
+        lector.esperar("{")
+        lector.valor()
+        lector.esperar(":")
+        lector.esperar("[")
+        lector.valor()
+        lector.esperar(",")
+        lector.valor()
+        with self.assertRaises(ValueError):
+            lector.esperar(",", "]")
+
+    def test_error_como_csv(self):
+        reporte = Reporte.objects.create(
+            titulo="Ventas",
+            tipo_reporte="ventas",
+            estado="fallido",
+            ultimo_error="Sin datos, reintentar",
+        )
+        vista = ReporteViewSet.as_view(
+            {"get": "contenido"}, **ReporteViewSet.contenido.kwargs
+        )
+
+        respuesta = vista(
+            APIRequestFactory().get("/", {"format": "csv"}), pk=reporte.pk
+        )
+        respuesta.render()
+
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(
+            respuesta.content.decode(),
+            como_csv([["estado", "error"], ["fallido", "Sin datos, reintentar"]]),
+        )
+
+
+class TransporteConError(correo.FakeTransport):
+    def enviar(self, correos):
+        raise ConnectionError("SendGrid no responde")
+
+
+def procesar_con_error():
+    return correo.procesar_bandeja(TransporteConError())
+
+
+@override_settings(
+    EMAIL_OUTBOX_LEASE=300, EMAIL_OUTBOX_MAX_INTENTOS=3, EMAIL_OUTBOX_BACKOFF=60
+)
+class BandejaCorreoTests(TestCase):
+    """
+    Envío, reintentos y fallos de la bandeja de salida con FakeTransport.
+    """
+
+    def encolar(self, destinatario="empleado@zoiaqua.pe"):
+        return correo.encolar_correo(destinatario, "Acceso", "<p>clave123</p>")
+
+    def test_envio_agrupa_y_borra_contenido(self):
+        self.encolar("a@zoiaqua.pe")
+        self.encolar("b@zoiaqua.pe")
+        transporte = correo.FakeTransport()
+
+        self.assertEqual(correo.procesar_bandeja(transporte, workers=1), (2, 0))
+
+        self.assertEqual(
+            sorted(enviado["destinatario"] for enviado in transporte.enviados),
+            ["a@zoiaqua.pe", "b@zoiaqua.pe"],
+        )
+        for enviado in CorreoSaliente.objects.all():
+            self.assertEqual(enviado.estado, "enviado")
+            self.assertEqual(enviado.contenido_html, "")
+            self.assertIsNotNone(enviado.fecha_envio)
+
+    def test_error_reintenta_con_backoff(self):
+        pendiente = self.encolar()
+        antes = timezone.now()
+
+        with self.assertLogs("api.correo", "WARNING"):
+            self.assertEqual(procesar_con_error(), (0, 1))
+
+        pendiente.refresh_from_db()
+        self.assertEqual(pendiente.estado, "pendiente")
+        self.assertEqual(pendiente.intentos, 1)
+        self.assertEqual(pendiente.contenido_html, "<p>clave123</p>")
+        self.assertIn("SendGrid no responde", pendiente.ultimo_error)
+        self.assertGreaterEqual(
+            pendiente.proximo_intento, antes + timedelta(seconds=60)
+        )
+        # Hasta el próximo intento no se vuelve a tomar
+        self.assertEqual(correo.procesar_bandeja(correo.FakeTransport()), (0, 0))
+
+        CorreoSaliente.objects.update(proximo_intento=timezone.now())
+        with self.assertLogs("api.correo", "WARNING"):
+            self.assertEqual(procesar_con_error(), (0, 1))
+        pendiente.refresh_from_db()
+        self.assertEqual(pendiente.intentos, 2)
+        self.assertGreaterEqual(
+            pendiente.proximo_intento, timezone.now() + timedelta(seconds=110)
+        )
+
+    def test_fallido_tras_max_intentos_borra_contenido(self):
+        pendiente = self.encolar()
+        CorreoSaliente.objects.update(intentos=2)
+
+        with self.assertLogs("api.correo", "WARNING"):
+            self.assertEqual(procesar_con_error(), (0, 1))
+
+        pendiente.refresh_from_db()
+        self.assertEqual(pendiente.estado, "fallido")
+        self.assertEqual(pendiente.intentos, 3)
+        self.assertEqual(pendiente.contenido_html, "")
+        self.assertEqual(correo.procesar_bandeja(correo.FakeTransport()), (0, 0))
+
+    def test_reclamo_reserva_los_correos(self):
+        primero, segundo = self.encolar(), self.encolar()
+
+        reclamados = correo._reclamar_pendientes(limite=1)
+
+        self.assertEqual([c.id for c in reclamados], [primero.id])
+        # El primero queda reservado por EMAIL_OUTBOX_LEASE
+        self.assertEqual(
+            [c.id for c in correo._reclamar_pendientes(limite=10)], [segundo.id]
+        )
+        self.assertEqual(correo._reclamar_pendientes(limite=10), [])
+
+
+@skipUnless(connection.vendor == "postgresql", "SKIP LOCKED de PostgreSQL")
+class ReclamoConcurrenteCorreoTests(TransactionTestCase):
+    """
+    Un worker no espera ni toma los correos bloqueados por otro.
+    """
+
+    def test_omite_filas_bloqueadas(self):
+        bloqueado = correo.encolar_correo("a@zoiaqua.pe", "Acceso", "<p>a</p>")
+        libre = correo.encolar_correo("b@zoiaqua.pe", "Acceso", "<p>b</p>")
+        reclamados = []
+
+        def otro_worker():
+            try:
+                reclamados.extend(c.id for c in correo._reclamar_pendientes(10))
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            CorreoSaliente.objects.select_for_update().get(id=bloqueado.id)
+            hilo = threading.Thread(target=otro_worker)
+            hilo.start()
+            hilo.join(timeout=10)
+
+        self.assertFalse(hilo.is_alive())
+        self.assertEqual(reclamados, [libre.id])
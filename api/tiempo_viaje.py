@@ -0,0 +1,241 @@
+"""
+Servicio de tiempos de viaje desde la tienda hasta la dirección del cliente.
+
+El backend se elige con ROUTING_BACKEND: Google Directions en producción o
+un modelo offline (haversine + velocidad promedio) sobre las coordenadas
+guardadas del cliente. Los resultados se cachean por dirección normalizada
+(y coordenadas redondeadas, en los backends que las usan) en memoria del
+proceso (LRU con TTL) y en la cache de Django.
+"""
+
+import hashlib
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class GoogleMapsBackend:
+    """
+    Consulta la Directions API. El cliente se crea una sola vez por proceso
+    y reutiliza su sesión HTTP; `timeout` limita el tiempo total por consulta
+    incluyendo reintentos.
+    """
+
+    nombre = "google"
+
+    def __init__(self, timeout=None):
+        import googlemaps
+
+        timeout = timeout or settings.ROUTING_TIMEOUT
+        self.client = googlemaps.Client(
+            key=settings.GOOGLE_MAPS_API_KEY, timeout=timeout, retry_timeout=timeout
+        )
+
+    def tiempo_viaje(self, destino, coordenadas=None):
+        directions_result = self.client.directions(
+            origin=settings.STORE_ADDRESS,
+            destination=destino,
+            mode="driving",
+            departure_time=datetime.now(),
+        )
+
+        if not directions_result:
+            return None
+
+        duration_seconds = directions_result[0]["legs"][0]["duration"]["value"]
+        return timedelta(seconds=duration_seconds)
+
+
+class HaversineBackend:
+    """
+    Estima el tiempo de viaje sin red: distancia en línea recta entre la
+    tienda y el cliente, corregida por un factor de desvío y dividida entre
+    una velocidad promedio. Si no hay coordenadas del cliente se usa
+    ROUTING_MINUTOS_SIN_COORDENADAS para no descartar el despacho.
+    """
+
+    nombre = "haversine"
+    # El resultado depende de las coordenadas, no solo de la dirección
+    usa_coordenadas = True
+    RADIO_TIERRA_KM = 6371.0
+
+    def __init__(self, velocidad_kmh=None, factor_desvio=None, **kwargs):
+        if settings.STORE_COORDENADAS is None:
+            raise ImproperlyConfigured(
+                "HaversineBackend requiere STORE_COORDENADAS (\"lat,lng\" de la "
+                "tienda)."
+            )
+        self.velocidad_kmh = velocidad_kmh or settings.ROUTING_VELOCIDAD_KMH
+        self.factor_desvio = factor_desvio or settings.ROUTING_FACTOR_DESVIO
+
+    @classmethod
+    def distancia_km(cls, origen, destino):
+        lat1, lon1 = map(math.radians, map(float, origen))
+        lat2, lon2 = map(math.radians, map(float, destino))
+        a = (
+            math.sin((lat2 - lat1) / 2) ** 2
+            + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        )
+        return 2 * cls.RADIO_TIERRA_KM * math.asin(math.sqrt(a))
+
+    def estimar(self, coordenadas):
+        if coordenadas is None:
+            return timedelta(minutes=settings.ROUTING_MINUTOS_SIN_COORDENADAS)
+
+        distancia = self.distancia_km(settings.STORE_COORDENADAS, coordenadas)
+        horas = distancia * self.factor_desvio / self.velocidad_kmh
+        return timedelta(seconds=round(horas * 3600))
+
+    def tiempo_viaje(self, destino, coordenadas=None):
+        if coordenadas is None:
+            coordenadas = coordenadas_por_direccion(destino)
+        return self.estimar(coordenadas)
+
+
+def coordenadas_por_direccion(direccion):
+    """
+    Busca las coordenadas guardadas de un cliente con esa dirección.
+    """
+    from api.models import Cliente
+
+    cliente = (
+        Cliente.objects.filter(
+            direccion__iexact=direccion.strip(),
+            latitud__isnull=False,
+            longitud__isnull=False,
+        )
+        .values_list("latitud", "longitud")
+        .first()
+    )
+    return cliente
+
+
+class CacheLRU:
+    """
+    Cache en memoria del proceso con tamaño máximo y expiración por entrada.
+    """
+
+    def __init__(self, max_entradas, ttl):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entrada = self._datos.get(key)
+            if entrada is None:
+                return None
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self._datos[key]
+                return None
+            self._datos.move_to_end(key)
+            return valor
+
+    def set(self, key, valor):
+        with self._lock:
+            self._datos[key] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(key)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._datos.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_cache_local = None
+
+
+def obtener_backend():
+    """
+    Retorna la instancia única del backend configurado en ROUTING_BACKEND.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.ROUTING_BACKEND)()
+    return _backend
+
+
+def _obtener_cache_local():
+    global _cache_local
+    if _cache_local is None:
+        _cache_local = CacheLRU(
+            settings.ROUTING_CACHE_MAX_ENTRADAS, settings.ROUTING_CACHE_TTL
+        )
+    return _cache_local
+
+
+def reiniciar():
+    """
+    Descarta el backend y la cache local (p. ej. al cambiar la configuración).
+    """
+    global _backend, _cache_local
+    with _backend_lock:
+        _backend = None
+        _cache_local = None
+
+
+def normalizar_direccion(direccion):
+    """
+    Normaliza una dirección para usarla como clave de cache: minúsculas, sin
+    tildes, sin signos de puntuación y con espacios simples.
+    """
+    texto = unicodedata.normalize("NFKD", direccion or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return " ".join(texto.split())
+
+
+def _clave_cache(backend, destino, coordenadas=None):
+    texto = normalizar_direccion(destino)
+    if coordenadas is not None and getattr(backend, "usa_coordenadas", False):
+        # Redondeo a ~11 m: la misma dirección con otras coordenadas no
+        # comparte el resultado
+        texto += "|{:.4f},{:.4f}".format(*map(float, coordenadas))
+    clave = hashlib.sha1(texto.encode()).hexdigest()
+    return f"tiempo_viaje:{backend.nombre}:{clave}"
+
+
+def calcular_tiempo_viaje(destino, coordenadas=None):
+    """
+    Retorna el tiempo de viaje (timedelta) desde la tienda hasta `destino`,
+    o None si no se pudo calcular.
+
+    :param destino: Dirección del cliente
+    :param coordenadas: Tupla (latitud, longitud) opcional para backends offline
+    """
+    backend = obtener_backend()
+    cache_local = _obtener_cache_local()
+    key = _clave_cache(backend, destino, coordenadas)
+
+    segundos = cache_local.get(key)
+    if segundos is None:
+        segundos = cache.get(key)
+        if segundos is None:
+            tiempo = backend.tiempo_viaje(destino, coordenadas=coordenadas)
+            if tiempo is None:
+                return None
+            segundos = int(tiempo.total_seconds())
+            cache.set(key, segundos, timeout=settings.ROUTING_CACHE_TTL)
+        cache_local.set(key, segundos)
+
+    return timedelta(seconds=segundos)
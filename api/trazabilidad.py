@@ -0,0 +1,216 @@
+"""
+Trazabilidad por lote de producción.
+
+TrazabilidadLote guarda, por cada lote, los inventarios que lo contienen y
+cada movimiento de esos inventarios con el pedido y cliente que lo
+recibieron. Las funciones de api.stock llaman a `registrar_movimientos` en
+la misma transacción que crea los movimientos; solo consultan la BD cuando
+algún inventario tiene lote. `reconstruir_trazabilidad` regenera la tabla
+desde los datos existentes (backfill o corrección).
+"""
+
+import re
+
+from django.db import transaction
+
+from api.models import (
+    ControlProduccionAgua,
+    Inventario,
+    MovimientoInventario,
+    Pedido,
+    TrazabilidadLote,
+)
+
+# documento_referencia de las salidas por confirmación de pedido
+REFERENCIA_PEDIDO = re.compile(r"^PEDIDO-(\d+)$")
+
+
+def _pedido_id(documento_referencia):
+    coincidencia = REFERENCIA_PEDIDO.match(documento_referencia or "")
+    return int(coincidencia.group(1)) if coincidencia else None
+
+
+def _clientes(pedido_ids):
+    if not pedido_ids:
+        return {}
+    return dict(
+        Pedido.objects.filter(id__in=pedido_ids).values_list("id", "cliente_id")
+    )
+
+
+def _vinculos_movimientos(movimientos, inventarios, numeros):
+    """
+    Filas de TrazabilidadLote para los movimientos de inventarios con lote.
+
+    :param inventarios: {inventario_id: {"producto_id", "control_produccion_id"}}
+    :param numeros: {control_produccion_id: numero_lote}
+    """
+    pedidos = {
+        movimiento.id: _pedido_id(movimiento.documento_referencia)
+        for movimiento in movimientos
+    }
+    clientes = _clientes({pedido for pedido in pedidos.values() if pedido})
+    vinculos = []
+    for movimiento in movimientos:
+        inventario = inventarios[movimiento.inventario_id]
+        vinculos.append(
+            TrazabilidadLote(
+                numero_lote=numeros[inventario["control_produccion_id"]],
+                control_produccion_id=inventario["control_produccion_id"],
+                inventario_id=movimiento.inventario_id,
+                producto_id=inventario["producto_id"],
+                movimiento_id=movimiento.id,
+                tipo_movimiento=movimiento.tipo_movimiento,
+                cantidad=movimiento.cantidad,
+                documento_referencia=movimiento.documento_referencia,
+                pedido_id=pedidos[movimiento.id],
+                cliente_id=clientes.get(pedidos[movimiento.id]),
+                fecha=movimiento.fecha_movimiento,
+            )
+        )
+    return vinculos
+
+
+def registrar_movimientos(movimientos, inventarios):
+    """
+    Vincula los movimientos recién creados con el lote de su inventario.
+
+    :param inventarios: {inventario_id: {"producto_id", "control_produccion_id"}}
+        de los inventarios afectados, tal como los tiene quien escribe
+    :return: Vínculos creados
+    """
+    con_lote = [
+        movimiento
+        for movimiento in movimientos
+        if inventarios[movimiento.inventario_id]["control_produccion_id"]
+    ]
+    if not con_lote:
+        return []
+
+    numeros = dict(
+        ControlProduccionAgua.objects.filter(
+            id__in={
+                inventarios[movimiento.inventario_id]["control_produccion_id"]
+                for movimiento in con_lote
+            }
+        ).values_list("id", "numero_lote")
+    )
+    return TrazabilidadLote.objects.bulk_create(
+        _vinculos_movimientos(con_lote, inventarios, numeros)
+    )
+
+
+def vincular_inventario(inventario):
+    """
+    Mantiene la fila base (sin movimiento) del inventario con su lote actual.
+    """
+    if inventario.control_produccion_id is None:
+        TrazabilidadLote.objects.filter(
+            inventario=inventario, movimiento__isnull=True
+        ).delete()
+        return
+    numero_lote = (
+        ControlProduccionAgua.objects.filter(id=inventario.control_produccion_id)
+        .values_list("numero_lote", flat=True)
+        .first()
+    )
+    TrazabilidadLote.objects.update_or_create(
+        inventario=inventario,
+        movimiento=None,
+        defaults={
+            "numero_lote": numero_lote,
+            "control_produccion_id": inventario.control_produccion_id,
+            "producto_id": inventario.producto_id,
+        },
+    )
+
+
+def renombrar_lote(control):
+    """
+    Propaga un cambio de `numero_lote` a los vínculos del lote.
+    """
+    TrazabilidadLote.objects.filter(control_produccion=control).exclude(
+        numero_lote=control.numero_lote
+    ).update(numero_lote=control.numero_lote)
+
+
+def consultar_lote(numero_lote):
+    """
+    Vínculos de un lote en orden cronológico, con una consulta por el índice
+    (numero_lote, fecha).
+    """
+    return list(
+        TrazabilidadLote.objects.filter(numero_lote=numero_lote)
+        .order_by("fecha", "id")
+        .values(
+            "control_produccion_id",
+            "inventario_id",
+            "producto_id",
+            "movimiento_id",
+            "tipo_movimiento",
+            "cantidad",
+            "documento_referencia",
+            "pedido_id",
+            "cliente_id",
+            "fecha",
+        )
+    )
+
+
+@transaction.atomic
+def reconstruir_trazabilidad(bloque=2000):
+    """
+    Regenera la tabla de trazabilidad desde los inventarios con lote y sus
+    movimientos. Retorna la cantidad de vínculos creados.
+    """
+    TrazabilidadLote.objects.all().delete()
+    inventarios = {
+        fila["id"]: fila
+        for fila in Inventario.objects.filter(control_produccion__isnull=False).values(
+            "id",
+            "producto_id",
+            "control_produccion_id",
+            "control_produccion__numero_lote",
+            "fecha_actualizacion",
+        )
+    }
+    numeros = {
+        fila["control_produccion_id"]: fila["control_produccion__numero_lote"]
+        for fila in inventarios.values()
+    }
+    creados = len(
+        TrazabilidadLote.objects.bulk_create(
+            [
+                TrazabilidadLote(
+                    numero_lote=fila["control_produccion__numero_lote"],
+                    control_produccion_id=fila["control_produccion_id"],
+                    inventario_id=fila["id"],
+                    producto_id=fila["producto_id"],
+                    fecha=fila["fecha_actualizacion"],
+                )
+                for fila in inventarios.values()
+            ],
+            batch_size=bloque,
+        )
+    )
+
+    movimientos = MovimientoInventario.objects.filter(
+        inventario__control_produccion__isnull=False
+    ).order_by("id")
+    lote = []
+    for movimiento in movimientos.iterator(chunk_size=bloque):
+        lote.append(movimiento)
+        if len(lote) == bloque:
+            creados += len(
+                TrazabilidadLote.objects.bulk_create(
+                    _vinculos_movimientos(lote, inventarios, numeros)
+                )
+            )
+            lote = []
+    if lote:
+        creados += len(
+            TrazabilidadLote.objects.bulk_create(
+                _vinculos_movimientos(lote, inventarios, numeros)
+            )
+        )
+    return creados
@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from . import async_views
 from .views import (
+    AlertaStockViewSet,
+    ArchivoAnaliticoViewSet,
     ClienteViewSet,
     ControlCalidadViewSet,
     ControlProduccionAguaViewSet,
@@ -21,6 +25,7 @@ from .views import (
     ReporteViewSet,
     RolesByDepartamentoView,
     RutaViewSet,
+    TrazabilidadLoteView,
     welcome_api_view,
 )
 
@@ -30,6 +35,7 @@ router.register(r"departamentos", DepartamentoViewSet)
 router.register(r"productos", ProductoViewSet)
 router.register(r"inventarios", InventarioViewSet)
 router.register(r"movimientos-inventario", MovimientoInventarioViewSet)
+router.register(r"alertas-stock", AlertaStockViewSet)
 router.register(r"clientes", ClienteViewSet)
 router.register(r"pedidos", PedidoViewSet)
 router.register(r"detalles-pedido", DetallePedidoViewSet)
@@ -41,6 +47,7 @@ router.register(r"kpis", KPIViewSet)
 router.register(r"reportes", ReporteViewSet)
 router.register(r"control-soplo-botellas", ControlSoploBotellasViewSet)
 router.register(r"control-produccion-agua", ControlProduccionAguaViewSet)
+router.register(r"analitica", ArchivoAnaliticoViewSet)
 
 # https://web-production-0b68.up.railway.app/api/reportes asi para todos (Get-List)
 
@@ -59,4 +66,35 @@ urlpatterns = [
         RolesByDepartamentoView.as_view(),
         name="roles_por_departamento",
     ),
+    path(
+        "api/lotes/<str:numero_lote>/trace/",
+        TrazabilidadLoteView.as_view(),
+        name="trazabilidad_lote",
+    ),
 ]
+
+# Endpoints del chatbot en versión async (ASGI); reemplazan a las acciones
+# de los ViewSets con la misma ruta, por eso van antes del router
+if settings.ASYNC_BOT_ENDPOINTS:
+    urlpatterns = [
+        path(
+            "api/productos/disponibles/",
+            async_views.productos_disponibles,
+            name="producto-disponibles-async",
+        ),
+        path(
+            "api/productos/check-stock/",
+            async_views.check_stock,
+            name="producto-check-stock-async",
+        ),
+        path(
+            "api/pedidos/create-temp/",
+            async_views.crear_pedido_temp,
+            name="pedido-create-temp-async",
+        ),
+        path(
+            "api/pedidos/<int:pk>/confirm-payment/",
+            async_views.confirmar_pago,
+            name="pedido-confirm-payment-async",
+        ),
+    ] + urlpatterns
@@ -1,18 +1,46 @@
+import gzip
+from decimal import Decimal
+
 from django.conf import settings
-from django.db import transaction
-from django.db.models import F
+from django.db.models import DecimalField, ExpressionWrapper, F, Prefetch
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date
 from rest_framework import serializers, status, viewsets
 from rest_framework.decorators import action, api_view
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from api import alertas, analitica, kpis, reportes, resumenes, trazabilidad
+from api.busqueda import BusquedaFilter, sugerir
+from api.cache import estadisticas_catalogo, obtener_catalogo, respuesta_catalogo
+from api.carga_masiva import CargaMasivaMixin
+from api.clientes import resolver_cliente
+from api.despacho import DespachoError, planificar_despacho
+from api.pagination import StreamingListMixin
+from api.pedidos import (
+    PedidoInvalidoError,
+    confirmar_pedido,
+    crear_pedido_temporal,
+    verificar_stock,
+)
 from api.service import crear_distribucion
+from api.stock import (
+    StockInsuficienteError,
+    ajustar_stock,
+    fijar_stock,
+    registrar_movimiento,
+)
+from api.streaming import iterar_async
 
 from .models import (
     KPI,
+    AlertaStock,
+    ArchivoAnalitico,
     Cliente,
     ControlCalidad,
     ControlProduccionAgua,
@@ -21,6 +49,7 @@ from .models import (
     DetallePedido,
     Distribucion,
     Empleado,
+    EmpleadoRol,
     Inventario,
     MovimientoInventario,
     Pedido,
@@ -31,6 +60,9 @@ from .models import (
     Ruta,
 )
 from .serializers import (
+    AjusteStockSerializer,
+    AlertaStockSerializer,
+    ArchivoAnaliticoSerializer,
     ClienteSerializer,
     ControlCalidadSerializer,
     ControlProduccionAguaSerializer,
@@ -50,6 +82,7 @@ from .serializers import (
     ProduccionSerializer,
     ProductoSerializer,
     ReporteSerializer,
+    ResolverClienteSerializer,
     RolSerializer,
     RutaSerializer,
 )
@@ -91,8 +124,23 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 
 
 # Vista para Empleado
-class EmpleadoViewSet(viewsets.ModelViewSet):
+class EmpleadoViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = Empleado.objects.all()
+    filter_backends = [BusquedaFilter]
+
+    def get_queryset(self):
+        # Carga usuario, departamento y roles en un número fijo de consultas
+        return (
+            super()
+            .get_queryset()
+            .select_related("user", "departamento_principal")
+            .prefetch_related(
+                Prefetch(
+                    "empleadorol_set",
+                    queryset=EmpleadoRol.objects.select_related("rol"),
+                )
+            )
+        )
 
     def get_serializer_class(self):
         if self.action == "registro":
@@ -127,7 +175,7 @@ class EmpleadoViewSet(viewsets.ModelViewSet):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class DepartamentoViewSet(viewsets.ModelViewSet):
+class DepartamentoViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = Departamento.objects.all()
     serializer_class = DepartamentoSerializer
 
@@ -151,22 +199,127 @@ class RolesByDepartamentoView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class TrazabilidadLoteView(APIView):
+    """
+    Trazabilidad de un lote: inventarios que lo contienen, sus movimientos y
+    los pedidos y clientes que lo recibieron, leídos de la tabla precalculada.
+    """
+
+    def get(self, request, numero_lote):
+        vinculos = trazabilidad.consultar_lote(numero_lote)
+        if not vinculos:
+            return Response(
+                {"error": "Lote no encontrado"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        movimientos = [v for v in vinculos if v["movimiento_id"] is not None]
+        pedidos = {}
+        for vinculo in movimientos:
+            if vinculo["pedido_id"] is not None:
+                pedidos[vinculo["pedido_id"]] = {
+                    "pedido_id": vinculo["pedido_id"],
+                    "cliente_id": vinculo["cliente_id"],
+                }
+        return Response(
+            {
+                "numero_lote": numero_lote,
+                "control_produccion_id": vinculos[0]["control_produccion_id"],
+                "inventarios": sorted({v["inventario_id"] for v in vinculos}),
+                "movimientos": [
+                    {
+                        "movimiento_id": v["movimiento_id"],
+                        "inventario_id": v["inventario_id"],
+                        "producto_id": v["producto_id"],
+                        "tipo_movimiento": v["tipo_movimiento"],
+                        "cantidad": v["cantidad"],
+                        "documento_referencia": v["documento_referencia"],
+                        "pedido_id": v["pedido_id"],
+                        "fecha": v["fecha"],
+                    }
+                    for v in movimientos
+                ],
+                "pedidos": list(pedidos.values()),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 # Vista para cliente
-class ClienteViewSet(viewsets.ModelViewSet):
+class ClienteViewSet(CargaMasivaMixin, StreamingListMixin, viewsets.ModelViewSet):
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
+    filter_backends = [BusquedaFilter]
+    carga_masiva = "clientes"
+
+    @action(detail=False, methods=["post"], url_path="resolve")
+    def resolver(self, request):
+        """
+        Identifica al cliente del chatbot por DNI o teléfono y lo registra o
+        actualiza si envía nombre y apellido_paterno. Retorna su id.
+        """
+        serializer = ResolverClienteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cliente_id = resolver_cliente(**serializer.validated_data)
+        if cliente_id is None:
+            return Response(
+                {
+                    "error": "Cliente no encontrado; envíe nombre y "
+                    "apellido_paterno para registrarlo"
+                },
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response({"cliente_id": cliente_id}, status=status.HTTP_200_OK)
 
 
 # Vista para Producto
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(CargaMasivaMixin, StreamingListMixin, viewsets.ModelViewSet):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
+    filter_backends = [BusquedaFilter]
+    carga_masiva = "productos"
+
+    @action(detail=False, methods=["get"], url_path="buscar")
+    def buscar(self, request):
+        """
+        Productos activos más parecidos a un texto libre (?q=, ?limite=),
+        de mayor a menor similitud. Tolera errores de tipeo.
+        """
+        texto = request.query_params.get("q", "")
+        try:
+            limite = min(int(request.query_params.get("limite", 5)), 50)
+        except ValueError:
+            return Response(
+                {"error": "El parámetro 'limite' debe ser un número entero"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        productos = sugerir(Producto.objects.filter(estado=True), texto, limite)
+        datos = self.get_serializer(productos, many=True).data
+        for producto, fila in zip(productos, datos):
+            fila["similitud"] = round(producto.similitud, 3)
+        return Response(datos, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["get"], url_path="disponibles")
     def disponibles(self, request):
-        productos = Producto.objects.filter(estado=True, cantidad_actual__gt=0)
-        serializer = self.get_serializer(productos, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        """
+        Catálogo de productos disponibles para el chatbot.
+        Se sirve desde cache como JSON pre-renderizado y soporta ETag y
+        Last-Modified para responder 304 a los clientes.
+        """
+
+        def renderizar():
+            productos = Producto.objects.filter(estado=True, cantidad_actual__gt=0)
+            serializer = self.get_serializer(productos, many=True)
+            return JSONRenderer().render(serializer.data)
+
+        return respuesta_catalogo(obtener_catalogo(renderizar), request)
+
+    @action(detail=False, methods=["get"], url_path="disponibles/cache-stats")
+    def disponibles_cache_stats(self, request):
+        """
+        Contadores de hits y misses de la cache del catálogo en este proceso.
+        """
+        return Response(estadisticas_catalogo(), status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["post"], url_path="check-stock")
     def check_stock(self, request):
@@ -188,7 +341,7 @@ class ProductoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_200_OK,
             )
 
-        total = producto.precio_unitario * float(cantidad)
+        total = producto.precio_unitario * cantidad
         return Response(
             {
                 "disponible": True,
@@ -198,9 +351,45 @@ class ProductoViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK,
         )
 
+    @action(detail=False, methods=["post"], url_path="check-stock-bulk")
+    def check_stock_bulk(self, request):
+        """
+        Verifica el stock de varios productos en una sola petición.
+        Recibe {"items": [{"producto_id", "cantidad"}, ...]}.
+        """
+        items = request.data.get("items")
+
+        if not items or not isinstance(items, list):
+            return Response(
+                {"error": "items es requerido y debe ser una lista."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > settings.CHECK_STOCK_MAX_ITEMS:
+            return Response(
+                {
+                    "error": "Se permiten como máximo "
+                    f"{settings.CHECK_STOCK_MAX_ITEMS} items por consulta."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            resultados, total = verificar_stock(items)
+        except PedidoInvalidoError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "disponible": all(item["disponible"] for item in resultados),
+                "items": resultados,
+                "total": total,
+            },
+            status=status.HTTP_200_OK,
+        )
+
 
 # Vista para Inventario
-class InventarioViewSet(viewsets.ModelViewSet):
+class InventarioViewSet(StreamingListMixin, viewsets.ModelViewSet):
     """
     ViewSet para manejar CRUD de inventarios
     """
@@ -216,13 +405,13 @@ class InventarioViewSet(viewsets.ModelViewSet):
         inventarios_bajo_stock = Inventario.objects.filter(
             cantidad_actual__lt=F("stock_minimo")
         )
-        serializer = self.get_serializer(inventarios_bajo_stock, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.listar_paginado(inventarios_bajo_stock)
 
     @action(detail=True, methods=["patch"], url_path="actualizar-stock")
     def actualizar_stock(self, request, pk=None):
         """
-        Endpoint para actualizar la cantidad actual de un inventario.
+        Endpoint para fijar la cantidad actual de un inventario (conteo físico).
+        La diferencia se registra como un movimiento de ajuste.
         """
         inventario = self.get_object()
         nueva_cantidad = request.data.get("cantidad_actual")
@@ -232,30 +421,181 @@ class InventarioViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         try:
-            inventario.cantidad_actual = int(nueva_cantidad)
-            inventario.save()
+            nueva_cantidad = int(nueva_cantidad)
+        except (TypeError, ValueError):
             return Response(
-                {"mensaje": f"Cantidad actualizada a {inventario.cantidad_actual}"},
-                status=status.HTTP_200_OK,
+                {"error": "El valor de 'cantidad_actual' debe ser un número entero"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        except ValueError:
+        fijar_stock(
+            inventario.id,
+            nueva_cantidad,
+            motivo="Ajuste manual de stock",
+            empleado=getattr(request.user, "empleado", None),
+        )
+        return Response(
+            {"mensaje": f"Cantidad actualizada a {nueva_cantidad}"},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["post"], url_path="ajustar-stock")
+    def ajustar_stock_lote(self, request):
+        """
+        Aplica ajustes +n/-n a varios inventarios en una sola transacción.
+        Recibe {"ajustes": [{"inventario_id", "cantidad"}, ...], "motivo"}.
+        """
+        serializer = AjusteStockSerializer(
+            data=request.data.get("ajustes"), many=True, allow_empty=False
+        )
+        serializer.is_valid(raise_exception=True)
+        ajustes = [
+            (ajuste["inventario_id"], ajuste["cantidad"]) for ajuste in serializer.data
+        ]
+        return self._respuesta_ajuste(request, ajustes)
+
+    @action(detail=True, methods=["post"], url_path="ajustar-stock")
+    def ajustar_stock_inventario(self, request, pk=None):
+        """
+        Suma o resta `cantidad` al stock de un inventario sin leerlo antes.
+        """
+        serializer = AjusteStockSerializer(
+            data={"inventario_id": pk, "cantidad": request.data.get("cantidad")}
+        )
+        serializer.is_valid(raise_exception=True)
+        return self._respuesta_ajuste(
+            request, [(serializer.data["inventario_id"], serializer.data["cantidad"])]
+        )
+
+    def _respuesta_ajuste(self, request, ajustes):
+        try:
+            saldos = ajustar_stock(
+                ajustes,
+                motivo=request.data.get("motivo") or "Ajuste de stock",
+                empleado=getattr(request.user, "empleado", None),
+                documento_referencia=request.data.get("documento_referencia"),
+            )
+        except StockInsuficienteError as e:
             return Response(
-                {"error": "El valor de 'cantidad_actual' debe ser un número entero"},
+                {"error": str(e), "faltantes": e.faltantes},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        except Inventario.DoesNotExist as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(
+            {
+                "inventarios": [
+                    {"inventario_id": inventario_id, "cantidad_actual": cantidad}
+                    for inventario_id, cantidad in saldos.items()
+                ]
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+# Vista para AlertaStock
+class AlertaStockViewSet(StreamingListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Alertas de stock bajo registradas al modificar el inventario.
+    """
+
+    queryset = AlertaStock.objects.select_related("producto")
+    serializer_class = AlertaStockSerializer
+
+    @staticmethod
+    def _entero(valor, campo):
+        try:
+            return max(int(valor or 0), 0)
+        except ValueError:
+            raise serializers.ValidationError({campo: "Debe ser un entero."})
+
+    @action(detail=False, methods=["get"])
+    def nuevas(self, request):
+        """
+        Alertas posteriores a ?cursor=<id> (la última recibida) en orden de
+        creación. La respuesta trae el cursor para la siguiente consulta.
+        """
+        cursor = self._entero(request.query_params.get("cursor"), "cursor")
+        limite = self._entero(request.query_params.get("limite"), "limite") or 100
+        lista = list(alertas.alertas_desde(cursor, min(limite, 1000)))
+        return Response(
+            {
+                "alertas": self.get_serializer(lista, many=True).data,
+                "cursor": lista[-1].id if lista else cursor,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        renderer_classes=[alertas.EventStreamRenderer, JSONRenderer],
+    )
+    def eventos(self, request):
+        """
+        Server-sent events con las alertas nuevas. Continúa desde el header
+        Last-Event-ID o desde ?cursor=<id>.
+        """
+        cursor = self._entero(
+            request.META.get("HTTP_LAST_EVENT_ID")
+            or request.query_params.get("cursor"),
+            "cursor",
+        )
+        renderer = JSONRenderer()
+
+        def renderizar(lista):
+            data = self.get_serializer(lista, many=True).data
+            return [renderer.render(item).decode() for item in data]
+
+        response = StreamingHttpResponse(
+            alertas.eventos(cursor, renderizar), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
 
 
 # Vista para MovimientoInventario
-class MovimientoInventarioViewSet(viewsets.ModelViewSet):
+class MovimientoInventarioViewSet(StreamingListMixin, viewsets.ModelViewSet):
+    """
+    Registro de movimientos de solo inserción: crear un movimiento aplica su
+    efecto sobre el stock; no se pueden editar ni eliminar.
+    """
+
     queryset = MovimientoInventario.objects.all()
     serializer_class = MovimientoInventarioSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ("-fecha_movimiento", "-id")
+    http_method_names = ["get", "post", "head", "options"]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        try:
+            movimiento = registrar_movimiento(
+                datos["inventario"],
+                datos["tipo_movimiento"],
+                datos["cantidad"],
+                datos["motivo_movimiento"],
+                empleado=datos.get("empleado"),
+                documento_referencia=datos.get("documento_referencia"),
+                fecha=datos.get("fecha_movimiento"),
+            )
+        except StockInsuficienteError as e:
+            return Response(
+                {"error": str(e), "faltantes": e.faltantes},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = self.get_serializer(movimiento)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 # Vista para Pedido
-class PedidoViewSet(viewsets.ModelViewSet):
+class PedidoViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = Pedido.objects.all()
     serializer_class = PedidoSerializer
+    cursor_ordering = ("-fecha_pedido", "-id")
 
     @action(detail=False, methods=["post"], url_path="create-temp")
     def create_temp(self, request):
@@ -269,48 +609,13 @@ class PedidoViewSet(viewsets.ModelViewSet):
             )
 
         cliente = get_object_or_404(Cliente, id=cliente_id)
-        total_pedido = 0
-        detalles = []
 
-        for item in items:
-            producto = get_object_or_404(Producto, id=item["producto_id"], estado=True)
-            inventario = Inventario.objects.filter(producto=producto).first()
-
-            if not inventario or inventario.cantidad_actual < item["cantidad"]:
-                return Response(
-                    {
-                        "error": f"Stock insuficiente para el producto {producto.nombre}."
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            subtotal = producto.precio_unitario * float(item["cantidad"])
-            total_pedido += subtotal
-            detalles.append(
-                {
-                    "producto": producto.id,
-                    "cantidad": item["cantidad"],
-                    "precio_unitario": producto.precio_unitario,
-                    "subtotal": subtotal,
-                }
-            )
-
-        pedido = Pedido.objects.create(
-            cliente=cliente,
-            estado_pedido="pendiente",
-            total_pedido=total_pedido,
-            direccion_envio=cliente.direccion,
-            comentarios=request.data.get("comentarios", ""),
-        )
-
-        for detalle in detalles:
-            DetallePedido.objects.create(
-                pedido=pedido,
-                producto_id=detalle["producto"],
-                cantidad=detalle["cantidad"],
-                precio_unitario=detalle["precio_unitario"],
-                subtotal=detalle["subtotal"],
+        try:
+            pedido, total_pedido = crear_pedido_temporal(
+                cliente, items, comentarios=request.data.get("comentarios", "")
             )
+        except PedidoInvalidoError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.get_serializer(pedido)
         return Response(
@@ -322,7 +627,10 @@ class PedidoViewSet(viewsets.ModelViewSet):
     def confirm_payment(self, request, pk=None):
         # Verificar el token de autorización
         token = request.headers.get("Authorization")
-        if token != f"Bearer {settings.CONFIRM_PAYMENT_TOKEN}":
+        if (
+            not settings.CONFIRM_PAYMENT_TOKEN
+            or token != f"Bearer {settings.CONFIRM_PAYMENT_TOKEN}"
+        ):
             return Response(
                 {"error": "Autenticación inválida."}, status=status.HTTP_403_FORBIDDEN
             )
@@ -336,43 +644,22 @@ class PedidoViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            with transaction.atomic():
-                pedido.estado_pedido = "confirmado"
-                pedido.save()
-
-                # Actualizar inventario
-                detalles = DetallePedido.objects.select_for_update().filter(
-                    pedido=pedido
-                )
-                for detalle in detalles:
-                    inventario = (
-                        Inventario.objects.select_for_update()
-                        .filter(producto=detalle.producto)
-                        .first()
-                    )
-                    if inventario and inventario.cantidad_actual >= detalle.cantidad:
-                        inventario.cantidad_actual -= detalle.cantidad
-                        inventario.save()
-                    else:
-                        raise ValueError(
-                            f"Stock insuficiente para {detalle.producto.nombre}"
-                        )
-
-                # Crear distribución
-                direccion_cliente = pedido.direccion_envio
-                cantidad_paquetes = sum([detalle.cantidad for detalle in detalles])
-
-                resultado = crear_distribucion(
-                    pedido.id, direccion_cliente, cantidad_paquetes
-                )
-
-                if not resultado["success"]:
-                    raise ValueError("No se pudo crear la distribución.")
+            # Fase uno: estado y stock. La distribución se crea tras el commit
+            confirmar_pedido(pedido)
 
             return Response(
-                {"success": True, "mensaje": "Pago confirmado y pedido actualizado."},
+                {
+                    "success": True,
+                    "mensaje": "Pago confirmado y pedido actualizado.",
+                    "distribucion": "programada",
+                },
                 status=status.HTTP_200_OK,
             )
+        except StockInsuficienteError as e:
+            return Response(
+                {"error": str(e), "faltantes": e.faltantes},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -404,16 +691,33 @@ class PedidoViewSet(viewsets.ModelViewSet):
 
 
 # Vista para DetallePedido
-class DetallePedidoViewSet(viewsets.ModelViewSet):
+class DetallePedidoViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = DetallePedido.objects.all()
     serializer_class = DetallePedidoSerializer
 
 
 # Vista para Distribucion
-class DistribucionViewSet(viewsets.ModelViewSet):
+class DistribucionViewSet(StreamingListMixin, viewsets.ModelViewSet):
+    """
+    Filtrable por ?pedido=. La distribución de un pedido confirmado se crea
+    después del commit, así que puede tardar en aparecer.
+    """
+
     queryset = Distribucion.objects.all()
     serializer_class = DistribucionSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        pedido = self.request.query_params.get("pedido")
+        if pedido:
+            try:
+                queryset = queryset.filter(pedido_id=int(pedido))
+            except ValueError:
+                raise serializers.ValidationError(
+                    {"pedido": "Debe ser un número entero."}
+                )
+        return queryset
+
     @action(detail=False, methods=["post"], url_path="create-distribution")
     def create_distribution(self, request):
         pedido_id = request.data.get("pedido_id")
@@ -440,28 +744,86 @@ class DistribucionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+    @action(detail=False, methods=["post"])
+    def planificar(self, request):
+        """
+        Planifica el despacho de los pedidos confirmados sin distribución.
+        Con {"guardar": false} solo retorna el plan.
+        """
+        try:
+            guardar = serializers.BooleanField().to_internal_value(
+                request.data.get("guardar", True)
+            )
+            plan = planificar_despacho(guardar=guardar)
+        except serializers.ValidationError as e:
+            return Response({"error": e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        except DespachoError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "viajes": [viaje.como_dict() for viaje in plan["viajes"]],
+                "sin_planificar": [
+                    {"pedido_id": pedido_id, "motivo": motivo}
+                    for pedido_id, motivo in plan["sin_planificar"]
+                ],
+                "distribuciones": plan["distribuciones"],
+            },
+            status=status.HTTP_201_CREATED if guardar else status.HTTP_200_OK,
+        )
+
 
 # Vista para Ruta
-class RutaViewSet(viewsets.ModelViewSet):
+class RutaViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = Ruta.objects.all()
     serializer_class = RutaSerializer
 
 
 # Vista para Produccion
-class ProduccionViewSet(viewsets.ModelViewSet):
+class ProduccionViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = Produccion.objects.all()
     serializer_class = ProduccionSerializer
 
 
 # Vista para ControlCalidad
-class ControlCalidadViewSet(viewsets.ModelViewSet):
+class ControlCalidadViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = ControlCalidad.objects.all()
     serializer_class = ControlCalidadSerializer
 
 
-class ControlSoploBotellasViewSet(viewsets.ModelViewSet):
+def respuesta_resumen(request, definicion):
+    agrupar = [c for c in request.query_params.get("agrupar", "").split(",") if c]
+    fechas = {}
+    for parametro in ("desde", "hasta"):
+        valor = request.query_params.get(parametro)
+        try:
+            fechas[parametro] = parse_date(valor) if valor else None
+        except ValueError:
+            fechas[parametro] = None
+        if valor and fechas[parametro] is None:
+            return Response(
+                {"error": f"{parametro} debe tener el formato YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    invalidos = set(agrupar) - set(resumenes.AGRUPACIONES)
+    if invalidos:
+        return Response(
+            {
+                "error": "Criterios de agrupación inválidos.",
+                "validos": list(resumenes.AGRUPACIONES),
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    data = resumenes.consultar_resumen(definicion, agrupar=agrupar, **fechas)
+    return Response(data, status=status.HTTP_200_OK)
+
+
+class ControlSoploBotellasViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = ControlSoploBotellas.objects.all()
     serializer_class = ControlSoploBotellasSerializer
+    cursor_ordering = ("-fecha", "-id")
 
     @action(detail=False, methods=["get"], url_path="reporte-dano")
     def reporte_dano(self, request):
@@ -469,27 +831,48 @@ class ControlSoploBotellasViewSet(viewsets.ModelViewSet):
         Endpoint personalizado para obtener los registros con mayor porcentaje de producción dañada.
         """
         resultados = self.queryset.annotate(
-            porcentaje_dano=F("produccion_danada") * 100 / F("produccion_total")
+            porcentaje_dano=ExpressionWrapper(
+                F("produccion_danada") * Decimal("100") / F("produccion_total"),
+                output_field=DecimalField(),
+            )
         ).filter(porcentaje_dano__gt=10)  # Ejemplo: producción dañada mayor al 10%
 
-        serializer = self.get_serializer(resultados, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.listar_paginado(resultados)
 
     @action(detail=False, methods=["get"], url_path="produccion-por-empleado")
     def produccion_por_empleado(self, request):
         """
         Obtiene un resumen de la producción total por empleado.
         """
-        data = self.queryset.values("empleado__nombre").annotate(
-            produccion_buena_total=F("produccion_buena"),
-            produccion_total=F("produccion_total"),
-        )
+        data = [
+            {
+                "empleado__nombre": fila["empleado__nombre"],
+                "produccion_buena_total": fila["produccion_buena"],
+                "produccion_total": fila["produccion_total"],
+            }
+            for fila in resumenes.consultar_resumen(
+                resumenes.SOPLO, agrupar=["empleado"]
+            )
+        ]
         return Response(data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["get"])
+    def resumen(self, request):
+        """
+        Producción buena, dañada y total con su tasa de daño desde los
+        resúmenes diarios. Parámetros: desde, hasta (YYYY-MM-DD) y agrupar
+        (fecha, turno, empleado, proveedor separados por coma).
+        """
+        return respuesta_resumen(request, resumenes.SOPLO)
+
 
-class ControlProduccionAguaViewSet(viewsets.ModelViewSet):
+class ControlProduccionAguaViewSet(
+    CargaMasivaMixin, StreamingListMixin, viewsets.ModelViewSet
+):
     queryset = ControlProduccionAgua.objects.all().order_by("-fecha_produccion")
     serializer_class = ControlProduccionAguaSerializer
+    cursor_ordering = ("-fecha_produccion", "-id")
+    carga_masiva = "control-produccion-agua"
 
     @action(
         detail=False, methods=["get"], url_path="por-empleado/(?P<empleado_id>[^/.]+)"
@@ -499,8 +882,7 @@ class ControlProduccionAguaViewSet(viewsets.ModelViewSet):
         Filtra controles de producción realizados por un empleado específico.
         """
         controles = self.queryset.filter(empleado_id=empleado_id)
-        serializer = self.get_serializer(controles, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.listar_paginado(controles)
 
     @action(detail=False, methods=["get"], url_path="por-lote/(?P<numero_lote>[^/.]+)")
     def por_lote(self, request, numero_lote=None):
@@ -508,18 +890,169 @@ class ControlProduccionAguaViewSet(viewsets.ModelViewSet):
         Filtra controles de producción por número de lote.
         """
         controles = self.queryset.filter(numero_lote=numero_lote)
-        serializer = self.get_serializer(controles, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.listar_paginado(controles)
+
+    @action(detail=False, methods=["get"])
+    def resumen(self, request):
+        """
+        Botellas envasadas, malogradas y buenas con su tasa de daño desde
+        los resúmenes diarios. Mismos parámetros que el resumen de soplado.
+        """
+        return respuesta_resumen(request, resumenes.PRODUCCION_AGUA)
 
 
 # Vista para KPI
-class KPIViewSet(viewsets.ModelViewSet):
+class KPIViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = KPI.objects.all()
     serializer_class = KPISerializer
 
+    @action(detail=False, methods=["get"], url_path=r"codigo/(?P<codigo>[\w-]+)")
+    def por_codigo(self, request, codigo=None):
+        """
+        Retorna un KPI calculado por su código (una sola fila).
+        """
+        kpi = kpis.al_dia(get_object_or_404(KPI, codigo=codigo))
+        serializer = self.get_serializer(kpi)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 # Vista para Reporte
-class ReporteViewSet(viewsets.ModelViewSet):
+class ReporteViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = Reporte.objects.all()
     serializer_class = ReporteSerializer
-    serializer_class = ReporteSerializer
+
+    def get_queryset(self):
+        if self.action == "contenido":
+            return self.queryset
+        # Los metadatos no necesitan leer el contenido de cada reporte
+        return self.queryset.defer("contenido", "datos_reporte")
+
+    @action(
+        detail=True,
+        methods=["get"],
+        renderer_classes=[JSONRenderer, reportes.CSVRenderer],
+    )
+    def contenido(self, request, pk=None):
+        """
+        Descarga el reporte generado como JSON o CSV (Accept o ?format=csv).
+        El JSON se envía ya comprimido si el cliente acepta gzip.
+        """
+        reporte = self.get_object()
+        if reporte.estado == "pendiente":
+            return Response({"estado": reporte.estado}, status=status.HTTP_202_ACCEPTED)
+        if reporte.estado == "fallido":
+            return Response(
+                {"estado": reporte.estado, "error": reporte.ultimo_error},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        if reporte.contenido is None:
+            # Reporte cargado a mano con datos_reporte
+            if request.accepted_renderer.format == "csv":
+                return Response(
+                    {"error": "Este reporte solo está disponible en JSON."},
+                    status=status.HTTP_406_NOT_ACCEPTABLE,
+                )
+            return Response(reporte.datos_reporte, status=status.HTTP_200_OK)
+
+        contenido = bytes(reporte.contenido)
+        if request.accepted_renderer.format == "csv":
+            response = StreamingHttpResponse(
+                iterar_async(reportes.filas_csv(contenido)),
+                content_type="text/csv; charset=utf-8",
+            )
+            response["Content-Disposition"] = (
+                f'attachment; filename="reporte-{reporte.id}.csv"'
+            )
+            return response
+
+        if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+            response = HttpResponse(contenido, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(
+                gzip.decompress(contenido), content_type="application/json"
+            )
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+    @action(detail=True, methods=["post"])
+    def regenerar(self, request, pk=None):
+        """
+        Vuelve a encolar la generación de un reporte con sus parámetros.
+        """
+        reporte = self.get_object()
+        if reporte.tipo_reporte not in reportes.REPORTES:
+            return Response(
+                {"error": "Solo se pueden regenerar reportes generados."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        reportes.encolar_regeneracion(reporte)
+        return Response({"estado": "pendiente"}, status=status.HTTP_202_ACCEPTED)
+
+
+class ArchivoAnaliticoViewSet(StreamingListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Archivos Parquet de la exportación analítica, filtrables por ?dataset=,
+    ?desde= y ?hasta= (fecha de la partición).
+    """
+
+    queryset = ArchivoAnalitico.objects.all()
+    serializer_class = ArchivoAnaliticoSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        dataset = self.request.query_params.get("dataset")
+        if dataset:
+            queryset = queryset.filter(dataset=dataset)
+        for parametro, lookup in (("desde", "fecha__gte"), ("hasta", "fecha__lte")):
+            valor = self.request.query_params.get(parametro)
+            if not valor:
+                continue
+            try:
+                fecha = parse_date(valor)
+            except ValueError:
+                fecha = None
+            if fecha is None:
+                raise serializers.ValidationError(
+                    {parametro: "Debe tener el formato YYYY-MM-DD."}
+                )
+            queryset = queryset.filter(**{lookup: fecha})
+        return queryset
+
+    @action(detail=False, methods=["get"])
+    def datasets(self, request):
+        """
+        Datasets exportables con el último id exportado de cada uno.
+        """
+        return Response(
+            [
+                {"dataset": nombre, "marca_agua": analitica.marca_agua(nombre)}
+                for nombre in analitica.DATASETS
+            ],
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["get"])
+    def descargar(self, request, pk=None):
+        """
+        Descarga el archivo Parquet; se envía por partes desde el disco.
+        """
+        archivo = self.get_object()
+        try:
+            contenido = open(analitica.ruta_absoluta(archivo), "rb")
+        except FileNotFoundError:
+            return Response(
+                {"error": "El archivo ya no está disponible."},
+                status=status.HTTP_410_GONE,
+            )
+        response = FileResponse(
+            contenido,
+            as_attachment=True,
+            filename=f"{archivo.dataset}-{archivo.fecha}-{archivo.id}.parquet",
+            content_type="application/vnd.apache.parquet",
+        )
+        # FileResponse lee el archivo con un iterador síncrono, que uvicorn
+        # cargaría completo en memoria (ver api.streaming)
+        response.streaming_content = iterar_async(response.streaming_content)
+        return response
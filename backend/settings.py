@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import importlib.util
 import os
 
 import dj_database_url
@@ -100,6 +101,9 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
+    # Paginación por cursor en todos los listados (?page_size= para ajustar)
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.CursorPagination",
+    "PAGE_SIZE": 100,
 }
 
 # Database
@@ -140,13 +144,153 @@ DATABASES = {
             # URL de la base de datos desde variable de entorno
             default=os.getenv("DATABASE_URL"),
             # Configuraciones adicionales
-            # conn_max_age=600,  # Mantener la conexión abierta por 10 minutos
+            # Segundos que se mantiene abierta la conexión (0 = una por petición).
+            # Bajo ASGI cada petición corre en un hilo distinto y las conexiones
+            # persistentes quedan abiertas (ticket #33497): se reutilizan con
+            # el pool de abajo
+            conn_max_age=int(os.getenv("DB_CONN_MAX_AGE", 0)),
             conn_health_checks=True,  # Verificaciones de salud de la conexión
             # ssl_require=True,  # Cambia a True si usas una base de datos con SSL
         ),
     }
 }
 
+# Con PgBouncer en modo transacción los cursores del lado del servidor fallan
+DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = (
+    os.getenv("DB_DISABLE_SERVER_SIDE_CURSORS") == "1"
+)
+
+# Pool nativo de Django 5.1 (solo psycopg 3 con psycopg_pool instalado).
+# DB_POOL: "auto" lo activa si está disponible, "1" lo exige (los procesos
+# fallan al iniciar sin él), "0" lo desactiva
+DB_POOL = os.getenv("DB_POOL", "auto")
+DB_POOL_DISPONIBLE = bool(
+    importlib.util.find_spec("psycopg") and importlib.util.find_spec("psycopg_pool")
+)
+
+if (
+    DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql"
+    and DB_POOL != "0"
+    and DB_POOL_DISPONIBLE
+):
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+        "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+    }
+    # El pool reemplaza a las conexiones persistentes
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Por defecto en memoria del proceso; con REDIS_URL se comparte entre workers
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "zoiaqua",
+    }
+}
+
+if os.getenv("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+    }
+
+# Segundos que se mantiene el catálogo de productos disponibles en cache
+CATALOGO_CACHE_TIMEOUT = int(os.getenv("CATALOGO_CACHE_TIMEOUT", 300))
+# Segundos que cada proceso reutiliza su copia en memoria sin consultar la
+# cache compartida. Sin REDIS_URL la versión del catálogo es por proceso y
+# los cambios hechos por otros workers o comandos se ven recién cuando vence
+# CATALOGO_CACHE_TIMEOUT
+CATALOGO_CACHE_LOCAL_TTL = int(os.getenv("CATALOGO_CACHE_LOCAL_TTL", 5))
+# Segundos que se reutiliza el índice de búsqueda en memoria (solo SQLite)
+BUSQUEDA_INDICE_TTL = int(os.getenv("BUSQUEDA_INDICE_TTL", 60))
+
+# Correo saliente
+# Los correos se encolan en CorreoSaliente y los envía `manage.py procesar_correos`
+SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "favio_alikhan30@hotmail.com")
+# FakeTransport descarta los correos: solo se usa con DEBUG sin clave o si se
+# configura explícitamente; sin la clave, el worker de correos no arranca
+EMAIL_OUTBOX_TRANSPORT = os.getenv(
+    "EMAIL_OUTBOX_TRANSPORT",
+    (
+        "api.correo.FakeTransport"
+        if DEBUG and not SENDGRID_API_KEY
+        else "api.correo.SendGridTransport"
+    ),
+)
+EMAIL_OUTBOX_LEASE = 300  # Segundos que un worker reserva un correo
+EMAIL_OUTBOX_MAX_INTENTOS = 5
+EMAIL_OUTBOX_BACKOFF = 60  # Segundos de espera base entre reintentos
+
+# Reportes
+# Los reportes se encolan como pendientes y los genera `manage.py generar_reportes`
+REPORTES_LEASE = 900  # Segundos que un worker reserva un reporte
+REPORTES_MAX_INTENTOS = 3
+REPORTES_BACKOFF = 60  # Segundos de espera base entre reintentos
+REPORTES_CHUNK_SIZE = 2000  # Filas leídas por bloque del cursor
+
+# Rutas y tiempos de viaje
+GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+STORE_ADDRESS = os.getenv(
+    "STORE_ADDRESS", "Jose Carlos Mariategui 451 Amarilis, Huánuco"
+)
+# "lat,lng" de la tienda (STORE_ADDRESS), usado por el backend offline
+STORE_COORDENADAS = tuple(
+    float(valor)
+    for valor in os.getenv("STORE_COORDENADAS", "-9.930600,-76.242200").split(",")
+)
+ROUTING_BACKEND = os.getenv(
+    "ROUTING_BACKEND",
+    (
+        "api.tiempo_viaje.GoogleMapsBackend"
+        if GOOGLE_MAPS_API_KEY
+        else "api.tiempo_viaje.HaversineBackend"
+    ),
+)
+ROUTING_TIMEOUT = 5  # Segundos máximos por consulta, incluyendo reintentos
+ROUTING_CACHE_TTL = 900
+ROUTING_CACHE_MAX_ENTRADAS = 1024
+ROUTING_VELOCIDAD_KMH = 25
+ROUTING_FACTOR_DESVIO = 1.3  # Distancia por calles vs. línea recta
+# Estimación offline para clientes sin coordenadas (minutos)
+ROUTING_MINUTOS_SIN_COORDENADAS = 30
+
+# Planificador de despacho por lotes (api.despacho)
+DESPACHO_PUESTO_REPARTIDOR = "repartidor"  # Empleado.puesto de los repartidores
+DESPACHO_MINUTOS_POR_PARADA = 5  # Tiempo de entrega en cada cliente
+
+# Alertas de stock por server-sent events
+ALERTAS_SSE_INTERVALO = 2  # Segundos entre consultas cuando no hay alertas
+ALERTAS_SSE_DURACION = 300  # Segundos antes de cerrar; el cliente reconecta
+
+# Cache en memoria teléfono -> cliente_id de clientes/resolve
+CLIENTES_CACHE_TTL = 600
+CLIENTES_CACHE_MAX_ENTRADAS = 4096
+
+# Importación/exportación masiva (api.carga_masiva)
+CARGA_MASIVA_BLOQUE = 2000  # Filas validadas y escritas por transacción
+CARGA_MASIVA_MAX_ERRORES = 1000  # Errores por fila incluidos en la respuesta
+
+# Exportación analítica en Parquet (api.analitica)
+ANALITICA_DIR = os.getenv("ANALITICA_DIR", os.path.join(BASE_DIR, "analitica"))
+ANALITICA_CHUNK_SIZE = 50_000  # Filas por bloque del cursor y grupo de Parquet
+
+# Items máximos por petición de productos/check-stock-bulk
+CHECK_STOCK_MAX_ITEMS = 200
+
+# Token que usa el chatbot para confirmar pagos
+CONFIRM_PAYMENT_TOKEN = os.getenv("CONFIRM_PAYMENT_TOKEN")
+
+# La distribución se crea después del commit de confirm-payment, en hilos
+DISTRIBUCION_ASINCRONA = True
+DISTRIBUCION_WORKERS = 4
+
+# Sirve los endpoints del chatbot con vistas async (requiere ASGI/uvicorn)
+ASYNC_BOT_ENDPOINTS = os.getenv("ASYNC_BOT_ENDPOINTS", "1") == "1"
+
 PASSWORD_HASHERS = [
     "django.contrib.auth.hashers.Argon2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2PasswordHasher",
@@ -170,6 +314,16 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Logging
+# https://docs.djangoproject.com/en/5.1/topics/logging/
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"api": {"handlers": ["console"], "level": "INFO"}},
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
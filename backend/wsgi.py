@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Solo los procesos servidor registran la configuración de conexiones
+from api.db import registrar_configuracion_bd  # noqa: E402
+
+registrar_configuracion_bd()
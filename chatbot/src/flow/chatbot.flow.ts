@@ -14,6 +14,8 @@ dotenv.config({ path: path.resolve(__dirname, '../../../.env') });
 const BACKEND_URL = process.env.BACKEND_URL;
 const STORE_ADDRESS = process.env.STORE_ADDRESS || 'Jose Carlos Mariategui 451 Amarilis, Huánuco';
 const CONFIRM_PAYMENT_TOKEN = process.env.CONFIRM_PAYMENT_TOKEN; 
+const DISTRIBUCION_INTENTOS = Number(process.env.DISTRIBUCION_INTENTOS || 5);
+const DISTRIBUCION_ESPERA_MS = Number(process.env.DISTRIBUCION_ESPERA_MS || 1000);
 
 export default BotWhatsapp.addKeyword(BotWhatsapp.EVENTS.ACTION)
     .addAction(async (ctx, {state, flowDynamic}) => {
@@ -62,12 +64,21 @@ export default BotWhatsapp.addKeyword(BotWhatsapp.EVENTS.ACTION)
             const pedidoDetail = await axios.get(`${BACKEND_URL}/pedidos/${pedido_id}`)
             const pedido = pedidoDetail.data
 
-            // Obtener distribucion
-            const distribucionResp = await axios.get(`${BACKEND_URL}/distribuciones/?pedido=${pedido_id}`)
-            const distribucion = distribucionResp.data.results[0] || {}
+            // La distribución se crea en segundo plano después de confirmar
+            // ("distribucion": "programada"), así que se consulta unas veces
+            let distribucion: any = null
+            for (let intento = 0; intento < DISTRIBUCION_INTENTOS && !distribucion; intento++) {
+                if (intento > 0) {
+                    await new Promise(resolve => setTimeout(resolve, DISTRIBUCION_ESPERA_MS))
+                }
+                const distribucionResp = await axios.get(`${BACKEND_URL}/distribuciones/?pedido=${pedido_id}`)
+                distribucion = distribucionResp.data.results[0] || null
+            }
+            const fechaSalida = distribucion ? distribucion.fecha_salida : 'por programar'
+            const fechaEntrega = distribucion ? distribucion.fecha_entrega : 'por programar'
 
             // Simular boleta (puedes personalizar)
-            let boleta = `BOLETA DE PAGO\nCliente: ${customerName} ${customerLastName}\nDNI: ${dni}\nPedido ID: ${pedido_id}\nFecha salida: ${distribucion.fecha_salida}\nFecha entrega: ${distribucion.fecha_entrega}`
+            let boleta = `BOLETA DE PAGO\nCliente: ${customerName} ${customerLastName}\nDNI: ${dni}\nPedido ID: ${pedido_id}\nFecha salida: ${fechaSalida}\nFecha entrega: ${fechaEntrega}`
 
             // Mostrar boleta y mensaje de gracias
             await flowDynamic(boleta);